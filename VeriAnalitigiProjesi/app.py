@@ -1,277 +1,382 @@
-import random # rastgelelik gerektiren işlemler için
-import datetime # tarih verileri için
-from flask import Flask # ana web server kütüphanesi
-from flask_login import LoginManager, login_required # login işlemleri ve loginsiz yapılamayacak işlemler için
-from werkzeug.security import generate_password_hash # şifreyi veri tabanına hashleyerek saklama, güvenlik
-
-# Kendi yazdığımız modüller
-from scripts.data import db, User, Product, ClickLog, PurchaseLog, COLOR_CODES
-import scripts.user_man as user_man
-import scripts.data_man as data_man
-
-app = Flask(__name__) # bu dosya kök dosya
-app.config["SECRET_KEY"] = "cok-gizli-anahtar-final-v10" # cookie
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///proje.db" # veritabanı yolu
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False # gereksiz uyarıları kapama
-
-# Veritabanını uygulamaya bağlıyoruz
-db.init_app(app)
-
-login_manager = LoginManager(app)
-login_manager.login_view = "login"
-
-
-# Giriş yapan kullanıcıyı ID'sinden tanıma
-@login_manager.user_loader
-def load_user(user_id):
-    return user_man.load_user(user_id)
-
-
-# Ana Sayfa
-
-
-# ürünleri belirtilen kategoriye, aramaya ya da sıralama isteğine göre veritabanından ilgili verileri çekiyor.
-# popülerliğe göre sıralamda ClickLog tablo verisi kullanılıyor
-@app.route("/")
-def index():
-    return data_man.index()
-
-
-# Ürün Sayfası
-
-
-# Kullanıcı sayfaya girdiği an ClickLog kaydı atar
-# Ürünün renk seçim grafiklerini sunar
-# Ürünün son 1 aylık alım grafiğini outlier analizi ve analiz sonucu optimize edilmiş grafikleri sunar.
-@app.route("/product/<int:product_id>")
-def product_detail(product_id):
-    return data_man.product_detail(product_id)
-
-
-# Satın Alma İşlemi
-
-
-# Hızlı satın alma
-# X ürününü Y renkte satın aldı
-@app.route("/buy_now", methods=["POST"])
-@login_required
-def buy_now():
-    return user_man.buy_now()
-
-
-# Yönetici Paneli
-
-
-# Tüm verileri harmanlar, popüler ürünlerin tıklanma-alımı, kullanıcı cinsiyet dağılımı, şehir-meslek-kategori bazlı segmentasyon
-# Global Outlier Analizi, son 30 güne bakar, standart sapmanın 2 katından fazla satış olan günleri,
-# ardından o günkü anomaliye sebep olan "Whale" müşteriyi bulur ve temizleyip raporlar
-# Outlier analizi ile temizlediği verileri kullanarak segment1 ve segment2 grafiklerini de ona göre oluşturur. whale_blacklist{}
-@app.route("/admin/dashboard")
-@login_required
-def admin_dashboard():
-    return data_man.admin_dashboard()
-
-
-# Yetkilendirme Fonksiyonları
-
-
-# Klasik giriş çıkış ve kayıt işlemleri
-@app.route("/register", methods=["GET", "POST"])
-def register():
-    return user_man.register()
-
-
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    return user_man.login()
-
-
-@app.route("/logout")
-def logout():
-    return user_man.logout()
-
-
-# Veri Oluşturma Fonksiyonu
-
-
-# Eski veri tabanını silip sıfırdan kurar
-# Sahte trafik yaratır
-# Her güne normal satış yaptırır
-# Bilerek Outlier çıkartacak şekilde "Whale" anormal verisi oluşturur,
-# bu sayede analiz tarafında inceleyebilelim
-@app.cli.command("init-db")
-def init_db():
-    db.drop_all()  # tabloları temizle
-    db.create_all()  # tabloları yeniden oluştur
-
-    # Statik ürün verilerini ekleme
-    print("1. Ürünler Ekleniyor...")
-
-    names = [
-        ("iPhone 15", "Elektronik", 50000),
-        ("MacBook Air", "Elektronik", 45000),
-        ("iPad Pro", "Elektronik", 35000),
-        ("Sony Kulaklık", "Elektronik", 9000),
-        ("Oyun PC", "Elektronik", 60000),
-        ("Samsung S24", "Elektronik", 55000),
-        ("Yazlık Elbise", "Giyim", 900),
-        ("Kot Ceket", "Giyim", 1200),
-        ("Keten Pantolon", "Giyim", 800),
-        ("İpek Şal", "Giyim", 600),
-        ("Deri Mont", "Giyim", 4000),
-        ("Spor Tayt", "Giyim", 500),
-        ("Nike Air", "Ayakkabı", 4500),
-        ("Adidas Superstar", "Ayakkabı", 3800),
-        ("Topuklu Ayakkabı", "Ayakkabı", 1500),
-        ("Bot", "Ayakkabı", 2000),
-        ("Koşu Ayakkabısı", "Ayakkabı", 3000),
-        ("Kahve Makinesi", "Ev", 5000),
-        ("Robot Süpürge", "Ev", 15000),
-        ("Kitaplık", "Ev", 2500),
-        ("Çalışma Masası", "Ev", 3500),
-    ]
-
-    for n, c, p in names:
-        db.session.add(Product(name=n, category=c, price=p))
-    db.session.commit()
-
-    # admin kullanıcısı statik olmak üzere "usercount" kadar rastgele verilere sahip kullanıcı oluştur
-    usercount = 200
-    print("2. Kullanıcılar Ekleniyor...")
-    db.session.add(
-        User(
-            username="admin",
-            gender="E",
-            birth_date=datetime.date(1990, 1, 1),
-            education="Yuksek",
-            city="İstanbul",
-            job="Yönetici",
-            is_admin=True,
-            password_hash=generate_password_hash("123"),
-        )
-    )
-
-    jobs = {
-        "Lise": ["Öğrenci", "Garson", "Kasiyer"],
-        "Lisans": ["Mühendis", "Öğretmen", "Yazılımcı"],
-        "Yuksek": ["Doktor", "Avukat", "Akademisyen"],
-    }
-
-    cities = ["İstanbul", "Ankara", "İzmir", "Bursa", "Antalya"]
-
-    users = []
-    for i in range(usercount):  # usercount
-        edu = random.choice(list(jobs.keys()))
-        u = User(
-            username=f"user{i}",
-            gender=random.choice(["E", "K"]),
-            birth_date=datetime.date(random.randint(1980, 2005), 1, 1),
-            education=edu,
-            city=random.choice(cities),
-            job=random.choice(jobs[edu]),
-        )
-        u.set_password("123")
-        users.append(u)
-    db.session.add_all(users)
-    db.session.commit()
-
-    # son 30 gün için "outliercount" kadar outlier değeri oluşturur
-    outliercount = 2
-    print("3. VERİ SİMÜLASYONU BAŞLIYOR (NORMAL + OUTLIER)...")
-    prods = Product.query.all()
-    all_users = User.query.filter(User.username != "admin").all()
-
-    colors = list(COLOR_CODES.keys())
-
-    products_by_cat = {}
-    for p in prods:
-        if p.category not in products_by_cat:
-            products_by_cat[p.category] = []
-        products_by_cat[p.category].append(p)
-
-    today = datetime.datetime.utcnow()
-
-    # outlier günleri oluşturma
-    days_range = list(range(1, 29))
-    outlier_deltas = random.sample(days_range, outliercount)  # outliercount
-    outlier_dates = [
-        (today - datetime.timedelta(days=d)).strftime("%Y-%m-%d")
-        for d in outlier_deltas
-    ]
-    print(f"Outlier Günleri: {outlier_dates}")
-
-    bulk_purchases = []
-    bulk_clicks = []
-
-    # bugünden itibaren 30 gün geriye kadar sayar
-    for delta in range(30):
-        current_date = today - datetime.timedelta(days=delta)
-        date_str = current_date.strftime("%Y-%m-%d")
-
-        # siteyi ziyaret edecek kişilerin sayısı "minvis" ve "maxvis" değerlerine bağlı
-        minvis = 10
-        maxvis = 40
-        daily_active_users_count = random.randint(minvis, maxvis)  # minvis maxvis
-        daily_users = random.sample(all_users, daily_active_users_count)
-
-        # seçilen her kullanıcı için o gün 3 farklı ürünle etkileşime girer
-        # ürünün alım miktarı "minqty" ve "maxqty" değişkenlerine göre değişir
-        minqty = 1
-        maxqty = 3
-        for u in daily_users:
-            selected_prods = random.sample(prods, 3)
-
-            for p in selected_prods:
-                qty = random.randint(minqty, maxqty)  # minqty maxqty
-
-                # ürünün tıklanma miktarını da "minclick" ve "maxclick" değerleri üzerinden hesaplıyoruz
-                minclick = 1
-                maxclick = 5
-                click_count = random.randint(minclick, maxclick)
-                for _ in range(click_count):
-                    bulk_clicks.append(
-                        ClickLog(user_id=u.id, product_id=p.id, timestamp=current_date)
-                    )
-
-                for _ in range(qty):
-                    bulk_purchases.append(
-                        PurchaseLog(
-                            user_id=u.id,
-                            product_id=p.id,
-                            selected_color=random.choice(colors),
-                            timestamp=current_date,
-                        )
-                    )
-
-        # seçilmiş outlier günü ise;
-        # o gün rastgele bir kullanıcı tek bir üründen "outlmin" ve "outlmax" değerlerine göre alım yapsın
-        outlmin = 200
-        outlmax = 500
-        if date_str in outlier_dates:
-            whale_user = random.choice(all_users)
-            whale_product = random.choice(prods)
-
-            whale_qty = random.randint(outlmin, outlmax)  # outlmin outlmax
-            print(
-                f"!!! OUTLIER: {date_str} - {whale_user.username} - {whale_product.name} - {whale_qty} adet"
-            )
-
-            for _ in range(whale_qty):
-                bulk_purchases.append(
-                    PurchaseLog(
-                        user_id=whale_user.id,
-                        product_id=whale_product.id,
-                        selected_color=random.choice(colors),
-                        timestamp=current_date,
-                    )
-                )
-
-    print("Veriler kaydediliyor (Biraz sürebilir)...")
-    db.session.bulk_save_objects(bulk_clicks)
-    db.session.bulk_save_objects(bulk_purchases)
-    db.session.commit()
-    print("BİTTİ. Veritabanı hazır.")
-
-
-if __name__ == "__main__":
-    app.run(debug=True)
+import os # ortam değişkenleri için
+import click # komut satırı seçenekleri için
+from flask import Flask # ana web server kütüphanesi
+from flask_login import LoginManager, login_required # login işlemleri ve loginsiz yapılamayacak işlemler için
+
+# Kendi yazdığımız modüller
+from scripts.data import db
+import scripts.user_man as user_man
+import scripts.data_man as data_man
+import scripts.rollup as rollup
+import scripts.generator as generator
+import scripts.click_buffer as click_buffer
+import scripts.metrics as metrics
+import scripts.schema as schema
+import scripts.product_stats as product_stats
+import scripts.search as search
+import scripts.user_cache as user_cache
+import scripts.user_dim as user_dim
+import scripts.columnar as columnar
+import scripts.retention as retention
+import scripts.anomaly_report as anomaly_report
+import scripts.snapshot as snapshot
+import scripts.sketches as sketches
+
+app = Flask(__name__) # bu dosya kök dosya
+app.config["SECRET_KEY"] = "cok-gizli-anahtar-final-v10" # cookie
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///proje.db") # veritabanı yolu, benchmark gibi araçlar başka bir dosya verebilir
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False # gereksiz uyarıları kapama
+app.config["GROUP_COMMIT_WINDOW"] = 0.005 # satın almalar bu kadar saniye beklenip gruplanarak tek commit ile yazılır
+app.config["BULK_PURCHASE_MAX"] = 1000 # toplu satın almada tek istekteki en fazla adet
+app.config["CATALOG_PAGE_SIZE"] = 24 # ana sayfada bir seferde yüklenen ürün sayısı
+app.config["CATALOG_PAGE_MAX"] = 100 # /api/products için izin verilen en büyük sayfa boyutu
+app.config["DASHBOARD_DEFAULT_DAYS"] = 30 # panel ve ürün sayfası analizleri tarih verilmezse son kaç güne bakar
+app.config["PAGE_CACHE_SIZE"] = 2000 # önbellekte tutulan en fazla ana sayfa / ürün sayfası
+app.config["ANALYTICS_CACHE_SIZE"] = 256 # panel önbelleğinde tutulan en fazla sonuç (her tarih aralığı için grafik başına bir kayıt)
+app.config["USER_CACHE_SIZE"] = 10000 # giriş yapan kullanıcı önbelleğinde tutulan en fazla kullanıcı
+app.config["USER_CACHE_TTL"] = 300 # önbellekteki kullanıcı kaydı bu kadar saniye sonra veritabanından tekrar okunur
+app.config["RETENTION_DAYS"] = 90 # compact-logs komutu bu günden eski ham tıklama / satın alma kayıtlarını özet tablolara sıkıştırır
+app.config["RETENTION_BATCH"] = 10000 # sıkıştırmada tek transaction'da silinen en fazla ham kayıt
+app.config["DASHBOARD_WORKERS"] = 5 # panel grafiklerini aynı anda hesaplayan thread sayısı
+app.config["ANOMALY_WINDOW_DAYS"] = 30 # anlık whale tespitinde ortalama / standart sapma için geriye bakılan gün sayısı
+app.config["ANOMALY_REPORT_WORKERS"] = os.cpu_count() or 1 # tüm katalog anomali raporunu hesaplayan süreç sayısı
+app.config["ANALYTICS_ENGINE"] = "numpy" # "numpy", "arrow", "approx" ya da "python", numpy kurulu değilse python kullanılır
+app.config["SKETCH_EPSILON"] = 0.005 # count-min özetinde kullanıcının günlük adedi en fazla günlük toplamın bu oranı kadar fazla sayılır
+app.config["SKETCH_DELTA"] = 0.01 # count-min özetinin bu sınırı aşma olasılığı
+app.config["SKETCH_TOP_K"] = 50 # günün en çok alan kullanıcı / en çok satan ürün özetinde tutulan eleman sayısı
+app.config["SKETCH_HLL_ERROR"] = 0.05 # tekil alıcı / tıklayan sayısı özetinin hedeflenen göreli standart hatası
+app.config["COLUMNAR_DIR"] = os.path.join(app.instance_path, "columnar") # export-columnar komutunun yazdığı, "arrow" motorunun okuduğu klasör
+app.config["ANALYTICS_SNAPSHOT"] = False # True ise panel sorguları proje.db yerine onun salt okunur kopyasından okunur
+app.config["ANALYTICS_SNAPSHOT_INTERVAL"] = 300 # analiz kopyası bu kadar saniyeden eskiyse arka planda yenilenir
+app.config["ANALYTICS_SNAPSHOT_PATH"] = os.path.join(app.instance_path, "analytics.db") # analiz kopyasının dosyası
+app.config["SQLALCHEMY_BINDS"] = {"analytics": "sqlite:///" + app.config["ANALYTICS_SNAPSHOT_PATH"]} # panel sorgularının gittiği kopya
+
+# Veritabanını uygulamaya bağlıyoruz
+db.init_app(app)
+# her sqlite bağlantısında WAL, synchronous, cache_size gibi ayarlar uygulanır
+schema.init_app(app)
+
+# ürün sayfası tıklamaları arka planda toplu olarak yazılır
+click_buffer.init_app(app)
+# istek süreleri ve sql sorguları ölçülür, /admin/metrics
+metrics.init_app(app)
+
+login_manager = LoginManager(app)
+login_manager.login_view = "login"
+
+
+# Giriş yapan kullanıcıyı ID'sinden tanıma
+@login_manager.user_loader
+def load_user(user_id):
+    return user_man.load_user(user_id)
+
+
+# Ana Sayfa
+
+
+# ürünleri belirtilen kategoriye, aramaya ya da sıralama isteğine göre veritabanından ilgili verileri çekiyor.
+# popülerliğe göre sıralamada ürün tıklanma sayaçları kullanılıyor, ürünler sayfa sayfa yüklenir
+@app.route("/")
+def index():
+    return data_man.index()
+
+
+# ana sayfadaki sonsuz kaydırma için sonraki sayfa, "cursor" bir önceki cevabın next_cursor değeri
+@app.route("/api/products")
+def products_api():
+    return data_man.products_api()
+
+
+# Ürün Sayfası
+
+
+# Kullanıcı sayfaya girdiği an ClickLog kaydı atar
+# Ürünün renk seçim grafiklerini sunar
+# Ürünün son 1 aylık alım grafiğini outlier analizi ve analiz sonucu optimize edilmiş grafikleri sunar.
+@app.route("/product/<int:product_id>")
+def product_detail(product_id):
+    return data_man.product_detail(product_id)
+
+
+# Satın Alma İşlemi
+
+
+# Hızlı satın alma
+# X ürününü Y renkte satın aldı
+@app.route("/buy_now", methods=["POST"])
+@login_required
+def buy_now():
+    return user_man.buy_now()
+
+
+# Toplu satın alma
+# ürün / renk / adet listesini tek transaction ile satın alır
+@app.route("/buy_bulk", methods=["POST"])
+@login_required
+def buy_bulk():
+    return user_man.buy_bulk()
+
+
+# Yönetici Paneli
+
+
+# Tüm verileri harmanlar, popüler ürünlerin tıklanma-alımı, kullanıcı cinsiyet dağılımı, şehir-meslek-kategori bazlı segmentasyon
+# Global Outlier Analizi, varsayılan olarak son 30 güne bakar (?days=N, ?days=all ya da ?from=...&to=... ile değiştirilebilir), standart sapmanın 2 katından fazla satış olan günleri,
+# ardından o günkü anomaliye sebep olan "Whale" müşteriyi bulur ve temizleyip raporlar
+# Outlier analizi ile temizlediği verileri kullanarak segment1 ve segment2 grafiklerini de ona göre oluşturur. whale_blacklist{}
+@app.route("/admin/dashboard")
+@login_required
+def admin_dashboard():
+    return data_man.admin_dashboard()
+
+
+# Panel grafiklerinin verisi (JSON)
+# popularity, gender, segment-gender, segment-category, outliers; tarih aralığı panel ile aynı parametrelerle verilir
+@app.route("/admin/dashboard/charts/<name>")
+@login_required
+def dashboard_chart(name):
+    return data_man.dashboard_chart(name)
+
+
+# Tüm Katalog Anomali Raporu
+# ürün sayfasındaki outlier analizini tüm ürünler için paralel süreçlerde çalıştırır, tarih aralığı panel ile aynı parametrelerle verilir
+@app.route("/admin/anomaly-report")
+@login_required
+def anomaly_report_view():
+    return data_man.anomaly_report_view()
+
+
+# panel önbelleğinin isabet / ıska sayaçları
+@app.route("/admin/cache-stats")
+@login_required
+def cache_stats():
+    return data_man.cache_stats()
+
+
+# tıklama tamponunun kuyruk uzunluğu ve yazma süreleri
+@app.route("/admin/click-stats")
+@login_required
+def click_stats():
+    return data_man.click_stats()
+
+
+# endpoint bazında istek süreleri, sql sorgu sayısı / süresi, en yavaş sorgular ve profiller
+# herhangi bir sayfaya admin olarak "?profile=1" eklenirse o istek profillenir
+@app.route("/admin/metrics")
+@login_required
+def metrics_view():
+    return data_man.metrics_view()
+
+
+# Yetkilendirme Fonksiyonları
+
+
+# Klasik giriş çıkış ve kayıt işlemleri
+@app.route("/register", methods=["GET", "POST"])
+def register():
+    return user_man.register()
+
+
+@app.route("/login", methods=["GET", "POST"])
+def login():
+    return user_man.login()
+
+
+@app.route("/logout")
+def logout():
+    return user_man.logout()
+
+
+# Veri Oluşturma Fonksiyonu
+
+
+# Eski veri tabanını silip sıfırdan kurar
+# Sahte trafik yaratır
+# Her güne normal satış yaptırır
+# Bilerek Outlier çıkartacak şekilde "Whale" anormal verisi oluşturur,
+# bu sayede analiz tarafında inceleyebilelim
+# ölçek ayarları komut satırından verilir, ör: flask init-db --users 100000 --days 90 --min-visitors 20000 --max-visitors 40000 --workers 8
+@app.cli.command("init-db")
+@click.option("--users", default=200, show_default=True, help="Admin dışındaki kullanıcı sayısı.")
+@click.option("--days", default=30, show_default=True, help="Bugünden geriye kaç günlük trafik üretilecek.")
+@click.option("--min-visitors", default=10, show_default=True, help="Günlük en az ziyaretçi.")
+@click.option("--max-visitors", default=40, show_default=True, help="Günlük en fazla ziyaretçi.")
+@click.option("--whales", default=2, show_default=True, help="Whale alımı olan outlier gün sayısı.")
+@click.option("--seed", type=int, default=None, help="Aynı veriyi tekrar üretmek için seed.")
+@click.option("--chunk-size", default=50000, show_default=True, help="Tek executemany ile yazılan satır sayısı.")
+@click.option("--workers", default=1, show_default=True, help="Günleri üreten paralel süreç sayısı.")
+def init_db(users, days, min_visitors, max_visitors, whales, seed, chunk_size, workers):
+    # sadece proje.db, analiz kopyası ("analytics" bind'i) proje.db'den kopyalanır
+    db.drop_all(bind_key=None)  # tabloları temizle
+    db.create_all(bind_key=None)  # tabloları yeniden oluştur
+
+    generator.generate(
+        users=users,
+        days=days,
+        min_visitors=min_visitors,
+        max_visitors=max_visitors,
+        whales=whales,
+        seed=seed,
+        chunk_size=chunk_size,
+        workers=workers,
+    )
+
+    # admin paneli için günlük özet tablolarını oluştur
+    print("Özet tablolar hesaplanıyor...")
+    rollup.rebuild()
+    search.rebuild()  # ürün arama indexi
+    user_dim.invalidate()  # kullanıcılar toplu yazıldığı için ORM olayları tetiklenmez
+    user_cache.clear()
+    schema.analyze()
+    print("BİTTİ. Veritabanı hazır.")
+
+
+# Sütunlu Dışa Aktarım
+
+
+# satın alma / tıklama kayıtlarını gün bölümlü Arrow dosyalarına yazar, kullanıcı ve ürün tablolarını da yanına kopyalar
+# her çalıştırmada sadece bir önceki çalıştırmadan sonra eklenen kayıtlar yazılır
+@app.cli.command("export-columnar")
+@click.option("--full", is_flag=True, help="Klasörü silip tüm kayıtları baştan yaz.")
+@click.option("--chunk-size", default=500000, show_default=True, help="Veritabanından tek seferde okunan kayıt sayısı.")
+def export_columnar(full, chunk_size):
+    counts = columnar.export(app.config["COLUMNAR_DIR"], full=full, chunk_size=chunk_size)
+    for name, count in counts.items():
+        print(f"{name}: {count} yeni kayıt")
+    print(f"Dosyalar {app.config['COLUMNAR_DIR']} klasörüne yazıldı.")
+
+
+# Anomali Raporu
+
+
+# her ürün için günlük satışlardan outlier günlerini, çıkarılan whale alımını ve temizlenmiş dönüşüm oranını hesaplar
+# ürünler bölümlere ayrılıp --workers kadar süreçte analiz edilir, ör: flask anomaly-report --days 90 --workers 8
+@app.cli.command("anomaly-report")
+@click.option("--days", type=int, help="Son kaç güne bakılacak (verilmezse tüm geçmiş).")
+@click.option("--workers", type=int, help="Paralel süreç sayısı (varsayılan ANOMALY_REPORT_WORKERS).")
+@click.option("--all", "show_all", is_flag=True, help="Outlier'ı olmayan ürünleri de listele.")
+def anomaly_report_cmd(days, workers, show_all):
+    window = None
+    if days is not None:
+        if days < 1:
+            raise click.BadParameter("en az 1 gün olmalı", param_hint="--days")
+        window = data_man.last_days(days)
+    report = anomaly_report.build(window, workers or app.config["ANOMALY_REPORT_WORKERS"])
+
+    print(f"{'ID':>5}  {'Ürün':<30} {'Satış':>7} {'Whale':>7} {'Temiz':>7} {'Tıklama':>8} {'Oran %':>7}  Outlier Günleri")
+    for r in report["products"]:
+        if not show_all and not r["outlier_days"]:
+            continue
+        print(
+            f"{r['product_id']:>5}  {r['name'][:30]:<30} {r['purchases']:>7} {r['whale_removed']:>7} "
+            f"{r['clean_purchases']:>7} {r['clicks']:>8} {r['rate']:>7}  {', '.join(r['outlier_days'])}"
+        )
+    print(f"{len(report['products'])} ürün analiz edildi, {report['flagged']} üründe outlier bulundu.")
+
+
+# Ham Logların Sıkıştırılması
+
+
+# RETENTION_DAYS günden eski tıklamaları günlük özet tablosuna toplar, eski ham tıklama / satın alma kayıtlarını
+# parça parça siler ve boşalan alanı dosyadan geri verir. panel ve ürün sayfası özet ile ham veriyi birlikte okur
+@app.cli.command("compact-logs")
+@click.option("--days", type=int, help="Bu günden eski kayıtlar sıkıştırılır (varsayılan RETENTION_DAYS).")
+@click.option("--batch-size", type=int, help="Tek seferde silinen kayıt sayısı (varsayılan RETENTION_BATCH).")
+def compact_logs(days, batch_size):
+    days = days if days is not None else app.config["RETENTION_DAYS"]
+    if days < 1:
+        raise click.BadParameter("en az 1 gün olmalı", param_hint="--days")
+    # silinecek ham kayıtlar olasılıksal özetlere işlenmemişse önce işlenir
+    sketches.catch_up()
+    result = retention.compact(days, batch_size or app.config["RETENTION_BATCH"])
+    print(f"{result['before']} öncesi sıkıştırıldı: {result['aggregated']} günlük tıklama satırı eklendi,")
+    print(f"{result['clicks']} tıklama ve {result['purchases']} satın alma kaydı silindi.")
+    if result["vacuum_pages"] is None:
+        print("auto_vacuum kapalı, alan geri verilmedi (flask upgrade-db ile açılabilir).")
+    else:
+        print(f"{result['vacuum_pages']} sayfa dosyadan geri verildi.")
+
+
+# Analiz Kopyası
+
+
+# proje.db'nin panel sorguları için kullanılan salt okunur kopyasını yeniler (ANALYTICS_SNAPSHOT açıksa)
+# sunucu kopyayı ANALYTICS_SNAPSHOT_INTERVAL'de bir kendisi yeniler, komut cron ile düzenli kopya almak için
+@app.cli.command("refresh-snapshot")
+def refresh_snapshot():
+    seconds = snapshot.refresh()
+    print(f"Analiz kopyası {app.config['ANALYTICS_SNAPSHOT_PATH']} dosyasına {seconds:.2f} saniyede alındı.")
+
+
+# Olasılıksal Özet Kontrolü
+
+
+# "approx" motorunun kullandığı özetlerin tahminlerini özet tablolardaki kesin değerlerle karşılaştırır
+# count-min hatasının SKETCH_EPSILON sınırını SKETCH_DELTA'dan fazla aşması ya da tekil sayım hatasının
+# beklenenin 3 katını geçmesi durumunda hata koduyla çıkar, ör: flask sketch-check --days 90
+@app.cli.command("sketch-check")
+@click.option("--days", type=int, help="Son kaç güne bakılacak (verilmezse tüm geçmiş).")
+def sketch_check(days):
+    window = None
+    if days is not None:
+        if days < 1:
+            raise click.BadParameter("en az 1 gün olmalı", param_hint="--days")
+        window = data_man.last_days(days)
+    sketches.catch_up()  # sunucunun henüz işlemediği kayıtlar
+    r = sketches.check(window)
+    print(f"{r['days']} gün kontrol edildi.")
+    print(
+        f"Günün whale'i: belirgin whale olan {r['top_buyer_heavy_days']} günün {r['top_buyer_match']} tanesinde aynı, "
+        f"adette en fazla {r['top_buyer_qty_error']} fazla."
+    )
+    print(f"Günün en çok satan ürünü: belirgin olan {r['top_product_heavy_days']} günün {r['top_product_match']} tanesinde aynı.")
+    print(
+        f"Kullanıcı adetleri: {r['qty_checked']} satırın {r['qty_over_bound']} tanesi sınır dışında, "
+        f"en büyük hata günlük toplamın %{r['qty_max_error_ratio'] * 100:.3f}'i."
+    )
+    for kind, label in (("buyers", "Tekil alıcı"), ("clickers", "Tekil tıklayan")):
+        print(
+            f"{label}: {r[f'{kind}_checked']} ürün x gün, ortalama hata %{r[f'{kind}_mean_error'] * 100:.2f}, "
+            f"en büyük %{r[f'{kind}_max_error'] * 100:.2f}, aralık boyunca en büyük %{r[f'{kind}_window_error'] * 100:.2f}."
+        )
+
+    failed = r["qty_checked"] and r["qty_over_bound"] / r["qty_checked"] > app.config["SKETCH_DELTA"]
+    failed = failed or any(r[f"{kind}_mean_error"] > 3 * r["hll_expected_error"] for kind in ("buyers", "clickers"))
+    if failed:
+        raise click.ClickException("özet hataları beklenen sınırların dışında")
+
+
+# Özet Tabloları Yeniden Oluşturma
+
+
+# Günlük özet tablolarını ham PurchaseLog kayıtlarından sıfırdan hesaplar
+# eski bir veritabanında ilk kez çalıştırılırken ya da tablolar kaydığında kullanılır
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups():
+    rollup.rebuild()
+    print("Özet tablolar yeniden oluşturuldu.")
+
+
+# Sayaç Düzeltme
+
+
+# ProductStat üzerindeki tıklanma / satış sayaçlarını ham loglardan sayıp kaymış olanları düzeltir
+@app.cli.command("reconcile-counters")
+def reconcile_counters():
+    fixed = product_stats.reconcile()
+    print(f"{fixed} ürünün sayaçları düzeltildi.")
+
+
+# Şema Güncelleme
+
+
+# Eski bir proje.db dosyasını verileri silmeden güncel şemaya taşır
+# eksik tablo / sütun / indexleri ekler, gerekirse özet tabloları yeniden hesaplar
+@app.cli.command("upgrade-db")
+def upgrade_db():
+    schema.upgrade()
+    print("Veritabanı güncel.")
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
@@ -0,0 +1,237 @@
+import argparse  # komut satırı seçenekleri için
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess  # her ölçek ayrı bir süreçte ölçülür
+import sys
+import tempfile
+import time
+import tracemalloc  # bellek tepe değeri için
+
+# Performans Ölçümü (Benchmark)
+# her veri ölçeği için geçici bir sqlite veritabanı init-db ile doldurulur,
+# ana sayfa, ürün sayfası ve yönetici paneli Flask test istemcisi ile çağrılarak
+# gecikme yüzdelikleri, istek başına sql sorgu sayısı ve bellek tepe değeri ölçülür.
+# sonuçlar JSON dosyasına yazılır, --compare ile önceki bir çalıştırmayla karşılaştırılabilir
+#
+# kullanım:
+#   python benchmark.py --scales 10000,100000,1000000 --out sonuc.json
+#   python benchmark.py --scales 10000 --compare onceki.json
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000, 10_000_000]
+DAYS = 30
+PURCHASES_PER_VISIT = 6  # ziyaretçi başına ortalama satın alma: 3 ürün x ortalama 2 adet
+
+
+# satın alma hedefine göre init-db seçenekleri
+def init_args(scale, seed, workers):
+    visitors = max(1, round(scale / (DAYS * PURCHASES_PER_VISIT)))
+    return [
+        "init-db",
+        "--users", str(max(200, visitors * 2)),
+        "--days", str(DAYS),
+        "--min-visitors", str(max(1, int(visitors * 0.8))),
+        "--max-visitors", str(max(1, int(visitors * 1.2))),
+        "--seed", str(seed),
+        "--workers", str(workers),
+    ]
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    return {
+        "min": round(ordered[0], 3),
+        "p50": pick(50),
+        "p90": pick(90),
+        "p99": pick(99),
+        "max": round(ordered[-1], 3),
+        "mean": round(sum(ordered) / len(ordered), 3),
+    }
+
+
+# Tek Ölçeğin Ölçümü (alt süreç)
+# DATABASE_URL ortam değişkeni app import edilmeden önce ayarlanmış olmalı
+def run_scale(scale, iterations, memory_runs, seed, workers):
+    from sqlalchemy import event
+
+    from app import app
+    from scripts.data import db, Product, ClickLog, PurchaseLog
+    import scripts.cache as cache
+    import scripts.page_cache as page_cache
+
+    result = {"scale": scale}
+
+    start = time.perf_counter()
+    out = app.test_cli_runner().invoke(args=init_args(scale, seed, workers), catch_exceptions=False)
+    if out.exit_code != 0:
+        raise RuntimeError(out.output)
+    result["seed_seconds"] = round(time.perf_counter() - start, 2)
+
+    with app.app_context():
+        result["purchases"] = db.session.query(PurchaseLog).count()
+        result["clicks"] = db.session.query(ClickLog).count()
+        db_path = db.engine.url.database
+        product_ids = [p for (p,) in db.session.query(Product.id)]
+    result["db_mb"] = round(os.path.getsize(db_path) / 2**20, 1)
+
+    # istek başına sorgu sayısı (arka plan thread'lerinin sorguları da sayılır)
+    queries = [0]
+    with app.app_context():
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def _count(*_):
+            queries[0] += 1
+
+    anon = app.test_client()
+    admin = app.test_client()
+    admin.post("/login", data={"username": "admin", "password": "123"})
+    rng = random.Random(seed)
+
+    # ölçülen görünümler: ad -> (istemci, url üreten fonksiyon, istekten önce çalışacak hazırlık)
+    # ana sayfa ve ürün sayfası sayfa önbelleğinden (sıcak) ve önbellek boşken (soğuk) ölçülür
+    views = {
+        "index": (anon, lambda: "/", None),
+        "index_cold": (anon, lambda: "/", page_cache.clear),
+        "index_search": (anon, lambda: "/?q=ayak", None),
+        "index_search_cold": (anon, lambda: "/?q=ayak", page_cache.clear),
+        "product_detail": (admin, lambda: f"/product/{rng.choice(product_ids)}", None),
+        "product_detail_cold": (admin, lambda: f"/product/{rng.choice(product_ids)}", page_cache.clear),
+        "admin_dashboard": (admin, lambda: "/admin/dashboard", None),
+    }
+    # panel grafikleri ayrı adreslerden yüklenir, her biri önbellekten (sıcak) ve önbellek boşken (soğuk) ölçülür
+    for chart in ("popularity", "gender", "segment-gender", "segment-category", "outliers"):
+        views[f"chart_{chart}"] = (admin, lambda chart=chart: f"/admin/dashboard/charts/{chart}", None)
+        views[f"chart_{chart}_cold"] = (admin, lambda chart=chart: f"/admin/dashboard/charts/{chart}", cache.clear)
+
+    result["views"] = {}
+    for name, (client, url, prepare) in views.items():
+        # ısınma
+        if prepare:
+            prepare()
+        client.get(url())
+
+        latencies = []
+        counts = []
+        for _ in range(iterations):
+            if prepare:
+                prepare()
+            path = url()
+            queries[0] = 0
+            t0 = time.perf_counter()
+            response = client.get(path)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            counts.append(queries[0])
+            if response.status_code != 200:
+                raise RuntimeError(f"{name}: {path} -> {response.status_code}")
+
+        # tracemalloc istekleri yavaşlattığı için bellek ayrı turlarda ölçülür
+        tracemalloc.start()
+        peak = 0
+        for _ in range(memory_runs):
+            if prepare:
+                prepare()
+            tracemalloc.reset_peak()
+            client.get(url())
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        result["views"][name] = {
+            "latency_ms": percentiles(latencies),
+            "queries": {"min": min(counts), "max": max(counts)},
+            "peak_mb": round(peak / 2**20, 2),
+        }
+        print(f"  {name}: p50 {result['views'][name]['latency_ms']['p50']} ms", file=sys.stderr)
+    return result
+
+
+# Karşılaştırma
+# iki sonuç dosyasında aynı ölçek ve görünüm için p50 / p90 değişimi (%)
+def compare(previous, current):
+    old = {r["scale"]: r for r in previous["results"]}
+    for r in current["results"]:
+        base = old.get(r["scale"])
+        if not base:
+            continue
+        print(f"scale {r['scale']}:")
+        for name, view in r["views"].items():
+            if name not in base["views"]:
+                continue
+            line = []
+            for key in ("p50", "p90"):
+                before = base["views"][name]["latency_ms"][key]
+                after = view["latency_ms"][key]
+                change = (after - before) / before * 100 if before else 0.0
+                line.append(f"{key} {before:.1f} -> {after:.1f} ms ({change:+.0f}%)")
+            print(f"  {name:22} " + ", ".join(line))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="data_man görünümleri için performans ölçümü")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="virgülle ayrılmış satın alma sayıları")
+    parser.add_argument("--iterations", type=int, default=50, help="görünüm başına ölçülen istek sayısı")
+    parser.add_argument("--memory-runs", type=int, default=3, help="bellek ölçümü için istek sayısı")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="init-db işçi süreç sayısı")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="karşılaştırılacak önceki sonuç dosyası")
+    parser.add_argument("--keep-db", action="store_true", help="geçici veritabanlarını silme")
+    parser.add_argument("--run-scale", type=int, help=argparse.SUPPRESS)  # alt süreç için
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale is not None:
+        result = run_scale(args.run_scale, args.iterations, args.memory_runs, args.seed, args.workers)
+        with open(args.result_file, "w") as f:
+            json.dump(result, f)
+        return
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "results": [],
+    }
+    here = os.path.dirname(os.path.abspath(__file__))
+    for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+        print(f"scale {scale}: veritabanı hazırlanıyor...", file=sys.stderr)
+        workdir = tempfile.mkdtemp(prefix=f"bench_{scale}_")
+        db_path = os.path.join(workdir, "bench.db")
+        result_file = os.path.join(workdir, "result.json")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+        cmd = [
+            sys.executable, os.path.abspath(__file__),
+            "--run-scale", str(scale),
+            "--result-file", result_file,
+            "--iterations", str(args.iterations),
+            "--memory-runs", str(args.memory_runs),
+            "--seed", str(args.seed),
+            "--workers", str(args.workers),
+        ]
+        # init-db çıktısı ölçüm çıktısına karışmasın
+        subprocess.run(cmd, env=env, cwd=here, check=True, stdout=subprocess.DEVNULL)
+        with open(result_file) as f:
+            report["results"].append(json.load(f))
+        if not args.keep_db:
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Sonuçlar {args.out} dosyasına yazıldı.", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
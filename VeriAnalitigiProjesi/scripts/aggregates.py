@@ -0,0 +1,146 @@
+from sqlalchemy import func, tuple_
+
+import scripts.retention as retention
+
+# func: sql fonksiyonları için
+# tuple_: (kullanıcı, gün) çiftleri üzerinden filtreleme için
+from scripts.data import db, Product, DailyProductStat, DailyUserStat, ProductStat
+
+# Admin Paneli Agregasyon Katmanı
+# tüm hesaplamalar GROUP BY ve JOIN ile veritabanında yapılır,
+# python tarafına sadece grafiklerin ihtiyaç duyduğu özet satırlar (tuple) döner
+
+
+# "Whale" kara listesindeki (kullanıcı, gün) çiftlerini hariç tutan filtre
+def _exclude_whales(query, whale_blacklist):
+    if not whale_blacklist:
+        return query
+    return query.filter(
+        ~tuple_(DailyUserStat.user_id, DailyUserStat.day).in_(list(whale_blacklist))
+    )
+
+
+# tarih aralığı filtresi, window: (başlangıç günü, bitiş günü) ikisi de dahil, None ise tüm geçmiş
+# özet tabloların birincil anahtarı gün ile başladığı için filtre index üzerinden aralık taraması olur
+def _in_window(query, day_column, window):
+    if window is None:
+        return query
+    start, end = window
+    return query.filter(day_column.between(start, end))
+
+
+# [(gün, toplam satış)] gün sırasına göre
+def daily_totals(window=None):
+    query = db.session.query(DailyProductStat.day, func.sum(DailyProductStat.qty))
+    query = _in_window(query, DailyProductStat.day, window)
+    return query.group_by(DailyProductStat.day).order_by(DailyProductStat.day).all()
+
+
+# verilen günlerde en çok alım yapan kullanıcı: {gün: (user_id, adet)}
+def top_buyers(days):
+    if not days:
+        return {}
+    per_user = (
+        db.session.query(
+            DailyUserStat.day.label("day"),
+            DailyUserStat.user_id.label("user_id"),
+            func.sum(DailyUserStat.qty).label("qty"),
+        )
+        .filter(DailyUserStat.day.in_(days))
+        .group_by(DailyUserStat.day, DailyUserStat.user_id)
+        .subquery()
+    )
+    ranked = db.session.query(
+        per_user.c.day,
+        per_user.c.user_id,
+        per_user.c.qty,
+        func.row_number()
+        .over(
+            partition_by=per_user.c.day,
+            order_by=(per_user.c.qty.desc(), per_user.c.user_id),
+        )
+        .label("rn"),
+    ).subquery()
+    rows = db.session.query(ranked.c.day, ranked.c.user_id, ranked.c.qty).filter(
+        ranked.c.rn == 1
+    )
+    return {d: (user_id, qty) for d, user_id, qty in rows}
+
+
+# verilen günlerde en çok satan ürün: {gün: (product_id, ad, kategori)}
+def top_products(days):
+    if not days:
+        return {}
+    ranked = (
+        db.session.query(
+            DailyProductStat.day.label("day"),
+            Product.id.label("product_id"),
+            Product.name.label("name"),
+            Product.category.label("category"),
+            func.row_number()
+            .over(
+                partition_by=DailyProductStat.day,
+                order_by=(DailyProductStat.qty.desc(), Product.id),
+            )
+            .label("rn"),
+        )
+        .join(Product, Product.id == DailyProductStat.product_id)
+        .filter(DailyProductStat.day.in_(days))
+        .subquery()
+    )
+    rows = db.session.query(
+        ranked.c.day, ranked.c.product_id, ranked.c.name, ranked.c.category
+    ).filter(ranked.c.rn == 1)
+    return {d: (product_id, name, category) for d, product_id, name, category in rows}
+
+
+# tıklanma sayısına göre ilk "limit" ürün: [(product_id, ad, tıklanma)]
+# tüm geçmiş için tıklanma sayıları ProductStat sayaçlarından, popülerlik indexi üzerinden okunur,
+# tarih aralığında ise ClickLog (gün, ürün) indexi ve sıkıştırılmış günlük tıklamalar üzerinden sayılır
+def top_clicked_products(limit=10, window=None):
+    if window is not None:
+        clicks = retention.click_counts(window).subquery()
+        count = func.coalesce(clicks.c.clicks, 0)
+        return (
+            db.session.query(Product.id, Product.name, count)
+            .outerjoin(clicks, clicks.c.product_id == Product.id)
+            .order_by(count.desc(), Product.id)
+            .limit(limit)
+            .all()
+        )
+    return (
+        db.session.query(Product.id, Product.name, ProductStat.clicks)
+        .join(ProductStat, ProductStat.product_id == Product.id)
+        .order_by(ProductStat.clicks.desc(), ProductStat.product_id)
+        .limit(limit)
+        .all()
+    )
+
+
+# "Whale" alımları çıkarılmış ürün bazlı satış adedi: {product_id: adet}
+def clean_product_counts(whale_blacklist, product_ids, window=None):
+    query = db.session.query(
+        DailyUserStat.product_id, func.sum(DailyUserStat.qty)
+    ).filter(DailyUserStat.product_id.in_(product_ids))
+    query = _in_window(query, DailyUserStat.day, window)
+    query = _exclude_whales(query, whale_blacklist)
+    return dict(query.group_by(DailyUserStat.product_id).all())
+
+
+# temiz satışların kullanıcı bazında toplamı: [(kullanıcı, adet)]
+# şehir - meslek - cinsiyet kırılımı data_man içinde kullanıcı boyut tablosu ile yapılır
+def segment_genders(whale_blacklist, window=None):
+    query = db.session.query(DailyUserStat.user_id, func.sum(DailyUserStat.qty))
+    query = _in_window(query, DailyUserStat.day, window)
+    query = _exclude_whales(query, whale_blacklist)
+    return query.group_by(DailyUserStat.user_id).all()
+
+
+# temiz satışların kullanıcı - kategori kırılımı: [(kullanıcı, kategori, adet)]
+def segment_categories(whale_blacklist, window=None):
+    query = db.session.query(
+        DailyUserStat.user_id, Product.category, func.sum(DailyUserStat.qty)
+    ).join(Product, Product.id == DailyUserStat.product_id)
+    query = _in_window(query, DailyUserStat.day, window)
+    query = _exclude_whales(query, whale_blacklist)
+    return query.group_by(DailyUserStat.user_id, Product.category).all()
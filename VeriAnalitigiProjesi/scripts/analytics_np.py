@@ -0,0 +1,249 @@
+import statistics  # eşik hesabı saf python yolu ile birebir aynı sonucu versin diye
+
+from scripts.data import db, Product, DailyUserStat, ProductStat
+import scripts.retention as retention
+import scripts.user_dim as user_dim
+
+# numpy opsiyonel bir bağımlılık, kurulu değilse data_man saf python/sql yolunu kullanır
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Vektörel (NumPy) Analiz Motoru
+# satış, tıklama ve kullanıcı verileri bir kere sütunlu dizilere yüklenir,
+# günlük sayımlar, whale temizliği ve segment çapraz tabloları bincount / unique ile hesaplanır
+# sonuçlar data_man içindeki saf python yolu ile birebir aynıdır
+
+
+def available():
+    return np is not None
+
+
+# Sütunlu veri seti
+# satışlar günlük özet tablosundan (gün x kullanıcı x ürün) okunur,
+# kullanıcı ve ürün özellikleri id ile indekslenen dizilerde tutulur
+# verinin nereden okunduğu _load_* metodlarındadır, başka bir kaynak (örn. columnar.ArrowFrame) bunları değiştirir
+class Frame:
+    def __init__(self, window=None):
+        # günler sıralı olarak kodlanıyor, day_idx her satırın gün kodu
+        self.days, self.day_idx, self.user_id, self.product_id, self.qty = self._load_sales(window)
+
+        # ürün özellikleri
+        products = self._load_products()
+        self.products = {p.id: p for p in products}
+        p_size = max([p.id for p in products] + [int(self.product_id.max(initial=0))]) + 1
+        categories = sorted({p.category for p in products})
+        self.categories = categories
+        self.product_cat = np.full(p_size, -1, dtype=np.int64)
+        for p in products:
+            self.product_cat[p.id] = categories.index(p.category)
+
+        # ürün bazlı tıklanma sayıları
+        self.clicks = np.zeros(p_size, dtype=np.int64)
+        for prod_id, c in self._load_clicks(window):
+            if prod_id is not None and prod_id < p_size:
+                self.clicks[prod_id] = c
+
+        # kullanıcı özellikleri: cinsiyet kodu (E=0, K=1), yaş ve şehir - meslek segment kodu
+        # kullanıcı boyut tablosundan, satırlarda tabloda olmayan bir kullanıcı varsa diziler genişletilir
+        dim = self._load_users()
+        gender, age, segment = dim.arrays()
+        u_size = max(len(dim), int(self.user_id.max(initial=0)) + 1)
+        self.user_gender = np.full(u_size, -1, dtype=np.int64)
+        self.user_age = np.zeros(u_size, dtype=np.int64)
+        self.user_segment = np.full(u_size, -1, dtype=np.int64)
+        self.user_gender[: len(dim)] = gender
+        self.user_age[: len(dim)] = age
+        self.user_segment[: len(dim)] = segment
+        self.segment_labels = dim.segment_labels
+        self.gender_totals = dim.gender_totals
+
+    # (sıralı günler, gün kodu, kullanıcı, ürün, adet) dizileri
+    def _load_sales(self, window):
+        query = db.session.query(
+            DailyUserStat.day,
+            DailyUserStat.user_id,
+            DailyUserStat.product_id,
+            DailyUserStat.qty,
+        )
+        if window is not None:
+            query = query.filter(DailyUserStat.day.between(*window))
+        rows = query.all()
+        days, user_ids, product_ids, qtys = zip(*rows) if rows else ((), (), (), ())
+        unique_days, day_idx = np.unique(np.array(days, dtype=str), return_inverse=True)
+        return (
+            unique_days,
+            day_idx,
+            np.array(user_ids, dtype=np.int64),
+            np.array(product_ids, dtype=np.int64),
+            np.array(qtys, dtype=np.int64),
+        )
+
+    # id, name, category alanları olan ürün listesi
+    def _load_products(self):
+        return Product.query.all()
+
+    # [(ürün, tıklanma)], tarih aralığında ham ve sıkıştırılmış tıklamalardan sayılır
+    def _load_clicks(self, window):
+        if window is None:
+            return db.session.query(ProductStat.product_id, ProductStat.clicks)
+        return db.session.execute(retention.click_counts(window))
+
+    # bellekteki kullanıcı boyut tablosu
+    def _load_users(self):
+        return user_dim.get()
+
+
+# her gün için en yüksek toplamlı "other" değeri (kullanıcı ya da ürün)
+# eşitlikte küçük id seçilir, sql yolundaki ROW_NUMBER sıralaması ile aynı
+def _top_per_day(day_idx, other, qty):
+    if len(qty) == 0:
+        return {}
+    width = int(other.max()) + 1
+    uniq, inv = np.unique(day_idx * width + other, return_inverse=True)
+    sums = np.bincount(inv, weights=qty).astype(np.int64)
+    d, o = uniq // width, uniq % width
+    order = np.lexsort((o, -sums, d))
+    first = np.r_[True, d[order][1:] != d[order][:-1]]
+    return {int(d[i]): (int(o[i]), int(sums[i])) for i in order[first]}
+
+
+# Global Outlier Analizi, data_man._outlier_analysis ile aynı çıktı
+# kara liste (kullanıcı, gün) yerine satır maskesi olarak da döner
+def outlier_analysis(frame):
+    totals = np.bincount(frame.day_idx, weights=frame.qty, minlength=len(frame.days))
+    counts = totals.astype(np.int64).tolist()
+    sorted_dates = frame.days.tolist()
+
+    # seçilen aralıkta hiç satış yoksa boş grafik
+    if not counts:
+        empty = {"labels": [], "data": [], "outliers": [], "clean_data": [], "details": []}
+        return empty, np.ones(len(frame.qty), dtype=bool)
+
+    # mean ve standart sapma hesaplama
+    if len(counts) > 1:
+        mean = statistics.mean(counts)
+        stdev = statistics.stdev(counts)
+    else:
+        mean = counts[0]
+        stdev = 0
+
+    # anormallik sınırı
+    threshold = mean + (2 * stdev) if stdev > 0 else mean + 10
+
+    outlier_mask = totals > threshold
+    rows = outlier_mask[frame.day_idx]
+    whales = _top_per_day(frame.day_idx[rows], frame.user_id[rows], frame.qty[rows])
+    top_prods = _top_per_day(frame.day_idx[rows], frame.product_id[rows], frame.qty[rows])
+
+    # kara listedeki (kullanıcı, gün) çiftlerine ait satırlar
+    whale_rows = np.zeros(len(frame.qty), dtype=bool)
+    outliers_arr = []
+    clean_arr = []
+    details_list = []
+    for i, (d, total) in enumerate(zip(sorted_dates, counts)):
+        if i in whales:
+            whale_user_id, whale_qty = whales[i]
+            whale_rows |= (frame.day_idx == i) & (frame.user_id == whale_user_id)
+            outliers_arr.append(total)
+            clean_arr.append(total - whale_qty)
+
+            prod_obj = frame.products.get(top_prods[i][0])
+            details_list.append(
+                {
+                    "date": d,
+                    "total_sales": total,
+                    "outlier_qty": whale_qty,
+                    "prod_name": prod_obj.name if prod_obj else "",
+                    "prod_id": prod_obj.id if prod_obj else 0,
+                    "category": prod_obj.category if prod_obj else "Genel",
+                }
+            )
+        else:
+            outliers_arr.append(None)
+            clean_arr.append(total)
+
+    outlier_data = {
+        "labels": sorted_dates,
+        "data": counts,
+        "outliers": outliers_arr,
+        "clean_data": clean_arr,
+        "details": details_list,
+    }
+    return outlier_data, ~whale_rows
+
+
+# Popüler Ürünler Grafiği
+def popularity_chart(frame, clean_rows):
+    clean_counts = np.bincount(
+        frame.product_id[clean_rows],
+        weights=frame.qty[clean_rows],
+        minlength=len(frame.clicks),
+    ).astype(np.int64)
+    # tıklanmaya göre azalan, eşitlikte ürün id sırası
+    prod_ids = [p for p in np.lexsort((np.arange(len(frame.clicks)), -frame.clicks)) if p in frame.products][:10]
+
+    pop_data = {"labels": [], "clicks": [], "purchases": []}
+    for p in prod_ids:
+        pop_data["labels"].append(frame.products[p].name)
+        pop_data["clicks"].append(int(frame.clicks[p]))
+        pop_data["purchases"].append(int(clean_counts[p]))
+    return pop_data
+
+
+# Cinsiyet Dağılımı Grafiği
+def gender_chart(frame):
+    return {
+        "labels": ["Erkek", "Kadın"],
+        "data": [frame.gender_totals["E"], frame.gender_totals["K"]],
+    }
+
+
+# Müşteri Segmentasyonu Grafikleri (Şehir / Meslek)
+# segment x cinsiyet ve segment x kategori çapraz tabloları tek bincount ile çıkarılır
+def segment_charts(frame, clean_rows):
+    user_id = frame.user_id[clean_rows]
+    qty = frame.qty[clean_rows]
+    seg = frame.user_segment[user_id]
+    gender = frame.user_gender[user_id]
+    n_seg = len(frame.segment_labels)
+
+    valid = (seg >= 0) & (gender >= 0)
+    cell = seg[valid] * 2 + gender[valid]
+    by_gender = np.bincount(cell, weights=qty[valid], minlength=n_seg * 2).astype(np.int64)
+    age_sums = np.bincount(
+        cell, weights=qty[valid] * frame.user_age[user_id[valid]], minlength=n_seg * 2
+    ).astype(np.int64)
+    male, female = by_gender[0::2], by_gender[1::2]
+    volume = male + female
+    age_sum = age_sums[0::2] + age_sums[1::2]
+
+    # en çok hacmi olan ilk 15 grup, eşit hacimde isme göre
+    present = [s for s in range(n_seg) if volume[s] > 0]
+    top = sorted(present, key=lambda s: (-int(volume[s]), frame.segment_labels[s]))[:15]
+
+    segment_gender_data = {"labels": [], "male": [], "female": [], "avg_age": []}
+    for s in top:
+        segment_gender_data["labels"].append(frame.segment_labels[s])
+        segment_gender_data["male"].append(int(male[s]))
+        segment_gender_data["female"].append(int(female[s]))
+        segment_gender_data["avg_age"].append(round(int(age_sum[s]) / int(volume[s]), 1))
+
+    # kategori çapraz tablosu
+    n_cat = len(frame.categories)
+    cat = frame.product_cat[frame.product_id[clean_rows]]
+    valid = (seg >= 0) & (cat >= 0)
+    by_cat = (
+        np.bincount(seg[valid] * n_cat + cat[valid], weights=qty[valid], minlength=n_seg * n_cat)
+        .astype(np.int64)
+        .reshape(n_seg, n_cat)
+    )
+    used_cats = [c for c in range(n_cat) if by_cat[:, c].sum() > 0]
+
+    segment_cat_data = {"labels": segment_gender_data["labels"], "datasets": []}
+    for c in used_cats:
+        segment_cat_data["datasets"].append(
+            {"label": frame.categories[c], "data": [int(by_cat[s, c]) for s in top]}
+        )
+    return segment_gender_data, segment_cat_data
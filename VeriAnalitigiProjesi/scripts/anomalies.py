@@ -0,0 +1,171 @@
+import collections
+import datetime  # tarih verileri için
+import math
+import statistics  # ortalama / standart sapma, ürün sayfasındaki hesapla aynı sonuç için
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert  # sqlite'a özel upsert için
+
+from scripts.data import db, Anomaly, DailyProductStat, Product, User
+
+# Anlık Whale Tespiti
+# satın alma anında, alımı yapılan her (gün, ürün) için ürünün son ANOMALY_WINDOW_DAYS günlük satışlarının
+# ortalaması ve standart sapması hesaplanır. ürün sayfasındaki kural ile aynı şekilde
+# günün satışı mean + 2 * stdev sınırını aşmış ve günün en çok alanı (Whale) ortalamanın 2 katından fazla almışsa
+# Anomaly tablosuna yazılır. yönetici paneli bu tabloyu doğrudan okur, tekrar hesaplamaz
+
+
+# gün anahtarından "days" gün geriye giden pencerenin ilk günü
+def _window_start(day, days):
+    return (datetime.date.fromisoformat(day) - datetime.timedelta(days=days - 1)).isoformat()
+
+
+# ürün sayfasındaki outlier kuralı, (anomali mi, sınır) döner
+def _is_whale_day(qty, whale_qty, mean, stdev):
+    threshold = mean + (2 * stdev)
+    return qty > threshold and whale_qty > (mean * 2), threshold
+
+
+def _upsert(rows):
+    if not rows:
+        return
+    now = datetime.datetime.utcnow()
+    for row in rows:
+        row.setdefault("detected_at", now)
+        row["updated_at"] = now
+    stmt = insert(Anomaly)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "product_id"],
+        set_={
+            "user_id": stmt.excluded.user_id,
+            "qty": stmt.excluded.qty,
+            "whale_qty": stmt.excluded.whale_qty,
+            "mean": stmt.excluded.mean,
+            "threshold": stmt.excluded.threshold,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.session.execute(stmt, rows)
+
+
+# yeni satın alımların dokunduğu (gün, ürün) çiftlerini kontrol eder
+# rollup.add_purchases içinden, günlük tablolar ve günün en çok alanı güncellendikten sonra aynı transaction'da çağrılır
+# day_products: {(gün, ürün): adet}
+def check(day_products):
+    days = current_app.config.get("ANOMALY_WINDOW_DAYS", 30)
+    found = []
+    for d, product_id in day_products:
+        rows = db.session.execute(
+            select(
+                DailyProductStat.day,
+                DailyProductStat.qty,
+                DailyProductStat.top_user_id,
+                DailyProductStat.top_user_qty,
+            )
+            .where(
+                DailyProductStat.product_id == product_id,
+                DailyProductStat.day.between(_window_start(d, days), d),
+            )
+            .order_by(DailyProductStat.day)
+        ).all()
+        # tek günlük veride standart sapma hesaplanamaz
+        if len(rows) < 2:
+            continue
+        _, qty, whale_user, whale_qty = rows[-1]
+        counts = [r.qty for r in rows]
+        mean = statistics.mean(counts)
+        flagged, threshold = _is_whale_day(qty, whale_qty, mean, statistics.stdev(counts))
+        if flagged:
+            found.append(
+                {
+                    "day": d,
+                    "product_id": product_id,
+                    "user_id": whale_user,
+                    "qty": qty,
+                    "whale_qty": whale_qty,
+                    "mean": mean,
+                    "threshold": threshold,
+                }
+            )
+    _upsert(found)
+    return found
+
+
+# anomalileri günlük özet tablosundan baştan hesaplar, rollup.rebuild içinden çağrılır
+# her ürünün günleri sırayla gezilir, pencere toplamları kayarak güncellenir
+def rebuild(days=None):
+    days = days or current_app.config.get("ANOMALY_WINDOW_DAYS", 30)
+    rows = db.session.execute(
+        select(
+            DailyProductStat.product_id,
+            DailyProductStat.day,
+            DailyProductStat.qty,
+            DailyProductStat.top_user_id,
+            DailyProductStat.top_user_qty,
+        ).order_by(DailyProductStat.product_id, DailyProductStat.day)
+    )
+
+    found = []
+    window = collections.deque()  # aynı ürünün pencere içindeki günleri [(gün, adet)]
+    total = total_sq = 0
+    current = None
+    for product_id, d, qty, whale_user, whale_qty in rows:
+        if product_id != current:
+            current, total, total_sq = product_id, 0, 0
+            window.clear()
+        start = _window_start(d, days)
+        while window and window[0][0] < start:
+            _, old = window.popleft()
+            total -= old
+            total_sq -= old * old
+        window.append((d, qty))
+        total += qty
+        total_sq += qty * qty
+
+        n = len(window)
+        if n < 2:
+            continue
+        mean = total / n
+        stdev = math.sqrt(max(total_sq - total * total / n, 0) / (n - 1))
+        flagged, threshold = _is_whale_day(qty, whale_qty, mean, stdev)
+        if flagged:
+            found.append(
+                {
+                    "day": d,
+                    "product_id": product_id,
+                    "user_id": whale_user,
+                    "qty": qty,
+                    "whale_qty": whale_qty,
+                    "mean": mean,
+                    "threshold": threshold,
+                }
+            )
+    _upsert(found)
+
+
+# panel için tarih aralığındaki anomaliler, en yeni gün önce
+# window: (başlangıç günü, bitiş günü) ya da None
+def recent(window=None, limit=50):
+    query = (
+        db.session.query(Anomaly, Product.name, User.username)
+        .join(Product, Product.id == Anomaly.product_id)
+        .outerjoin(User, User.id == Anomaly.user_id)
+    )
+    if window is not None:
+        query = query.filter(Anomaly.day.between(*window))
+    rows = query.order_by(Anomaly.day.desc(), Anomaly.whale_qty.desc()).limit(limit).all()
+    return [
+        {
+            "day": a.day,
+            "product_id": a.product_id,
+            "product_name": name,
+            "username": username or "-",
+            "qty": a.qty,
+            "whale_qty": a.whale_qty,
+            "mean": round(a.mean, 1),
+            "threshold": round(a.threshold, 1),
+            "detected_at": a.detected_at.strftime("%Y-%m-%d %H:%M:%S") if a.detected_at else "",
+        }
+        for a, name, username in rows
+    ]
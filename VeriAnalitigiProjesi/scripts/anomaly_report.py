@@ -0,0 +1,165 @@
+import math  # karekök için
+import multiprocessing  # ürün bölümlerini paralel analiz etmek için
+import sqlite3
+import statistics
+
+from sqlalchemy import bindparam, select
+
+from scripts.data import db, Product, ProductStat, DailyProductStat
+import scripts.product_stats as product_stats
+import scripts.retention as retention
+
+# Tüm Katalog Anomali Raporu
+# ürün sayfasındaki outlier analizi (günlük satışlar, mean + 2 * stdev sınırı, whale alımının çıkarılması,
+# temizlenmiş dönüşüm oranı) katalogdaki her ürün için çalıştırılır.
+# ürünler id sırasına göre bölümlere ayrılır, her bölüm bir işçi sürecinde analiz edilir.
+# işçiler uygulamanın veritabanı oturumunu kullanmaz, veritabanı dosyasını kendi sqlite3 bağlantısıyla salt okunur açar
+# ve sadece kendi bölümündeki ürünlerin satırlarını okur. sorgular ana süreçte SQLAlchemy ile derlenip işçilere verilir,
+# böylece sıkıştırılmış günler (retention) dahil ürün sayfası ile aynı veri okunur
+
+PARTS_PER_WORKER = 4  # işçi başına bölüm sayısı, bölümler küçük olunca yük işçilere daha dengeli dağılır
+
+
+# sorguyu sqlite için derler, (derlenmiş sorgu, sql metni) döner
+def _compile(stmt):
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    return compiled, compiled.string
+
+
+# bölümün (lo, hi) id aralığı için sorgu ve parametreleri
+def _bound(compiled, sql, lo, hi):
+    params = compiled.construct_params({"lo": lo, "hi": hi})
+    return sql, [params[name] for name in compiled.positiontup]
+
+
+# bölümlerin okuyacağı sorgular: ürünler, günlük satışlar ve tıklanma sayıları
+# tüm geçmiş için ortalama / standart sapma ve sayaçlar ProductStat'tan, tarih aralığında günlük satırlardan hesaplanır
+def _queries(window):
+    lo, hi = bindparam("lo"), bindparam("hi")
+    products = (
+        select(
+            Product.id,
+            Product.name,
+            Product.category,
+            ProductStat.clicks,
+            ProductStat.purchases,
+            ProductStat.days,
+            ProductStat.mean,
+            ProductStat.m2,
+        )
+        .outerjoin(ProductStat, ProductStat.product_id == Product.id)
+        .where(Product.id.between(lo, hi))
+        .order_by(Product.id)
+    )
+    daily = select(
+        DailyProductStat.product_id,
+        DailyProductStat.day,
+        DailyProductStat.qty,
+        DailyProductStat.top_user_qty,
+    ).where(DailyProductStat.product_id.between(lo, hi))
+    if window is not None:
+        daily = daily.where(DailyProductStat.day.between(*window))
+    daily = daily.order_by(DailyProductStat.product_id, DailyProductStat.day)
+
+    queries = {"products": products, "daily": daily}
+    if window is not None:
+        clicks = retention.click_counts(window).subquery()
+        queries["clicks"] = select(clicks.c.product_id, clicks.c.clicks).where(
+            clicks.c.product_id.between(lo, hi)
+        )
+    return {name: _compile(stmt) for name, stmt in queries.items()}
+
+
+# ürün id'lerini "parts" kadar ardışık aralığa böler: [(ilk id, son id)]
+def _partitions(parts):
+    ids = db.session.scalars(select(Product.id).order_by(Product.id)).all()
+    if not ids:
+        return []
+    size = math.ceil(len(ids) / parts)
+    return [(ids[i], ids[min(i + size, len(ids)) - 1]) for i in range(0, len(ids), size)]
+
+
+# tek bir ürünün analizi, product_stats.product_analysis'in admin yolu ile aynı hesap
+def _analyze(product, rows, clicks, window):
+    product_id, name, category, stat_clicks, stat_purchases, stat_days, stat_mean, stat_m2 = product
+    if window is None:
+        total = stat_purchases or 0
+        clicks = stat_clicks or 0
+        days = stat_days or 0
+        mean = stat_mean or 0.0
+        stdev = math.sqrt(max(stat_m2 or 0.0, 0.0) / (days - 1)) if days > 1 else 0.0
+    else:
+        counts = [qty for _, qty, _ in rows]
+        total = sum(counts)
+        days = len(counts)
+        mean = statistics.mean(counts) if counts else 0.0
+        stdev = statistics.stdev(counts) if days > 1 else 0.0
+
+    outlier_days = []
+    removed = 0
+    # tek günlük veride standart sapma hesaplanamaz, outlier aranmaz
+    if days > 1:
+        series, removed = product_stats.outlier_series(rows, mean, stdev)
+        outlier_days = [d for d, o in zip(series["labels"], series["outliers"]) if o is not None]
+
+    clean = total - removed
+    return {
+        "product_id": product_id,
+        "name": name,
+        "category": category,
+        "days": days,
+        "purchases": total,
+        "clean_purchases": clean,
+        "whale_removed": removed,
+        "mean": round(mean, 2),
+        "threshold": round(mean + 2 * stdev, 2),
+        "outlier_days": outlier_days,
+        "clicks": clicks,
+        "rate": round((clean / clicks) * 100, 2) if clicks > 0 else 0,
+    }
+
+
+# işçi süreci: bir ürün bölümünü kendi bağlantısıyla okuyup analiz eder
+# task: (veritabanı dosyası, pencere, {sorgu adı: (sql, parametreler)})
+def _analyze_partition(task):
+    path, window, queries = task
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        products = conn.execute(*queries["products"]).fetchall()
+        daily = {}
+        for product_id, day, qty, top_user_qty in conn.execute(*queries["daily"]):
+            daily.setdefault(product_id, []).append((day, qty, top_user_qty))
+        clicks = dict(conn.execute(*queries["clicks"]).fetchall()) if "clicks" in queries else {}
+    finally:
+        conn.close()
+    return [_analyze(p, daily.get(p[0], []), clicks.get(p[0], 0), window) for p in products]
+
+
+# tüm ürünleri "workers" süreçte analiz eder, workers 1 ise süreç açılmadan sırayla çalışır
+# window (başlangıç günü, bitiş günü) ya da None (tüm geçmiş)
+# {"window", "products": [ürün satırları, en çok whale alımı çıkarılandan başlayarak], "flagged": outlier'lı ürün sayısı} döner
+# analiz kopyası okunurken (snapshot.reading) işçiler de kopyayı açar
+def build(window=None, workers=1):
+    path = db.session.get_bind().url.database
+    compiled = _queries(window)
+    tasks = []
+    for lo, hi in _partitions(max(workers, 1) * PARTS_PER_WORKER):
+        queries = {name: _bound(c, sql, lo, hi) for name, (c, sql) in compiled.items()}
+        tasks.append((path, window, queries))
+
+    if workers <= 1 or len(tasks) <= 1:
+        parts = map(_analyze_partition, tasks)
+        rows = [row for part in parts for row in part]
+    else:
+        # istek ve önbellek yenileme thread'lerinden çağrıldığı için fork yerine spawn, çok thread'li süreç kopyalanırsa
+        # kopyada kilitli kalmış bir kilit (bağlantı havuzu, önbellek, tıklama tamponu) işçiyi kilitleyebilir.
+        # işçiler sadece derlenmiş sorguları ve veritabanı yolunu alır, uygulama durumuna ihtiyaçları yok
+        with multiprocessing.get_context("spawn").Pool(min(workers, len(tasks))) as pool:
+            rows = [row for part in pool.imap_unordered(_analyze_partition, tasks) for row in part]
+
+    rows.sort(key=lambda r: (-r["whale_removed"], -len(r["outlier_days"]), r["product_id"]))
+    return {
+        "window": window,
+        "products": rows,
+        "flagged": sum(1 for r in rows if r["outlier_days"]),
+    }
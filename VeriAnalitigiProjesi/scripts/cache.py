@@ -0,0 +1,123 @@
+import collections
+import threading  # arka planda yeniden hesaplama ve kilitler için
+import traceback
+
+from flask import current_app
+
+# Versiyonlu Sonuç Önbelleği
+# her satın alma ve tıklama kaydı veri versiyonunu bir arttırır,
+# önbellekteki sonuç hesaplandığı andaki versiyon ile saklanır.
+# versiyon değişmişse eski (stale) sonuç hemen döner ve arka planda tek bir thread yeniden hesaplar,
+# böylece admin hiçbir zaman hesaplamanın bitmesini beklemez (sadece sunucu açıldıktan sonraki ilk istek hariç)
+# en fazla ANALYTICS_CACHE_SIZE kayıt tutulur, en eski kullanılan önce atılır
+# (url'den gelen her farklı tarih aralığı ayrı bir anahtar olduğu için sınırsız büyümesin)
+# not: sayaçlar process içinde tutulur, tek process ile çalışan "flask run" için tasarlandı
+
+_lock = threading.Lock()
+_version = 0
+_entries = collections.OrderedDict()  # anahtar -> (versiyon, sonuç), en son kullanılan sonda
+_refreshing = set()  # arka planda hesaplanmakta olan anahtarlar
+_computing = {}  # anahtar -> [kilit, bekleyen sayısı], aynı anahtar için aynı anda tek hesaplama yapılsın
+
+stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0, "evictions": 0}
+
+
+# veri değiştiğinde çağrılır, tüm önbellek kayıtlarını eskimiş sayar
+def bump():
+    global _version
+    with _lock:
+        _version += 1
+
+
+# tüm kayıtları siler, sonraki istek sonucu baştan hesaplar (benchmark'ta soğuk ölçüm için)
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def version():
+    return _version
+
+
+# anahtarın sonucunu önbellekten döner, yoksa hesaplar
+# compute parametresiz bir fonksiyon, sonuç üretir
+# stale=False ise eski sonuç dönülmez, güncel sonuç beklenerek hesaplanır
+# (başka bir hesaplamanın girdisi olan sonuçlar için, eski girdiden hesaplanan sonuç güncel sayılmasın)
+# version verilirse sonuç veri versiyonu yerine bu değerle karşılaştırılır (ör. analiz kopyasının versiyonu)
+def get_or_compute(key, compute, stale=True, version=None):
+    size = current_app.config.get("ANALYTICS_CACHE_SIZE", 256)
+    with _lock:
+        entry = _entries.get(key)
+        current = _version if version is None else version
+        if entry:
+            _entries.move_to_end(key)
+        if entry and entry[0] == current:
+            stats["hits"] += 1
+            return entry[1]
+        if entry and stale:
+            stats["stale_hits"] += 1
+            start_refresh = key not in _refreshing
+            if start_refresh:
+                _refreshing.add(key)
+        else:
+            stats["misses"] += 1
+            waiting = _computing.setdefault(key, [threading.Lock(), 0])
+            waiting[1] += 1
+
+    # eski sonuç varsa onu dönüp arka planda yenile
+    if entry and stale:
+        if start_refresh:
+            app = current_app._get_current_object()
+            threading.Thread(target=_refresh, args=(app, key, compute, current, size), daemon=True).start()
+        return entry[1]
+
+    # güncel sonuç yoksa mecburen beklenerek hesaplanır
+    # aynı anahtarı hesaplayan başka bir thread varsa onun bitmesi beklenir ve sonucu kullanılır
+    # kilit, onu bekleyen son thread çıkınca silinir, hesaplanıp atılan anahtarların kilitleri birikmesin
+    try:
+        with waiting[0]:
+            with _lock:
+                entry = _entries.get(key)
+                current = _version if version is None else version
+            if entry and entry[0] == current:
+                return entry[1]
+            value = compute()
+            _store(key, current, value, size)
+            return value
+    finally:
+        with _lock:
+            waiting[1] -= 1
+            if not waiting[1]:
+                del _computing[key]
+
+
+def _store(key, computed_version, value, size):
+    with _lock:
+        old = _entries.get(key)
+        if not old or old[0] <= computed_version:
+            _entries[key] = (computed_version, value)
+            _entries.move_to_end(key)
+        while len(_entries) > size:
+            _entries.popitem(last=False)
+            stats["evictions"] += 1
+
+
+# arka plan thread'i, kendi app context'i içinde yeniden hesaplar
+def _refresh(app, key, compute, computed_version, size):
+    try:
+        with app.app_context():
+            value = compute()
+        _store(key, computed_version, value, size)
+        stats["refreshes"] += 1
+    except Exception:
+        stats["errors"] += 1
+        traceback.print_exc()
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+# önbellek durumunu döner, admin istatistik sayfası için
+def snapshot():
+    with _lock:
+        return dict(stats, version=_version, entries=len(_entries))
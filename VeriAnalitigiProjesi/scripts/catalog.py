@@ -0,0 +1,96 @@
+import base64  # sayfa imlecini url'de taşımak için
+import binascii
+import json
+
+from sqlalchemy import and_, func, or_
+
+from scripts.data import db, Product, ProductStat
+import scripts.search as search
+
+# Ürün Listesi Sayfalama (keyset)
+# OFFSET ile sayfa atlamak yerine bir önceki sayfanın son ürününün sıralama değerleri "imleç" olarak gönderilir,
+# bir sonraki sayfa "bu değerlerden sonra gelenler" koşuluyla index üzerinden okunur.
+# böylece hangi sayfada olunursa olunsun sorgu süresi ve bellek kullanımı sabit kalır
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# her sıralama modu için sıralama anahtarları: [(ad, ifade, azalan mı)], son anahtar her zaman ürün id
+# id ile bitmesi eşit değerli ürünlerde sıranın kararlı olmasını sağlar
+def _sort_keys(sort, rank):
+    if sort == "price_asc":
+        return [("price", Product.price, False), ("id", Product.id, False)]
+    if sort == "price_desc":
+        return [("price", Product.price, True), ("id", Product.id, False)]
+    keys = [("clicks", func.coalesce(ProductStat.clicks, 0), True), ("id", Product.id, False)]
+    # arama yapıldıysa önce alakaya göre (bm25 küçük olan daha alakalı)
+    if rank is not None:
+        keys.insert(0, ("rank", rank, False))
+    return keys
+
+
+# imlecin gösterdiği satırdan sonra gelenler
+# (a, b, c) > (x, y, z)  ==>  a > x  VEYA  (a = x VE b > y)  VEYA  (a = x VE b = y VE c > z)
+def _after(keys, values):
+    clauses = []
+    for i, (_, expr, descending) in enumerate(keys):
+        equal = [k[1] == v for k, v in zip(keys[:i], values[:i])]
+        step = expr < values[i] if descending else expr > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        raise InvalidCursor(cursor)
+    return values
+
+
+# filtrelere ve sıralamaya göre bir sayfa ürün
+# (ürünler, sonraki sayfanın imleci) döner, son sayfadaysa imleç None
+def page(q="", category="", sort="", cursor=None, limit=24):
+    # tıklanma sayıları ProductStat sayaçlarında tutuluyor, her istekte ClickLog saymaya gerek yok
+    # sayaç satırı olmayan ürünler (ör. yarım kalmış bir yeniden hesaplama sonrası) de 0 tıklama ile listelenir
+    query = db.session.query(Product).outerjoin(ProductStat, ProductStat.product_id == Product.id)
+
+    # arama FTS5 indexi üzerinden yapılır, index kullanılamıyorsa ILIKE ile taranır
+    rank = None
+    if q:
+        searched, rank = search.apply(query, q)
+        if searched is not None:
+            query = searched
+        else:
+            query = query.filter(
+                or_(Product.name.ilike(f"%{q}%"), Product.category.ilike(f"%{q}%"))
+            )
+    if category:
+        query = query.filter(Product.category == category)
+
+    keys = _sort_keys(sort, rank)
+    if cursor:
+        query = query.filter(_after(keys, decode_cursor(cursor, len(keys))))
+    query = query.order_by(*[expr.desc() if descending else expr.asc() for _, expr, descending in keys])
+
+    # sıralama değerleri de seçiliyor ki son satırdan imleç üretilebilsin
+    # bir fazla satır çekilerek sonraki sayfa olup olmadığı anlaşılır
+    rows = query.add_columns(*[expr.label(f"key_{name}") for name, expr, _ in keys]).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(list(rows[-1][1:]))
+    return [row[0] for row in rows], next_cursor
@@ -0,0 +1,143 @@
+import atexit  # sunucu kapanırken kuyrukta kalan tıklamaları yazmak için
+import datetime  # tarih verileri için
+import threading  # arka plan yazma thread'i için
+import time  # yazma süresini ölçmek için
+import traceback
+from collections import Counter  # sayaç
+
+from sqlalchemy import insert
+
+from scripts.data import db, ClickLog
+import scripts.cache as cache
+import scripts.product_stats as product_stats
+import scripts.sketches as sketches
+
+# Tıklama Yazma Tamponu (write-behind)
+# ürün sayfası her görüntülendiğinde ClickLog'a hemen commit atmak yerine tıklama bellekteki kuyruğa eklenir.
+# arka plandaki thread kuyruk CLICK_FLUSH_SIZE adede ulaştığında ya da CLICK_FLUSH_INTERVAL saniyede bir,
+# kuyruğu tek transaction içinde çok satırlı INSERT'ler ile veritabanına yazar.
+# aynı thread her yazmadan sonra yeni satın alma ve tıklamaları olasılıksal özetlere de işler
+
+_app = None
+_lock = threading.Lock()  # kuyruk için
+_flush_lock = threading.Lock()  # aynı anda tek yazma olsun diye
+_wake = threading.Event()
+_queue = []
+_worker = None
+
+stats = {
+    "enqueued": 0,
+    "flushed": 0,
+    "flushes": 0,
+    "dropped": 0,
+    "errors": 0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+}
+
+# tek INSERT içindeki satır sayısı, sqlite'ın parametre sınırının altında kalması için
+ROWS_PER_INSERT = 300
+
+
+def init_app(app):
+    global _app
+    _app = app
+    app.config.setdefault("CLICK_FLUSH_SIZE", 500)  # bu kadar tıklama birikince hemen yaz
+    app.config.setdefault("CLICK_FLUSH_INTERVAL", 2.0)  # en geç bu kadar saniyede bir yaz
+    app.config.setdefault("CLICK_QUEUE_MAX", 100000)  # veritabanı yazamazsa bellekte tutulacak üst sınır
+    atexit.register(flush)
+
+
+# tıklamayı kuyruğa ekler
+def add(user_id, product_id):
+    row = {
+        "user_id": user_id,
+        "product_id": product_id,
+        "timestamp": datetime.datetime.utcnow(),
+    }
+    with _lock:
+        if len(_queue) >= _app.config["CLICK_QUEUE_MAX"]:
+            stats["dropped"] += 1
+            return
+        _queue.append(row)
+        stats["enqueued"] += 1
+        full = len(_queue) >= _app.config["CLICK_FLUSH_SIZE"]
+    start()
+    if full:
+        _wake.set()
+
+
+# arka plan thread'ini başlatır, ilk tıklamada ya da satın almada çağrılır (cli komutlarında thread açılmasın diye)
+def start():
+    global _worker
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, daemon=True)
+            _worker.start()
+
+
+def _run():
+    while True:
+        _wake.wait(_app.config["CLICK_FLUSH_INTERVAL"])
+        _wake.clear()
+        flush()
+        _catch_up_sketches()
+
+
+# yeni satın alma ve tıklamaları olasılıksal özetlere işler, bkz. sketches.catch_up
+def _catch_up_sketches():
+    try:
+        with _app.app_context():
+            if sketches.catch_up():
+                cache.bump()
+    except Exception:
+        stats["errors"] += 1
+        traceback.print_exc()
+
+
+# kuyruktaki tüm tıklamaları veritabanına yazar
+# yazma başarısız olursa satırlar kuyruğun başına geri konur,
+# kuyruk CLICK_QUEUE_MAX'ı aşarsa en eski tıklamalar atılır (veritabanı uzun süre yazamazsa bellek sınırsız büyümesin)
+def flush():
+    with _flush_lock:
+        with _lock:
+            rows = _queue[:]
+            _queue.clear()
+        if not rows or _app is None:
+            return
+
+        start = time.perf_counter()
+        try:
+            with _app.app_context():
+                for i in range(0, len(rows), ROWS_PER_INSERT):
+                    db.session.execute(insert(ClickLog.__table__).values(rows[i : i + ROWS_PER_INSERT]))
+                # ürünlerin popülerlik sayaçları da aynı transaction içinde arttırılır
+                product_stats.add_clicks(Counter(r["product_id"] for r in rows))
+                db.session.commit()
+        except Exception:
+            stats["errors"] += 1
+            traceback.print_exc()
+            with _lock:
+                _queue[:0] = rows
+                excess = len(_queue) - _app.config["CLICK_QUEUE_MAX"]
+                if excess > 0:
+                    del _queue[:excess]
+                    stats["dropped"] += excess
+            return
+
+        elapsed = (time.perf_counter() - start) * 1000
+        stats["flushes"] += 1
+        stats["flushed"] += len(rows)
+        stats["last_flush_ms"] = round(elapsed, 2)
+        stats["max_flush_ms"] = max(stats["max_flush_ms"], stats["last_flush_ms"])
+        # yeni tıklamalar artık veritabanında, panel önbelleği eskidi
+        cache.bump()
+
+
+def depth():
+    return len(_queue)
+
+
+# tampon durumunu döner, admin istatistik sayfası için
+def snapshot():
+    return dict(stats, depth=depth())
@@ -0,0 +1,280 @@
+import collections
+import datetime  # tarih verileri için
+import json
+import os
+import shutil
+
+from sqlalchemy import select
+
+from scripts.data import db, User, Product, ClickLog, PurchaseLog
+import scripts.analytics_np as analytics_np
+import scripts.user_dim as user_dim
+
+# pyarrow opsiyonel bir bağımlılık, kurulu değilse data_man numpy / saf python yolunu kullanır
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Sütunlu (Arrow) Dışa Aktarım ve Analiz
+# satın alma ve tıklama kayıtları gün bölümlü (day=YYYY-MM-DD) Arrow IPC dosyalarına yazılır,
+# kullanıcı ve ürün tabloları her dışa aktarımda tek dosya olarak yeniden yazılır.
+# dışa aktarım artımlıdır: manifest.json son yazılan kayıt id'lerini tutar, sonraki çalıştırma sadece yeni kayıtları
+# ilgili günün klasörüne yeni bir parça (part-<ilk id>.arrow) olarak ekler.
+# ANALYTICS_ENGINE "arrow" ise panel bu dosyalardan okur: sadece tarih aralığındaki gün klasörleri açılır
+# ve dosyalar bellek eşlemeli (memory-mapped) okunur, sütunlar kopyalanmadan numpy dizisine çevrilir.
+# panel son dışa aktarım anındaki veriyi gösterir, "flask export-columnar" düzenli aralıklarla çalıştırılmalıdır
+#
+# klasör yapısı:
+#   manifest.json
+#   users.arrow, products.arrow
+#   purchase_log/day=2024-05-01/part-000000000001.arrow
+#   click_log/day=2024-05-01/part-000000000001.arrow
+
+MANIFEST = "manifest.json"
+
+# tablo -> (model, dışa aktarılan sütunlar)
+FACTS = {
+    "purchase_log": (PurchaseLog, ["user_id", "product_id", "selected_color"]),
+    "click_log": (ClickLog, ["user_id", "product_id"]),
+}
+
+# Arrow dosyalarındaki kullanıcı / ürün satırları, user_dim.Dimension ve Frame'in beklediği alanlarla
+UserRow = collections.namedtuple("UserRow", "id username gender birth_date city job")
+ProductRow = collections.namedtuple("ProductRow", "id name category")
+
+
+def available(directory):
+    return (
+        pa is not None
+        and analytics_np.available()
+        and os.path.exists(os.path.join(directory, MANIFEST))
+    )
+
+
+def _schemas():
+    return {
+        "purchase_log": pa.schema(
+            [
+                ("user_id", pa.int64()),
+                ("product_id", pa.int64()),
+                ("selected_color", pa.dictionary(pa.int8(), pa.string())),
+            ]
+        ),
+        "click_log": pa.schema([("user_id", pa.int64()), ("product_id", pa.int64())]),
+        "users": pa.schema(
+            [
+                ("id", pa.int64()),
+                ("username", pa.string()),
+                ("gender", pa.string()),
+                ("birth_date", pa.date32()),
+                ("city", pa.string()),
+                ("job", pa.string()),
+            ]
+        ),
+        "products": pa.schema([("id", pa.int64()), ("name", pa.string()), ("category", pa.string())]),
+    }
+
+
+def _read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {name: 0 for name in FACTS}
+    with open(path) as f:
+        return json.load(f)
+
+
+# dosyalar önce geçici isimle yazılıp yerine taşınır, okuyan bir istek yarım dosya görmez
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _write_table(path, table):
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+# bellek eşlemeli okuma, dosya içeriği ancak sütunlara erişildikçe belleğe gelir
+def _read_table(path):
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+# Dışa Aktarım
+
+
+# id'si "after"dan büyük kayıtları "chunk_size"lık parçalar halinde, gün gün gruplanmış olarak döner
+# her parça: (son id, {gün: (ilk id, satırlar)})
+def _new_rows(model, columns, after, chunk_size):
+    cols = [getattr(model, c) for c in columns]
+    while True:
+        rows = db.session.execute(
+            select(model.id, model.day, *cols)
+            .where(
+                model.id > after,
+                model.day.isnot(None),
+                model.user_id.isnot(None),
+                model.product_id.isnot(None),
+            )
+            .order_by(model.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        by_day = {}
+        for row in rows:
+            if row[1] not in by_day:
+                by_day[row[1]] = (row[0], [])
+            by_day[row[1]][1].append(row[2:])
+        after = rows[-1][0]
+        yield after, by_day
+
+
+def _export_fact(directory, name, last_id, chunk_size):
+    model, columns = FACTS[name]
+    schema = _schemas()[name]
+    written = 0
+    for last_id, by_day in _new_rows(model, columns, last_id, chunk_size):
+        for day, (first_id, rows) in by_day.items():
+            folder = os.path.join(directory, name, f"day={day}")
+            os.makedirs(folder, exist_ok=True)
+            data = {c: [r[i] for r in rows] for i, c in enumerate(columns)}
+            table = pa.Table.from_pydict(data, schema=schema)
+            _write_table(os.path.join(folder, f"part-{first_id:012d}.arrow"), table)
+            written += len(rows)
+    return last_id, written
+
+
+# kullanıcı ve ürün tabloları küçük olduğu için her seferinde baştan yazılır
+def _export_dimensions(directory):
+    schemas = _schemas()
+    users = db.session.execute(
+        select(User.id, User.username, User.gender, User.birth_date, User.city, User.job)
+    ).all()
+    user_cols = UserRow._fields
+    _write_table(
+        os.path.join(directory, "users.arrow"),
+        pa.Table.from_pydict(
+            {c: [u[i] for u in users] for i, c in enumerate(user_cols)}, schema=schemas["users"]
+        ),
+    )
+    products = db.session.execute(select(Product.id, Product.name, Product.category)).all()
+    product_cols = ProductRow._fields
+    _write_table(
+        os.path.join(directory, "products.arrow"),
+        pa.Table.from_pydict(
+            {c: [p[i] for p in products] for i, c in enumerate(product_cols)},
+            schema=schemas["products"],
+        ),
+    )
+
+
+# yeni kayıtları dışa aktarır, full=True ise klasörü silip baştan yazar
+# {tablo: yazılan satır sayısı} döner
+def export(directory, full=False, chunk_size=500000):
+    if pa is None:
+        raise RuntimeError("pyarrow kurulu değil (pip install pyarrow)")
+    if full and os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory, exist_ok=True)
+
+    manifest = _read_manifest(directory)
+    counts = {}
+    for name in FACTS:
+        manifest[name], counts[name] = _export_fact(directory, name, manifest.get(name, 0), chunk_size)
+        # her tablodan sonra kaydedilir, yarıda kesilen bir dışa aktarım kaldığı yerden devam eder
+        _write_json(os.path.join(directory, MANIFEST), manifest)
+
+    _export_dimensions(directory)
+    manifest["exported_at"] = datetime.datetime.utcnow().isoformat(timespec="seconds")
+    _write_json(os.path.join(directory, MANIFEST), manifest)
+    return counts
+
+
+# Okuma
+
+
+# tablonun tarih aralığındaki gün klasörleri: [(gün, [parça dosyaları])], gün sırasına göre
+# aralık dışındaki günlerin dosyaları hiç açılmaz (partition pruning)
+def _partitions(directory, name, window):
+    root = os.path.join(directory, name)
+    if not os.path.isdir(root):
+        return []
+    result = []
+    for entry in sorted(os.listdir(root)):
+        if not entry.startswith("day="):
+            continue
+        day = entry[4:]
+        if window is not None and not (window[0] <= day <= window[1]):
+            continue
+        folder = os.path.join(root, entry)
+        parts = sorted(f for f in os.listdir(folder) if f.endswith(".arrow"))
+        if parts:
+            result.append((day, [os.path.join(folder, f) for f in parts]))
+    return result
+
+
+def _int_column(table, name):
+    return table.column(name).to_numpy().astype(np.int64, copy=False)
+
+
+# Arrow dosyalarından okuyan analiz veri seti, analytics_np.Frame ile aynı alanlar
+# her satın alma kaydı adet 1 olan bir satırdır
+class ArrowFrame(analytics_np.Frame):
+    def __init__(self, window=None, directory=None):
+        self.directory = directory
+        super().__init__(window)
+
+    def _load_sales(self, window):
+        days, day_idx, user_ids, product_ids = [], [], [], []
+        for day, paths in _partitions(self.directory, "purchase_log", window):
+            code = len(days)
+            days.append(day)
+            for path in paths:
+                table = _read_table(path)
+                user_ids.append(_int_column(table, "user_id"))
+                product_ids.append(_int_column(table, "product_id"))
+                day_idx.append(np.full(table.num_rows, code, dtype=np.int64))
+
+        def join(arrays):
+            return np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+
+        user_id = join(user_ids)
+        return (
+            np.array(days, dtype=str),
+            join(day_idx),
+            user_id,
+            join(product_ids),
+            np.ones(len(user_id), dtype=np.int64),
+        )
+
+    def _load_products(self):
+        table = _read_table(os.path.join(self.directory, "products.arrow"))
+        return [ProductRow(**row) for row in table.to_pylist()]
+
+    def _load_clicks(self, window):
+        counts = np.zeros(0, dtype=np.int64)
+        for _, paths in _partitions(self.directory, "click_log", window):
+            for path in paths:
+                part = np.bincount(_int_column(_read_table(path), "product_id"))
+                if len(part) > len(counts):
+                    part[: len(counts)] += counts
+                    counts = part
+                else:
+                    counts[: len(part)] += part
+        return [(int(p), int(counts[p])) for p in np.flatnonzero(counts)]
+
+    def _load_users(self):
+        table = _read_table(os.path.join(self.directory, "users.arrow"))
+        return user_dim.Dimension([UserRow(**row) for row in table.to_pylist()], datetime.date.today())
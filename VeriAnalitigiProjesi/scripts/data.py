@@ -1,90 +1,247 @@
-from flask_sqlalchemy import SQLAlchemy # python ile pythonic olarak veritabanı ile iletişim yapabilmek için
-from flask_login import UserMixin # şablon, Flash-Login kütüphanesinin ihtiyacı
-from werkzeug.security import generate_password_hash, check_password_hash # hash işlemleri için
-import datetime # tarih verileri için
-
-db = SQLAlchemy()
-
-COLOR_CODES = {
-    "Siyah": "000000",
-    "Beyaz": "F5F5F5",
-    "Mavi": "0000FF",
-    "Kırmızı": "FF0000",
-    "Yeşil": "008000",
-}
-
-# Verilerin Tutulduğu Sınıf Yapıları
-
-
-# Kullanıcı detayları
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
-    is_admin = db.Column(db.Boolean, default=False)
-    gender = db.Column(db.String(10))
-    birth_date = db.Column(db.Date)
-    education = db.Column(db.String(50))
-    city = db.Column(db.String(50))
-    job = db.Column(db.String(50))
-
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-
-        return check_password_hash(self.password_hash, password)
-
-    # yaş verisini doğum tarihine göre alıyoruz
-    @property
-    def age(self):
-        if not self.birth_date:
-            return 25
-        today = datetime.date.today()
-        b_date = self.birth_date
-        if isinstance(b_date, str):
-            try:
-                b_date = datetime.datetime.strptime(b_date, "%Y-%m-%d").date()
-            except:
-                try:
-                    b_date = datetime.datetime.strptime(
-                        b_date, "%Y-%m-%d %H:%M:%S.%f"
-                    ).date()
-                except:
-
-                    return 25
-
-        return (
-            today.year
-            - b_date.year
-            - ((today.month, today.day) < (b_date.month, b_date.day))
-        )
-
-
-# Ürün bilgileri
-class Product(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
-    category = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)
-
-
-# Ürün sayfasına tıklanma verileri
-class ClickLog(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
-    product_id = db.Column(db.Integer, db.ForeignKey("product.id"))
-    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    user = db.relationship("User", backref="clicks")
-    product = db.relationship("Product", backref="clicks")
-
-
-# Ürün alım verileri
-class PurchaseLog(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
-    product_id = db.Column(db.Integer, db.ForeignKey("product.id"))
-    selected_color = db.Column(db.String(50))
-    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    user = db.relationship("User", backref="purchases")
-    product = db.relationship("Product", backref="purchases")
+from flask_sqlalchemy import SQLAlchemy # python ile pythonic olarak veritabanı ile iletişim yapabilmek için
+from flask_sqlalchemy.session import Session # sorguların hangi veritabanına gideceğini seçen oturum
+from flask_login import UserMixin # şablon, Flash-Login kütüphanesinin ihtiyacı
+from werkzeug.security import generate_password_hash, check_password_hash # hash işlemleri için
+import contextvars # analiz okumalarını thread / istek bazında işaretlemek için
+import datetime # tarih verileri için
+
+# True iken oturumun tüm sorguları "analytics" bind'ine (veritabanının salt okunur kopyası) gider
+# scripts/snapshot.py içindeki reading() ile açılır
+analytics_reads = contextvars.ContextVar("analytics_reads", default=False)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and analytics_reads.get():
+            return self._db.engines["analytics"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+COLOR_CODES = {
+    "Siyah": "000000",
+    "Beyaz": "F5F5F5",
+    "Mavi": "0000FF",
+    "Kırmızı": "FF0000",
+    "Yeşil": "008000",
+}
+
+# Verilerin Tutulduğu Sınıf Yapıları
+
+
+# Kullanıcı detayları
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(100), unique=True, nullable=False)
+    password_hash = db.Column(db.String(200), nullable=False)
+    is_admin = db.Column(db.Boolean, default=False)
+    gender = db.Column(db.String(10))
+    birth_date = db.Column(db.Date)
+    education = db.Column(db.String(50))
+    city = db.Column(db.String(50))
+    job = db.Column(db.String(50))
+
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+
+        return check_password_hash(self.password_hash, password)
+
+    # yaş verisini doğum tarihine göre alıyoruz
+    @property
+    def age(self):
+        return age_of(self.birth_date)
+
+
+# doğum tarihinden bugünkü yaş, doğum tarihi yoksa ya da okunamıyorsa 25
+def age_of(b_date, today=None):
+    if not b_date:
+        return 25
+    today = today or datetime.date.today()
+    if isinstance(b_date, str):
+        try:
+            b_date = datetime.datetime.strptime(b_date, "%Y-%m-%d").date()
+        except:
+            try:
+                b_date = datetime.datetime.strptime(
+                    b_date, "%Y-%m-%d %H:%M:%S.%f"
+                ).date()
+            except:
+
+                return 25
+
+    return (
+        today.year
+        - b_date.year
+        - ((today.month, today.day) < (b_date.month, b_date.day))
+    )
+
+
+# Ürün bilgileri
+class Product(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+
+    # ana sayfadaki kategori filtresi ve fiyat sıralamalı sayfalama için
+    __table_args__ = (
+        db.Index("ix_product_category", "category"),
+        db.Index("ix_product_price", "price", "id"),
+    )
+
+
+# log kayıtlarının gün anahtarı ("YYYY-MM-DD"), kayıt eklenirken zaman damgasından üretilir
+# böylece günlük gruplamalar her satırda strftime çalıştırmadan index üzerinden yapılır
+def _day_default(context):
+    ts = context.get_current_parameters().get("timestamp") or datetime.datetime.utcnow()
+    return ts.strftime("%Y-%m-%d")
+
+
+# ürün, zaman ve kullanıcı bazlı sorgular tüm tabloyu taramasın diye log tablolarının indexleri
+def _log_indexes(table):
+    return (
+        db.Index(f"ix_{table}_product_time", "product_id", "timestamp"),
+        db.Index(f"ix_{table}_time_user", "timestamp", "user_id"),
+        db.Index(f"ix_{table}_user", "user_id"),
+        db.Index(f"ix_{table}_day_product", "day", "product_id"),
+    )
+
+
+# Ürün sayfasına tıklanma verileri
+class ClickLog(db.Model):
+    __table_args__ = _log_indexes("click_log")
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"))
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    day = db.Column(db.String(10), default=_day_default)
+    user = db.relationship("User", backref="clicks")
+    product = db.relationship("Product", backref="clicks")
+
+
+# Ürün alım verileri
+class PurchaseLog(db.Model):
+    __table_args__ = _log_indexes("purchase_log")
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"))
+    selected_color = db.Column(db.String(50))
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    day = db.Column(db.String(10), default=_day_default)
+    user = db.relationship("User", backref="purchases")
+    product = db.relationship("Product", backref="purchases")
+
+
+# Günlük Özet (Rollup) Tabloları
+# admin paneli milyonlarca ham log yerine bu tablolardaki birkaç yüz satırı okur
+# tablolar ham loglardan türetilir, "flask rebuild-rollups" ile sıfırdan yeniden oluşturulabilir
+
+
+# gün x ürün bazında satış adedi
+# o gün o ürünü en çok alan kullanıcı da tutuluyor, ürün sayfasındaki "Whale" analizi için
+class DailyProductStat(db.Model):
+    day = db.Column(db.String(10), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+    top_user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    top_user_qty = db.Column(db.Integer, nullable=False, default=0)
+
+    # bir ürünün son günlerdeki satışları (ürün sayfası ve anlık whale tespiti) için
+    __table_args__ = (db.Index("ix_daily_product_stat_product_day", "product_id", "day"),)
+
+
+# gün x kullanıcı bazında satış adedi
+# "Whale" temizliğinin ürün ve kategori grafiklerinde de yapılabilmesi için ürün kırılımı da tutuluyor
+class DailyUserStat(db.Model):
+    day = db.Column(db.String(10), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+
+
+# gün x ürün x renk bazında satış adedi
+class DailyColorStat(db.Model):
+    day = db.Column(db.String(10), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    color = db.Column(db.String(50), primary_key=True)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+
+
+# gün x ürün x kullanıcı bazında tıklama sayısı
+# sadece sıkıştırılmış (ham satırları silinmiş) günler için tutulur, bkz. scripts/retention.py
+class DailyClickStat(db.Model):
+    day = db.Column(db.String(10), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+
+
+# gün x ürün bazında giriş yapmamış ziyaretçilerin tıklama sayısı
+# DailyClickStat gibi sadece sıkıştırılmış günler için tutulur, bkz. scripts/retention.py
+class DailyGuestClickStat(db.Model):
+    day = db.Column(db.String(10), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+
+
+# gün bazında olasılıksal özetler (sketch), bkz. scripts/sketches.py
+# name: özetin türü ve varsa ürünü, ör. "top-buyers", "buyer-qty", "buyers:12", "clickers:12"
+class DailySketch(db.Model):
+    day = db.Column(db.String(10), primary_key=True)
+    name = db.Column(db.String(50), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+
+# uygulamanın kendi durum bilgileri (anahtar -> değer), ör. ham logların hangi güne kadar sıkıştırıldığı
+class AppMeta(db.Model):
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(200))
+
+
+# Ürün Bazlı Anlık İstatistikler
+# her satın almada güncellenir, ürün sayfası tüm satış geçmişini okumadan açılır
+
+
+# ürünün toplam tıklanma ve satış sayaçları ile günlük satış adetlerinin Welford ortalama / varyans değerleri
+# m2: ortalamadan sapmaların karelerinin toplamı, varyans = m2 / (days - 1)
+# her ürün için bir satır bulunur, satırı olmayan ürün listede 0 tıklama ile sıralanır
+class ProductStat(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+    purchases = db.Column(db.Integer, nullable=False, default=0)
+    days = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=False, default=0.0)
+    m2 = db.Column(db.Float, nullable=False, default=0.0)
+
+
+db.Index("ix_product_stat_popularity", ProductStat.clicks.desc(), ProductStat.product_id)
+
+
+# ürünün renk bazında toplam satışı
+class ProductColorStat(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    color = db.Column(db.String(50), primary_key=True)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Anlık Tespit Edilen Anomaliler
+# satın alma anında, o gün o ürünün satışı son günlerin ortalamasının 2 standart sapma üstüne çıktığında
+# ve günün en çok alanı (Whale) ortalamanın 2 katından fazla aldığında (gün, ürün) için bir kayıt tutulur
+class Anomaly(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.String(10), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))  # whale
+    qty = db.Column(db.Integer, nullable=False)  # o günkü toplam satış
+    whale_qty = db.Column(db.Integer, nullable=False)  # whale'in o günkü alımı
+    mean = db.Column(db.Float, nullable=False)
+    threshold = db.Column(db.Float, nullable=False)
+    detected_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    product = db.relationship("Product")
+    user = db.relationship("User")
+
+    __table_args__ = (db.UniqueConstraint("day", "product_id", name="uq_anomaly_day_product"),)
@@ -1,413 +1,552 @@
-from flask import render_template, request # belirli html dosyasında dosyanın beklediği parametreleri doldurmak için
-from flask_login import current_user  # o an sitedeki kişi kim
-from sqlalchemy import func, desc, or_
-
-# func: sql fonksiyonları için
-# desc: alfabetik ters sıralama için
-# or_: mantıksal veya
-from collections import Counter  # sayaç
-import datetime  # tarih verileri için
-import statistics  # istatistiksel matematik kütüphanesi, outlier analizi vb. için
-
-from scripts.data import db, Product, ClickLog, PurchaseLog, User, COLOR_CODES
-
-ALL_COLORS = list(COLOR_CODES.keys())
-
-
-# Ana Sayfa
-def index():
-    # url üzerinden (var ise) verileri okuyarak filtrelendirme/sıralama
-    q = request.args.get("q", "")
-    category = request.args.get("category", "")
-    sort = request.args.get("sort", "")
-
-    # query default olarak en popüleri sıralıyor
-    # eğer bir filtreleme ayarı girildiyse ileride değişecek
-    query = db.session.query(Product).outerjoin(ClickLog).group_by(Product.id)
-
-    # arama kutusuna bir şey yazıldı mı
-    if q:
-        query = query.filter(
-            or_(Product.name.ilike(f"%{q}%"), Product.category.ilike(f"%{q}%"))
-        )
-    # kategori seçildi mi
-    if category:
-        query = query.filter(Product.category == category)
-
-    # sıralama A'dan Z'ye mi
-    if sort == "price_asc":
-        query = query.order_by(Product.price.asc())
-    # sıralama Z'den A'ya mı
-    elif sort == "price_desc":
-        query = query.order_by(Product.price.desc())
-    # sıralama yoksa tıklanma verisine göre sırala
-    else:
-        query = query.order_by(func.count(ClickLog.id).desc())
-
-    # sorguyu çalıştır, verileri çek ve işle
-    products = query.all()
-    prod_list = []
-    for p in products:
-        img = f"https://placehold.co/400x400/2c3e50/FFFFFF/png?text={p.name.replace(' ', '+')}"
-        prod_list.append({"obj": p, "img": img})
-
-    # sidebar da göstermek için veritabanında bulunan kategorileri tekrar etmeyecek şekilde çekiyoruz
-    categories = [c[0] for c in db.session.query(Product.category).distinct()]
-
-    # filtreleri de gönderiyoruz ki sayfa yenilendiğinde girdiği parametreler kaybolmasın
-    return render_template(
-        "index.html",
-        products=prod_list,
-        categories=categories,
-        current_filters={"q": q, "category": category, "sort": sort},
-    )
-
-
-# Ürün Sayfası
-def product_detail(product_id):
-    # ürünün verilerini alma
-    product = Product.query.get_or_404(product_id)
-    # default seçili renk
-    selected_color = request.args.get("color", "Siyah")
-
-    # kullanıcı loginyapmış mı
-    if current_user.is_authenticated:
-        db.session.add(ClickLog(user_id=current_user.id, product_id=product.id))
-        db.session.commit()
-
-    # ürünün tüm satış verilerini alıyoruz, OUTLIER ANALİZİ İÇİN BU GEREKLİ
-    purchases_list = PurchaseLog.query.filter_by(product_id=product.id).all()
-    
-    # default olarak temizlenmiş satış sayısı tüm satışlar olsun
-    clean_purchases_count = len(purchases_list)
-    prod_outlier_data = {"labels": [], "data": [], "clean_data": []}
-
-    # kullanıcı admin mi kontrolü
-    if current_user.is_authenticated and current_user.is_admin:
-        try:
-            # ürünün satışlarını gün gün alıyoruz
-            date_map = {}
-            for p in purchases_list:
-                d_str = p.timestamp.strftime("%Y-%m-%d")
-                if d_str not in date_map:
-                    date_map[d_str] = []
-                date_map[d_str].append(p.user_id)
-
-            # ürün verisi varsa
-            if date_map:
-                # tarih ve satın alma verilerini hazırlama
-                sorted_dates = sorted(date_map.keys())
-                counts = [len(date_map[d]) for d in sorted_dates]
-
-                # günlük ortalama kaç satıyoruz
-                mean = statistics.mean(counts)  # mean
-                # satışlar ne kadar dalgalı
-                stdev = statistics.stdev(counts)  # standart sapma
-
-                # anormallik sınırı
-                threshold = mean + (2 * stdev)
-
-                prod_outlier_data["labels"] = sorted_dates
-                prod_outlier_data["data"] = counts
-
-                outliers_arr = []
-                clean_arr = []
-
-                # her günü kontrol ediyoruz
-                # eğer o günkü satış anormallik sınırını aşarsa;
-                # o gün alışveriş yapanları alır, en çok alışveriş yapanı (Whale) bulur
-                # onu toplam satıştan çıkartır, optimize grafik elimizde olur
-                whale_total_removed = 0 # Balinanın toplam alım miktarı
-                for i, c in enumerate(counts):
-                    if c > threshold:
-                        users_on_day = date_map[sorted_dates[i]]
-                        user_counts = Counter(users_on_day)
-                        whale_qty = user_counts.most_common(1)[0][1]
-
-                        # sadece toplam satış yetmez, balina alımı da ortalamanın 2 katından büyükse outlier say
-                        if whale_qty > (mean * 2):
-                            outliers_arr.append(c)
-                            clean_arr.append(c - whale_qty)
-                            whale_total_removed += whale_qty # Balina alımını toplama ekle
-                        else:
-                            outliers_arr.append(None)
-                            clean_arr.append(c)
-                    else:
-                        outliers_arr.append(None)
-                        clean_arr.append(c)
-
-                prod_outlier_data["outliers"] = outliers_arr
-                prod_outlier_data["clean_data"] = clean_arr
-                
-                # temizlenmiş satış sayısı hesaplama başlangıcı
-                clean_purchases_count = len(purchases_list) - whale_total_removed
-
-
-        except Exception as e:
-            print(f"Prod Detail Chart Error: {e}")
-
-    # ürünle alakalı bilgileri alma
-    clicks = ClickLog.query.filter_by(product_id=product.id).count()
-    # purchases = PurchaseLog.query.filter_by(product_id=product.id).count() # ESKİ SATIR
-    
-    # DÜZELTME: Dönüşüm oranı için temizlenmiş satış sayısını kullanıyoruz (clean_purchases_count)
-    purchases = clean_purchases_count # Yeni temizlenmiş satış sayısı
-    # DÜZELTME: Bu sayede Conversion Rate %100'ün üstüne çıkmaz.
-    rate = round((purchases / clicks) * 100, 2) if clicks > 0 else 0
-
-    stats = {"clicks": clicks, "purchases": purchases, "rate": rate}
-
-    # ürünün resmini oluşturma
-    hex_code = COLOR_CODES.get(selected_color, "000000")
-    text_c = "000000" if selected_color == "Beyaz" else "FFFFFF"
-    dynamic_img = f"https://placehold.co/500x500/{hex_code}/{text_c}/png?text={product.name.replace(' ', '+')}+({selected_color})"
-
-    # ürün renk tercih verilerini alma
-    # Bu listeyi zaten başta almıştık, tekrar almayalım, var olanı kullanalım: purchases_list
-    color_dist = {c: 0 for c in ALL_COLORS}
-    for p in purchases_list:
-        if p.selected_color in color_dist:
-            color_dist[p.selected_color] += 1
-            
-    # gerekli parametreleri ürün sayfasına yönlendirir
-    return render_template(
-        "product.html",
-        product=product,
-        current_image=dynamic_img,
-        selected_color=selected_color,
-        colors=ALL_COLORS,
-        color_dist=color_dist,
-        prod_outlier_data=prod_outlier_data,
-        stats=stats,
-    )
-
-
-# Yönetici Paneli Sayfası
-def admin_dashboard():
-    # kullanıcı admin mi kontrolu
-    if not current_user.is_admin:
-        return "Yetkisiz", 403
-
-    default_data = {
-        "pop_data": {"labels": [], "clicks": [], "purchases": []},
-        "gender_data": {"labels": [], "data": []},
-        "segment_gender_data": {"labels": [], "male": [], "female": [], "avg_age": []},
-        "segment_cat_data": {"labels": [], "datasets": []},
-        "outlier_data": {
-            "labels": [],
-            "data": [],
-            "outliers": [],
-            "clean_data": [],
-            "details": [],
-        },
-    }
-
-    try:
-        # veri tabanındaki tüm satışları al
-        all_purchases = db.session.query(PurchaseLog).all()
-
-        # her satışı tek tek ait olduğu güne göre dictionary yapısına yaz
-        daily_stats = {}
-        for p in all_purchases:
-            d_str = p.timestamp.strftime("%Y-%m-%d")
-            if d_str not in daily_stats:
-                daily_stats[d_str] = {
-                    "total": 0,
-                    "users": Counter(),
-                    "products": Counter(),
-                }
-
-            daily_stats[d_str]["total"] += 1
-            daily_stats[d_str]["users"][p.user_id] += 1
-            daily_stats[d_str]["products"][p.product.name] += 1
-
-        # "Whale" kullanıcıların kara listesi, sayfadaki diğer grafiklerin doğru veri gösterebilmesi için
-        whale_blacklist = set()
-
-        outlier_data = {
-            "labels": [],
-            "data": [],
-            "outliers": [],
-            "clean_data": [],
-            "details": [],
-        }
-        sorted_dates = sorted(daily_stats.keys())
-        counts = [daily_stats[d]["total"] for d in sorted_dates]
-
-        # mean ve standart sapma hesaplama
-        if len(counts) > 1:
-            mean = statistics.mean(counts)
-            stdev = statistics.stdev(counts)
-        else:
-            mean = counts[0]
-            stdev = 0
-
-        # anormallik sınırı
-        threshold = mean + (2 * stdev) if stdev > 0 else mean + 10
-
-        outliers_arr = []
-        details_list = []
-
-        # temiz grafik verisini bulundurmak için
-        clean_arr = []
-
-        # her günü işle
-        for i, d in enumerate(sorted_dates):
-            total = daily_stats[d]["total"]
-
-            # eğer o gün anormallik sınırı aşılmış ise;
-            # o gün en çok alım yapan kullanıcıyı (Whale) bul, kara listeye ekle
-            if total > threshold:
-                outliers_arr.append(total)
-                user_counts = daily_stats[d]["users"]
-                whale_user_id, whale_qty = user_counts.most_common(1)[0]
-                whale_blacklist.add((whale_user_id, d))
-
-                cleaned_val = total - whale_qty
-                clean_arr.append(cleaned_val)
-
-                top_prod_name = daily_stats[d]["products"].most_common(1)[0][0]
-                prod_obj = Product.query.filter_by(name=top_prod_name).first()
-
-                details_list.append(
-                    {
-                        "date": d,
-                        "total_sales": total,
-                        "outlier_qty": whale_qty,
-                        "prod_name": top_prod_name,
-                        "prod_id": prod_obj.id if prod_obj else 0,
-                        "category": prod_obj.category if prod_obj else "Genel",
-                    }
-                )
-            # aşılmamış ise olduğu gibi devam et
-            else:
-                outliers_arr.append(None)
-                clean_arr.append(total)
-
-            # outlier verilerini hazırla
-            outlier_data["labels"] = sorted_dates
-            outlier_data["data"] = counts
-            outlier_data["outliers"] = outliers_arr
-            outlier_data["clean_data"] = clean_arr
-            outlier_data["details"] = details_list
-
-        # "Whale" alımları grafikten temizleme
-        clean_purchases = []
-        for p in all_purchases:
-            d_str = p.timestamp.strftime("%Y-%m-%d")
-            if (p.user_id, d_str) in whale_blacklist:
-                continue
-            clean_purchases.append(p)
-
-        # Popüler Ürünler Grafiği
-
-        # tıklanma sayısına göre ilk 10 ürünü getir
-        top_prods = (
-            db.session.query(Product, func.count(ClickLog.id).label("clicks"))
-            .outerjoin(ClickLog)
-            .group_by(Product.id)
-            .order_by(desc("clicks"))
-            .limit(10)
-            .all()
-        )
-
-        pop_data = {"labels": [], "clicks": [], "purchases": []}
-        for p_obj, c in top_prods:
-            # "Whale" den arınmış temiz veriler içerisinden say
-            clean_count = sum(1 for cp in clean_purchases if cp.product_id == p_obj.id)
-
-            pop_data["labels"].append(p_obj.name)
-            pop_data["clicks"].append(c)
-            pop_data["purchases"].append(clean_count)
-
-        # Cinsiyet Dağılımı Grafiği
-
-        # veri tabanında kaç erkek kaç kadın var say (admin dışı)
-        gender_stats = (
-            db.session.query(User.gender, func.count(User.id))
-            .filter(User.username != "admin")
-            .group_by(User.gender)
-            .all()
-        )
-
-        g_map = {"E": 0, "K": 0}
-        for g, c in gender_stats:
-            if g in g_map:
-                g_map[g] = c
-        gender_data = {"labels": ["Erkek", "Kadın"], "data": [g_map["E"], g_map["K"]]}
-
-        # Müşteri Segmentasyonu Grafiği (Şehir / Meslek)
-
-        # Her temiz satışı alıp, müşterinin bilgilerine göre anahtar oluşturuyoruz
-        # o grupta kaç erkek kaç kadın var
-        segments = {}
-        for cp in clean_purchases:
-            u = cp.user
-            if not u:
-
-                continue
-
-            key = f"{u.city} - {u.job}"
-            if key not in segments:
-                segments[key] = {"E": 0, "K": 0, "ages": []}
-
-            segments[key][u.gender] += 1
-            segments[key]["ages"].append(u.age)
-
-        # en çok hacmi olan ilk 15 grubu seçiyoruz
-        sorted_segments = sorted(
-            segments.items(), key=lambda item: item[1]["E"] + item[1]["K"], reverse=True
-        )[:15]
-
-        segment_gender_data = {"labels": [], "male": [], "female": [], "avg_age": []}
-        for key, val in sorted_segments:
-            segment_gender_data["labels"].append(key)
-            segment_gender_data["male"].append(val["E"])
-            segment_gender_data["female"].append(val["K"])
-            avg = round(sum(val["ages"]) / len(val["ages"]), 1) if val["ages"] else 0
-            segment_gender_data["avg_age"].append(avg)
-
-        # Kategori Tercihleri Grafiği (Şehir / Meslek)
-
-        # kategoriye göre veri seti hazırlıyoruz,
-        cat_segments = {}
-        all_categories = set()
-        for cp in clean_purchases:
-            if not cp.product:
-                continue
-            key = f"{cp.user.city} - {cp.user.job}"
-            cat = cp.product.category
-            if key not in cat_segments:
-                cat_segments[key] = {}
-            if cat not in cat_segments[key]:
-                cat_segments[key][cat] = 0
-            cat_segments[key][cat] += 1
-            all_categories.add(cat)
-
-        all_categories = sorted(list(all_categories))
-        seg_labels = segment_gender_data["labels"]
-        segment_cat_data = {"labels": seg_labels, "datasets": []}
-
-        for cat in all_categories:
-            data_points = []
-            for label in seg_labels:
-                val = cat_segments.get(label, {}).get(cat, 0)
-                data_points.append(val)
-            segment_cat_data["datasets"].append({"label": cat, "data": data_points})
-
-    except Exception as e:
-        print(f"DASHBOARD ERROR: {e}")
-        import traceback
-
-        traceback.print_exc()
-        return render_template("dashboard.html", **default_data)
-
-    # gerekli parametreleri panel grafik sayfasına yönlendirir
-    return render_template(
-        "dashboard.html",
-        pop_data=pop_data,
-        gender_data=gender_data,
-        segment_gender_data=segment_gender_data,
-        segment_cat_data=segment_cat_data,
-        outlier_data=outlier_data,
-    )
+from flask import render_template, request, current_app, jsonify, url_for # belirli html dosyasında dosyanın beklediği parametreleri doldurmak için
+from flask_login import current_user  # o an sitedeki kişi kim
+
+import datetime  # tarih verileri için
+import functools
+import statistics  # istatistiksel matematik kütüphanesi, outlier analizi vb. için
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor  # panel grafiklerini aynı anda hesaplamak için
+
+from scripts.data import db, Product, COLOR_CODES
+import scripts.aggregates as aggregates
+import scripts.anomalies as anomalies
+import scripts.anomaly_report as anomaly_report
+import scripts.analytics_np as analytics_np
+import scripts.columnar as columnar
+import scripts.cache as cache
+import scripts.click_buffer as click_buffer
+import scripts.product_stats as product_stats
+import scripts.catalog as catalog
+import scripts.metrics as metrics
+import scripts.page_cache as page_cache
+import scripts.purchases as purchases
+import scripts.sketches as sketches
+import scripts.snapshot as snapshot
+import scripts.user_cache as user_cache
+import scripts.user_dim as user_dim
+
+ALL_COLORS = list(COLOR_CODES.keys())
+
+
+# analiz motoru seçimi, ANALYTICS_ENGINE "numpy" ise ve numpy kuruluysa vektörel motor kullanılır
+# aksi halde saf python/sql yolu çalışır
+# panel hesaplamalarında kullanılacak sütunlu veri seti sınıfı, saf python/sql yolu için None
+# "arrow": dışa aktarılmış Arrow dosyaları (yoksa numpy), "numpy": veritabanındaki özet tablolar
+# "approx": python yolu, günün whale'i ve en çok satan ürünü olasılıksal özetlerden (scripts/sketches.py)
+def _frame_class():
+    engine = current_app.config.get("ANALYTICS_ENGINE")
+    if engine == "arrow" and columnar.available(current_app.config["COLUMNAR_DIR"]):
+        return functools.partial(columnar.ArrowFrame, directory=current_app.config["COLUMNAR_DIR"])
+    if engine in ("numpy", "arrow") and analytics_np.available():
+        return analytics_np.Frame
+    return None
+
+
+# Ana Sayfa
+# üretilen sayfa filtrelere göre önbellekte tutulur, satın alma / tıklama yazılana kadar tekrar üretilmez
+def index():
+    # url üzerinden (var ise) verileri okuyarak filtrelendirme/sıralama
+    q = request.args.get("q", "")
+    category = request.args.get("category", "")
+    sort = request.args.get("sort", "")
+    return page_cache.page(("index", q, category, sort), lambda: _render_index(q, category, sort))
+
+
+def _render_index(q, category, sort):
+    # ürünler sayfa sayfa okunur, ilk sayfa burada, sonrakiler kaydırdıkça /api/products üzerinden gelir
+    products, next_cursor = catalog.page(q, category, sort, limit=current_app.config["CATALOG_PAGE_SIZE"])
+    prod_list = [{"obj": p, "img": _product_image(p)} for p in products]
+
+    # sidebar da göstermek için veritabanında bulunan kategorileri tekrar etmeyecek şekilde çekiyoruz
+    categories = [c[0] for c in db.session.query(Product.category).distinct()]
+
+    # filtreleri de gönderiyoruz ki sayfa yenilendiğinde girdiği parametreler kaybolmasın
+    return render_template(
+        "index.html",
+        products=prod_list,
+        next_cursor=next_cursor,
+        categories=categories,
+        current_filters={"q": q, "category": category, "sort": sort},
+    )
+
+
+def _product_image(p):
+    return f"https://placehold.co/400x400/2c3e50/FFFFFF/png?text={p.name.replace(' ', '+')}"
+
+
+# Ürün Listesi (JSON)
+# ana sayfadaki sonsuz kaydırma için filtrelere göre bir sonraki sayfa
+def products_api():
+    q = request.args.get("q", "")
+    category = request.args.get("category", "")
+    sort = request.args.get("sort", "")
+    cursor = request.args.get("cursor") or None
+    limit = request.args.get("limit", current_app.config["CATALOG_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, current_app.config["CATALOG_PAGE_MAX"]))
+
+    try:
+        products, next_cursor = catalog.page(q, category, sort, cursor, limit)
+    except catalog.InvalidCursor:
+        return jsonify({"success": False, "message": "Geçersiz sayfa imleci."}), 400
+
+    items = [
+        {
+            "id": p.id,
+            "name": p.name,
+            "category": p.category,
+            "price": p.price,
+            "img": _product_image(p),
+            "url": url_for("product_detail", product_id=p.id),
+        }
+        for p in products
+    ]
+    return jsonify({"success": True, "items": items, "next_cursor": next_cursor})
+
+
+# Ürün Sayfası
+def product_detail(product_id):
+    # ürünün verilerini alma
+    product = Product.query.get_or_404(product_id)
+    # default seçili renk
+    selected_color = request.args.get("color", "Siyah")
+
+    # kullanıcı loginyapmış mı
+    # tıklama hemen yazılmaz, tampona eklenir ve arka planda toplu olarak kaydedilir
+    if current_user.is_authenticated:
+        click_buffer.add(current_user.id, product.id)
+
+    # sayfa renk, tarih aralığı ve url'deki diğer parametrelere göre önbellekte tutulur
+    # tıklama önbellekten dönülse de (304 dahil) yukarıda kaydedilmiş olur
+    window, date_filters = _date_window()
+    key = ("product", product.id, window, tuple(sorted(request.args.items(multi=True))))
+    return page_cache.page(
+        key, lambda: _render_product(product, selected_color, window, date_filters)
+    )
+
+
+def _render_product(product, selected_color, window, date_filters):
+    # ürünün outlier analizi ve renk dağılımı, satın alma anında güncellenen ürün istatistiklerinden okunur
+    is_admin = current_user.is_authenticated and current_user.is_admin
+    prod_outlier_data, clean_purchases_count, color_dist = product_stats.product_analysis(
+        product.id, is_admin, window
+    )
+
+    # ürünle alakalı bilgileri alma
+    clicks = product_stats.click_count(product.id, window)
+    # purchases = PurchaseLog.query.filter_by(product_id=product.id).count() # ESKİ SATIR
+    
+    # DÜZELTME: Dönüşüm oranı için temizlenmiş satış sayısını kullanıyoruz (clean_purchases_count)
+    purchases = clean_purchases_count # Yeni temizlenmiş satış sayısı
+    # DÜZELTME: Bu sayede Conversion Rate %100'ün üstüne çıkmaz.
+    rate = round((purchases / clicks) * 100, 2) if clicks > 0 else 0
+
+    stats = {"clicks": clicks, "purchases": purchases, "rate": rate}
+    # "approx" motorunda yöneticiye tarih aralığındaki tekil alıcı / tıklayan sayısı da gösterilir (HyperLogLog tahmini)
+    if is_admin and current_app.config.get("ANALYTICS_ENGINE") == "approx":
+        stats.update(sketches.distinct_users(product.id, window))
+
+    # ürünün resmini oluşturma
+    hex_code = COLOR_CODES.get(selected_color, "000000")
+    text_c = "000000" if selected_color == "Beyaz" else "FFFFFF"
+    dynamic_img = f"https://placehold.co/500x500/{hex_code}/{text_c}/png?text={product.name.replace(' ', '+')}+({selected_color})"
+
+    # gerekli parametreleri ürün sayfasına yönlendirir
+    return render_template(
+        "product.html",
+        product=product,
+        current_image=dynamic_img,
+        selected_color=selected_color,
+        colors=ALL_COLORS,
+        color_dist=color_dist,
+        prod_outlier_data=prod_outlier_data,
+        stats=stats,
+        date_filters=date_filters,
+    )
+
+
+# Tarih Aralığı
+# url'deki ?days=N (son N gün), ?from=YYYY-MM-DD&to=YYYY-MM-DD ya da ?days=all (tüm geçmiş) parametreleri
+# hiçbiri yoksa son DASHBOARD_DEFAULT_DAYS gün, geçersiz değerler yok sayılır
+# (pencere, şablon için seçili ayarlar) döner, pencere (başlangıç günü, bitiş günü) ya da None
+def _date_window():
+    today = datetime.datetime.utcnow().date()  # log kayıtları utc zamanla tutuluyor
+    days = request.args.get("days", "")
+    start = request.args.get("from", "")
+    end = request.args.get("to", "")
+
+    if start or end:
+        try:
+            start_date = datetime.date.fromisoformat(start) if start else datetime.date.min
+            end_date = datetime.date.fromisoformat(end) if end else today
+        except ValueError:
+            start_date = end_date = None
+        if start_date is not None:
+            if start_date > end_date:
+                start_date, end_date = end_date, start_date
+            return (
+                (start_date.isoformat(), end_date.isoformat()),
+                {"days": "", "from": start, "to": end or end_date.isoformat()},
+            )
+
+    if days == "all":
+        return None, {"days": "all", "from": "", "to": ""}
+
+    default_days = current_app.config["DASHBOARD_DEFAULT_DAYS"]
+    try:
+        n = min(max(int(days), 1), 3650) if days else default_days
+    except ValueError:
+        n = default_days
+    return last_days(n), {"days": str(n), "from": "", "to": ""}
+
+
+# bugün dahil son n günün penceresi, (başlangıç günü, bitiş günü)
+def last_days(n):
+    today = datetime.datetime.utcnow().date()
+    return ((today - datetime.timedelta(days=n - 1)).isoformat(), today.isoformat())
+
+
+# Yönetici Paneli Hesaplamaları
+# tüm sayımlar scripts/aggregates.py içindeki GROUP BY sorgularıyla yapılır,
+# buradaki fonksiyonlar sadece dönen özet satırları grafik formatına çevirir
+
+
+# Global Outlier Analizi
+# günlük toplam satışlardan anormallik sınırını bulur, sınırı aşan günlerin "Whale" müşterisini tespit eder
+# grafik verisi ile birlikte diğer grafiklerin temizlenmesi için kara listeyi de döner
+def _outlier_analysis(window=None):
+    totals = aggregates.daily_totals(window)
+    sorted_dates = [d for d, _ in totals]
+    counts = [total for _, total in totals]
+
+    # seçilen aralıkta hiç satış yoksa boş grafik
+    if not counts:
+        return {"labels": [], "data": [], "outliers": [], "clean_data": [], "details": []}, set()
+
+    # mean ve standart sapma hesaplama
+    if len(counts) > 1:
+        mean = statistics.mean(counts)
+        stdev = statistics.stdev(counts)
+    else:
+        mean = counts[0]
+        stdev = 0
+
+    # anormallik sınırı
+    threshold = mean + (2 * stdev) if stdev > 0 else mean + 10
+
+    # sadece sınırı aşan günler için en çok alım yapan kullanıcıyı ve ürünü sorguluyoruz
+    # "approx" motorunda kullanıcı x gün tablosu gruplanmaz, günlük özetlerden okunur
+    outlier_days = [d for d, total in totals if total > threshold]
+    source = sketches if current_app.config.get("ANALYTICS_ENGINE") == "approx" else aggregates
+    whales = source.top_buyers(outlier_days)
+    top_prods = source.top_products(outlier_days)
+
+    # "Whale" kullanıcıların kara listesi, sayfadaki diğer grafiklerin doğru veri gösterebilmesi için
+    whale_blacklist = set()
+    outliers_arr = []
+    clean_arr = []
+    details_list = []
+
+    # her günü işle
+    for d, total in totals:
+        # eğer o gün anormallik sınırı aşılmış ise;
+        # o gün en çok alım yapan kullanıcıyı (Whale) kara listeye ekle
+        if d in whales:
+            whale_user_id, whale_qty = whales[d]
+            whale_blacklist.add((whale_user_id, d))
+            outliers_arr.append(total)
+            clean_arr.append(total - whale_qty)
+
+            prod_id, prod_name, category = top_prods.get(d, (0, "", "Genel"))
+            details_list.append(
+                {
+                    "date": d,
+                    "total_sales": total,
+                    "outlier_qty": whale_qty,
+                    "prod_name": prod_name,
+                    "prod_id": prod_id,
+                    "category": category,
+                }
+            )
+        # aşılmamış ise olduğu gibi devam et
+        else:
+            outliers_arr.append(None)
+            clean_arr.append(total)
+
+    outlier_data = {
+        "labels": sorted_dates,
+        "data": counts,
+        "outliers": outliers_arr,
+        "clean_data": clean_arr,
+        "details": details_list,
+    }
+    return outlier_data, whale_blacklist
+
+
+# Popüler Ürünler Grafiği
+# tıklanma sayısına göre ilk 10 ürün, satın almalar "Whale" den arınmış verilerden sayılır
+def _popularity_chart(whale_blacklist, window=None):
+    top_prods = aggregates.top_clicked_products(10, window)
+    clean_counts = aggregates.clean_product_counts(
+        whale_blacklist, [prod_id for prod_id, _, _ in top_prods], window
+    )
+
+    pop_data = {"labels": [], "clicks": [], "purchases": []}
+    for prod_id, name, clicks in top_prods:
+        pop_data["labels"].append(name)
+        pop_data["clicks"].append(clicks)
+        pop_data["purchases"].append(clean_counts.get(prod_id, 0))
+    return pop_data
+
+
+# Cinsiyet Dağılımı Grafiği
+# veri tabanında kaç erkek kaç kadın var (admin dışı), kullanıcı boyut tablosundan
+def _gender_chart():
+    g_map = user_dim.get().gender_totals
+    return {"labels": ["Erkek", "Kadın"], "data": [g_map["E"], g_map["K"]]}
+
+
+# Müşteri Segmentasyonu Grafikleri (Şehir / Meslek)
+# temiz satışlar kullanıcı bazında toplanır, şehir - meslek grubu ve cinsiyet kullanıcı boyut tablosundan bulunur
+def _segment_charts(whale_blacklist, window=None):
+    dim = user_dim.get()
+
+    # o grupta kaç erkek kaç kadın var
+    segments = {}
+    for user_id, qty in aggregates.segment_genders(whale_blacklist, window):
+        seg, gender, age = dim.lookup(user_id)
+        if seg < 0 or gender < 0:
+            continue
+        if seg not in segments:
+            segments[seg] = [0, 0, 0]  # erkek, kadın, yaş toplamı
+        segments[seg][gender] += qty
+        segments[seg][2] += qty * age
+
+    # en çok hacmi olan ilk 15 grubu seçiyoruz, eşit hacimde isme göre sıralanıyor
+    sorted_segments = sorted(
+        segments.items(), key=lambda item: (-(item[1][0] + item[1][1]), dim.segment_labels[item[0]])
+    )[:15]
+
+    segment_gender_data = {"labels": [], "male": [], "female": [], "avg_age": []}
+    for seg, (male, female, age_sum) in sorted_segments:
+        segment_gender_data["labels"].append(dim.segment_labels[seg])
+        segment_gender_data["male"].append(male)
+        segment_gender_data["female"].append(female)
+        volume = male + female
+        avg = round(age_sum / volume, 1) if volume else 0
+        segment_gender_data["avg_age"].append(avg)
+
+    # Kategori Tercihleri Grafiği, aynı segmentler için kategori bazlı veri seti
+    top = {seg: i for i, (seg, _) in enumerate(sorted_segments)}
+    cat_segments = {}
+    for user_id, cat, qty in aggregates.segment_categories(whale_blacklist, window):
+        # ilk 15 dışındaki gruplarda satılan kategoriler de (sıfır değerle) listelenir
+        data_points = cat_segments.setdefault(cat, [0] * len(top))
+        seg = dim.lookup(user_id)[0]
+        if seg in top:
+            data_points[top[seg]] += qty
+
+    segment_cat_data = {"labels": segment_gender_data["labels"], "datasets": []}
+    for cat in sorted(cat_segments):
+        segment_cat_data["datasets"].append({"label": cat, "data": cat_segments[cat]})
+
+    return segment_gender_data, segment_cat_data
+
+
+# Panel Grafikleri
+# her grafik ayrı bir JSON adresinden yüklenir, böylece yavaş ya da hata veren bir grafik diğerlerini bekletmez.
+# panel sayfası açılırken tüm grafikler bir thread havuzunda aynı anda hesaplanmaya başlar,
+# sayfadaki istekler geldiğinde sonuç önbellekte hazırdır ya da hesaplamanın bitmesi beklenir
+
+# grafik adı -> boş veri (hata durumunda dönülür)
+CHARTS = {
+    "popularity": {"labels": [], "clicks": [], "purchases": []},
+    "gender": {"labels": [], "data": []},
+    "segment-gender": {"labels": [], "male": [], "female": [], "avg_age": []},
+    "segment-category": {"labels": [], "datasets": []},
+    "outliers": {"labels": [], "data": [], "outliers": [], "clean_data": [], "details": []},
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# panel hesaplamaları önbellekten döner, analiz kopyası açıksa sorgular kopyaya gider
+# ve sonuç yeni satış / tıklama ile değil yeni kopya alındığında geçersiz olur
+def _analytics(key, compute, stale=True):
+    def run():
+        with snapshot.reading():
+            return compute()
+
+    return cache.get_or_compute(key, run, stale=stale, version=snapshot.version())
+
+
+# grafiklerin ortak girdisi: outlier analizi ve whale kara listesi
+# numpy motorunda sütunlu veri seti ve temiz satır maskesi, python yolunda frame None ve (kullanıcı, gün) kara listesi
+# diğer grafikler bunu kullandığı için eski sonuç dönülmez
+def _dashboard_base(window):
+    def compute():
+        frame_class = _frame_class()
+        if frame_class is not None:
+            frame = frame_class(window)
+            outlier_data, clean_rows = analytics_np.outlier_analysis(frame)
+            return frame, outlier_data, clean_rows
+        outlier_data, whale_blacklist = _outlier_analysis(window)
+        return None, outlier_data, whale_blacklist
+
+    return _analytics(("dashboard-base", window), compute, stale=False)
+
+
+# iki segment grafiği aynı gruplardan hesaplandığı için birlikte tutulur
+def _dashboard_segments(window):
+    def compute():
+        frame, _, clean = _dashboard_base(window)
+        if frame is not None:
+            return analytics_np.segment_charts(frame, clean)
+        return _segment_charts(clean, window)
+
+    return _analytics(("dashboard-segments", window), compute, stale=False)
+
+
+# tek bir grafiğin verisi
+# window: (başlangıç günü, bitiş günü) ya da None (tüm geçmiş), tüm sorgular bu aralıkla filtrelenir
+def chart_data(name, window=None):
+    # cinsiyet dağılımı satışlardan bağımsız, ortak girdiyi beklemez
+    if name == "gender":
+        return _gender_chart()
+    if name == "segment-gender":
+        return _dashboard_segments(window)[0]
+    if name == "segment-category":
+        return _dashboard_segments(window)[1]
+
+    frame, outlier_data, clean = _dashboard_base(window)
+    if name == "outliers":
+        return outlier_data
+    if frame is not None:
+        return analytics_np.popularity_chart(frame, clean)
+    return _popularity_chart(clean, window)
+
+
+# sonuç veri versiyonu ve tarih aralığı ile önbellekte tutulur, yeni satış/tıklama yoksa tekrar hesaplanmaz
+def _cached_chart(name, window):
+    return _analytics(("dashboard", name, window), lambda: chart_data(name, window))
+
+
+def _chart_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=current_app.config.get("DASHBOARD_WORKERS", len(CHARTS)),
+                thread_name_prefix="dashboard",
+            )
+        return _pool
+
+
+# havuzdaki thread'ler kendi app context'i içinde çalışır
+def _warm_chart(app, name, window):
+    with app.app_context():
+        try:
+            _cached_chart(name, window)
+        except Exception:
+            traceback.print_exc()
+
+
+# panel sayfası açılırken tüm grafikleri aynı anda hesaplamaya başlar, sonucu beklemez
+def _prefetch_charts(window):
+    app = current_app._get_current_object()
+    pool = _chart_pool()
+    for name in CHARTS:
+        pool.submit(_warm_chart, app, name, window)
+
+
+# Yönetici Paneli Sayfası
+# grafik verileri sayfaya gömülmez, sayfa açıldıktan sonra dashboard_chart adresinden yüklenir
+def admin_dashboard():
+    # kullanıcı admin mi kontrolu
+    if not current_user.is_admin:
+        return "Yetkisiz", 403
+
+    window, date_filters = _date_window()
+    _prefetch_charts(window)
+
+    # satın alma anında yazılan anomaliler, tablo küçük olduğu için önbelleğe alınmadan okunur
+    snapshot.ensure_fresh()
+    with snapshot.reading():
+        recent = anomalies.recent(window)
+    return render_template(
+        "dashboard.html",
+        date_filters=date_filters,
+        anomalies=recent,
+        snapshot_age=snapshot.age() if snapshot.enabled() else None,
+    )
+
+
+# Panel Grafiği (JSON)
+# hata veren grafik boş veri ve hata mesajı ile döner, diğer grafikler etkilenmez
+def dashboard_chart(name):
+    if not current_user.is_admin:
+        return "Yetkisiz", 403
+    if name not in CHARTS:
+        return jsonify({"error": "Bilinmeyen grafik."}), 404
+
+    window, _ = _date_window()
+    try:
+        return jsonify(_cached_chart(name, window))
+    except Exception as e:
+        print(f"DASHBOARD ERROR ({name}): {e}")
+        traceback.print_exc()
+        return jsonify(dict(CHARTS[name], error="Grafik hesaplanamadı.")), 500
+
+
+# Tüm Katalog Anomali Raporu
+# rapor süreç havuzunda hesaplanır ve panel grafikleri gibi versiyonlu önbellekte tutulur,
+# veri değiştiyse eski rapor hemen gösterilip arka planda yenilenir
+def anomaly_report_view():
+    if not current_user.is_admin:
+        return "Yetkisiz", 403
+
+    window, date_filters = _date_window()
+    workers = current_app.config["ANOMALY_REPORT_WORKERS"]
+    report = _analytics(("anomaly_report", window), lambda: anomaly_report.build(window, workers))
+    show_all = request.args.get("all") == "1"
+    rows = report["products"] if show_all else [r for r in report["products"] if r["outlier_days"]]
+    return render_template(
+        "anomaly_report.html",
+        report=report,
+        rows=rows,
+        show_all=show_all,
+        date_filters=date_filters,
+        snapshot_age=snapshot.age() if snapshot.enabled() else None,
+    )
+
+
+# Önbellek İstatistikleri
+def cache_stats():
+    if not current_user.is_admin:
+        return "Yetkisiz", 403
+
+    return jsonify(cache.snapshot())
+
+
+# Tıklama Tamponu İstatistikleri (kuyruk uzunluğu, yazma süreleri)
+def click_stats():
+    if not current_user.is_admin:
+        return "Yetkisiz", 403
+
+    return jsonify(click_buffer.snapshot())
+
+
+# İstek Ölçümleri
+# endpoint bazında süre / sorgu dağılımları, en yavaş sorgular, profiller ve diğer bileşenlerin sayaçları
+def metrics_view():
+    if not current_user.is_admin:
+        return "Yetkisiz", 403
+
+    result = metrics.snapshot()
+    result["cache"] = cache.snapshot()
+    result["clicks"] = click_buffer.snapshot()
+    result["purchases"] = dict(purchases.stats)
+    result["users"] = user_cache.snapshot()
+    result["pages"] = page_cache.snapshot()
+    return jsonify(result)
@@ -0,0 +1,272 @@
+import datetime  # tarih verileri için
+import multiprocessing  # günleri paralel üretmek için
+import random  # rastgelelik gerektiren işlemler için
+import threading  # işçilere gönderilen görevleri sınırlamak için
+import time
+
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash  # şifreyi veri tabanına hashleyerek saklama, güvenlik
+
+from scripts.data import db, User, Product, ClickLog, PurchaseLog, COLOR_CODES
+
+# Sahte Veri Üretici
+# kullanıcılar, ürünler ve son "days" günlük tıklama / satın alma trafiği üretilir.
+# her gün (ve kalabalık günlerde günün ziyaretçi dilimleri) ayrı bir işçi süreçte üretilir,
+# satırlar ORM nesnesi yerine sözlük olarak "chunk_size"lık parçalar halinde Core executemany ile yazılır.
+# aynı seed ile aynı veri üretilir, işçi sayısı sonucu değiştirmez
+
+PRODUCTS = [
+    ("iPhone 15", "Elektronik", 50000),
+    ("MacBook Air", "Elektronik", 45000),
+    ("iPad Pro", "Elektronik", 35000),
+    ("Sony Kulaklık", "Elektronik", 9000),
+    ("Oyun PC", "Elektronik", 60000),
+    ("Samsung S24", "Elektronik", 55000),
+    ("Yazlık Elbise", "Giyim", 900),
+    ("Kot Ceket", "Giyim", 1200),
+    ("Keten Pantolon", "Giyim", 800),
+    ("İpek Şal", "Giyim", 600),
+    ("Deri Mont", "Giyim", 4000),
+    ("Spor Tayt", "Giyim", 500),
+    ("Nike Air", "Ayakkabı", 4500),
+    ("Adidas Superstar", "Ayakkabı", 3800),
+    ("Topuklu Ayakkabı", "Ayakkabı", 1500),
+    ("Bot", "Ayakkabı", 2000),
+    ("Koşu Ayakkabısı", "Ayakkabı", 3000),
+    ("Kahve Makinesi", "Ev", 5000),
+    ("Robot Süpürge", "Ev", 15000),
+    ("Kitaplık", "Ev", 2500),
+    ("Çalışma Masası", "Ev", 3500),
+]
+
+JOBS = {
+    "Lise": ["Öğrenci", "Garson", "Kasiyer"],
+    "Lisans": ["Mühendis", "Öğretmen", "Yazılımcı"],
+    "Yuksek": ["Doktor", "Avukat", "Akademisyen"],
+}
+
+CITIES = ["İstanbul", "Ankara", "İzmir", "Bursa", "Antalya"]
+
+COLORS = list(COLOR_CODES.keys())
+
+PASSWORD = "123"  # tüm sahte kullanıcıların şifresi
+
+# ziyaretçi başına davranış
+PRODUCTS_PER_VISIT = 3  # seçilen her kullanıcı o gün bu kadar farklı ürünle etkileşime girer
+MIN_QTY, MAX_QTY = 1, 3  # ürün başına alım adedi
+MIN_CLICK, MAX_CLICK = 1, 5  # ürün başına tıklama
+WHALE_MIN, WHALE_MAX = 200, 500  # outlier gününde tek kullanıcının tek üründen aldığı adet
+
+# bir işçi görevinde en fazla bu kadar ziyaretçi, her ziyaretçi en fazla 3 x (5 + 3) satır üretir
+VISITORS_PER_TASK = 2000
+
+
+# Ürünler
+def _insert_products():
+    db.session.execute(
+        insert(Product.__table__),
+        [{"name": n, "category": c, "price": p} for n, c, p in PRODUCTS],
+    )
+    db.session.commit()
+
+
+# Kullanıcılar
+# admin statik, diğerleri rastgele özelliklerle
+# şifre hash'i tek sefer hesaplanıp tüm kullanıcılarda kullanılır (her hash yüzlerce ms sürüyor)
+def _insert_users(rng, count, chunk_size):
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(
+        insert(User.__table__),
+        [
+            {
+                "username": "admin",
+                "gender": "E",
+                "birth_date": datetime.date(1990, 1, 1),
+                "education": "Yuksek",
+                "city": "İstanbul",
+                "job": "Yönetici",
+                "is_admin": True,
+                "password_hash": password_hash,
+            }
+        ],
+    )
+
+    chunk = []
+    for i in range(count):
+        edu = rng.choice(list(JOBS.keys()))
+        chunk.append(
+            {
+                "username": f"user{i}",
+                "gender": rng.choice(["E", "K"]),
+                "birth_date": datetime.date(rng.randint(1980, 2005), 1, 1),
+                "education": edu,
+                "city": rng.choice(CITIES),
+                "job": rng.choice(JOBS[edu]),
+                "is_admin": False,
+                "password_hash": password_hash,
+            }
+        )
+        if len(chunk) >= chunk_size:
+            db.session.execute(insert(User.__table__), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(User.__table__), chunk)
+    db.session.commit()
+
+
+# tek bir işçi görevi: bir günün bir ziyaretçi dilimi için tıklama ve satın alma satırları
+# task: (seed, gün farkı, dilim no, zaman damgası, ziyaretçi id'leri, ürün id'leri, whale (kullanıcı, ürün, adet) ya da None)
+def _generate_slice(task):
+    seed, delta, part, timestamp, visitors, product_ids, whale = task
+    # her dilimin kendi rastgele üreticisi var, böylece sonuç işçi sayısından bağımsız
+    rng = random.Random(f"{seed}:{delta}:{part}")
+    day = timestamp.strftime("%Y-%m-%d")
+
+    clicks = []
+    purchases = []
+    for user_id in visitors:
+        for product_id in rng.sample(product_ids, min(PRODUCTS_PER_VISIT, len(product_ids))):
+            qty = rng.randint(MIN_QTY, MAX_QTY)
+            for _ in range(rng.randint(MIN_CLICK, MAX_CLICK)):
+                clicks.append(
+                    {"user_id": user_id, "product_id": product_id, "timestamp": timestamp, "day": day}
+                )
+            for _ in range(qty):
+                purchases.append(
+                    {
+                        "user_id": user_id,
+                        "product_id": product_id,
+                        "selected_color": rng.choice(COLORS),
+                        "timestamp": timestamp,
+                        "day": day,
+                    }
+                )
+
+    # outlier günü ise whale alımı
+    if whale:
+        whale_user, whale_product, whale_qty = whale
+        for _ in range(whale_qty):
+            purchases.append(
+                {
+                    "user_id": whale_user,
+                    "product_id": whale_product,
+                    "selected_color": rng.choice(COLORS),
+                    "timestamp": timestamp,
+                    "day": day,
+                }
+            )
+    return clicks, purchases
+
+
+# işçi görevleri, gün gün ve günün ziyaretçileri VISITORS_PER_TASK'lık dilimler halinde
+def _tasks(rng, seed, days, min_visitors, max_visitors, whales, user_ids, product_ids):
+    today = datetime.datetime.utcnow()
+
+    # son "days" gün içinden (ilk ve son günler hariç) "whales" kadar outlier günü
+    days_range = list(range(1, max(days - 1, 2)))
+    outlier_deltas = set(rng.sample(days_range, min(whales, len(days_range))))
+    print(
+        "Outlier Günleri:",
+        sorted((today - datetime.timedelta(days=d)).strftime("%Y-%m-%d") for d in outlier_deltas),
+    )
+
+    # bugünden itibaren "days" gün geriye kadar sayar
+    for delta in range(days):
+        current_date = today - datetime.timedelta(days=delta)
+        count = min(rng.randint(min_visitors, max_visitors), len(user_ids))
+        visitors = rng.sample(user_ids, count)
+
+        whale = None
+        if delta in outlier_deltas:
+            whale = (rng.choice(user_ids), rng.choice(product_ids), rng.randint(WHALE_MIN, WHALE_MAX))
+            print(f"!!! OUTLIER: {current_date:%Y-%m-%d} - kullanıcı {whale[0]} - ürün {whale[1]} - {whale[2]} adet")
+
+        for part, start in enumerate(range(0, max(count, 1), VISITORS_PER_TASK)):
+            yield (
+                seed,
+                delta,
+                part,
+                current_date,
+                visitors[start : start + VISITORS_PER_TASK],
+                product_ids,
+                whale if part == 0 else None,
+            )
+
+
+# satırları biriktirip "chunk_size"a ulaşınca yazan yardımcı
+class _ChunkWriter:
+    def __init__(self, model, chunk_size):
+        self.stmt = insert(model.__table__)
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.total = 0
+
+    def add(self, rows):
+        self.rows.extend(rows)
+        while len(self.rows) >= self.chunk_size:
+            self._write(self.rows[: self.chunk_size])
+            del self.rows[: self.chunk_size]
+
+    def flush(self):
+        if self.rows:
+            self._write(self.rows)
+            self.rows = []
+
+    def _write(self, rows):
+        db.session.execute(self.stmt, rows)
+        db.session.commit()
+        self.total += len(rows)
+
+
+# görevleri işçilere dağıtır, sonuçlar görev sırasıyla döner
+# havuz tek bir imap ile sürekli beslenir, ana süreç satırları yazarken işçiler sonraki dilimleri üretmeye devam eder.
+# aynı anda en fazla "workers * 4" dilim üretilmekte ya da yazılmayı beklemekte olur, bellek sınırlı kalır
+def _run(tasks, workers):
+    if workers <= 1:
+        for task in tasks:
+            yield _generate_slice(task)
+        return
+
+    slots = threading.BoundedSemaphore(workers * 4)
+
+    # havuzun görev besleyen thread'i, yazılmayı bekleyen dilim sayısı sınıra ulaşınca burada bekler
+    def limited():
+        for task in tasks:
+            slots.acquire()
+            yield task
+
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap(_generate_slice, limited()):
+            slots.release()
+            yield result
+
+
+# boş veritabanına ürünleri, kullanıcıları ve trafiği yazar
+def generate(users=200, days=30, min_visitors=10, max_visitors=40, whales=2, seed=None, chunk_size=50000, workers=1):
+    if seed is None:
+        seed = random.randrange(2**32)
+    print(f"Seed: {seed}")
+    rng = random.Random(seed)
+    start = time.perf_counter()
+
+    print("1. Ürünler Ekleniyor...")
+    _insert_products()
+
+    print("2. Kullanıcılar Ekleniyor...")
+    _insert_users(rng, users, chunk_size)
+
+    print("3. VERİ SİMÜLASYONU BAŞLIYOR (NORMAL + OUTLIER)...")
+    user_ids = db.session.scalars(select(User.id).where(User.is_admin.is_(False)).order_by(User.id)).all()
+    product_ids = db.session.scalars(select(Product.id).order_by(Product.id)).all()
+
+    clicks = _ChunkWriter(ClickLog, chunk_size)
+    purchases = _ChunkWriter(PurchaseLog, chunk_size)
+    tasks = _tasks(rng, seed, days, min_visitors, max_visitors, whales, user_ids, product_ids)
+    for click_rows, purchase_rows in _run(tasks, workers):
+        clicks.add(click_rows)
+        purchases.add(purchase_rows)
+    clicks.flush()
+    purchases.flush()
+
+    elapsed = time.perf_counter() - start
+    print(f"{clicks.total} tıklama, {purchases.total} satın alma yazıldı ({elapsed:.1f} sn).")
@@ -0,0 +1,254 @@
+import collections  # kayan pencereler ve sayaçlar için
+import heapq  # en yavaş sorguları tutmak için
+import os
+import sys
+import threading  # sampling profiler thread'i ve kilitler için
+import time
+
+from flask import g, has_app_context, request, before_render_template, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+
+from scripts.data import db
+
+# İstek Ölçümleri
+# her istek için toplam süre, sql sorgu sayısı / süresi ve şablon (jinja) render süresi kaydedilir,
+# kalan süre python tarafındaki işlemlere (aggregation vb.) aittir.
+# endpoint bazında son METRICS_WINDOW isteğin kayan penceresi tutulur, yüzdelikler ve histogram bundan hesaplanır.
+# admin "?profile=1" ile istek atarsa istek boyunca örnekleyen bir profiler çalışır, sonucu /admin/metrics'te görünür
+
+# histogram kova üst sınırları (ms)
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+_lock = threading.Lock()
+_endpoints = {}  # endpoint -> {"count", "errors", "window": deque}
+_slow_queries = []  # (süre ms, sıra, kayıt) min-heap
+_profiles = collections.deque(maxlen=10)
+_background = {"queries": 0, "query_ms": 0.0}  # istek dışındaki thread'lerin sorguları (tıklama yazma vb.)
+_seq = 0
+
+_config = {}
+
+
+def init_app(app):
+    app.config.setdefault("METRICS_ENABLED", True)
+    app.config.setdefault("METRICS_WINDOW", 500)  # endpoint başına tutulan son istek sayısı
+    app.config.setdefault("METRICS_SLOW_QUERIES", 20)  # saklanan en yavaş sorgu sayısı
+    app.config.setdefault("METRICS_PROFILE_INTERVAL", 0.001)  # profiler örnekleme aralığı (sn)
+    if not app.config["METRICS_ENABLED"]:
+        return
+    _config.update(
+        window=app.config["METRICS_WINDOW"],
+        slow=app.config["METRICS_SLOW_QUERIES"],
+        interval=app.config["METRICS_PROFILE_INTERVAL"],
+    )
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+
+# SQL Ölçümü
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    global _seq
+    elapsed = (time.perf_counter() - conn.info["metrics_start"].pop()) * 1000
+    state = g.get("_metrics") if has_app_context() else None
+    if state is None:
+        with _lock:
+            _background["queries"] += 1
+            _background["query_ms"] += elapsed
+        return
+
+    state["queries"] += 1
+    state["query_ms"] += elapsed
+
+    # en yavaş sorgular, heap'in en küçüğünden yavaşsa yerine geçer
+    with _lock:
+        if len(_slow_queries) < _config["slow"] or elapsed > _slow_queries[0][0]:
+            _seq += 1
+            entry = {
+                "ms": round(elapsed, 3),
+                "endpoint": state["endpoint"],
+                "statement": " ".join(statement.split())[:500],
+                "executemany": executemany,
+                "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            item = (elapsed, _seq, entry)
+            if len(_slow_queries) < _config["slow"]:
+                heapq.heappush(_slow_queries, item)
+            else:
+                heapq.heapreplace(_slow_queries, item)
+
+
+# Şablon Render Ölçümü
+
+
+def _before_render(sender, template, context, **extra):
+    state = g.get("_metrics")
+    if state is not None:
+        state["render_start"] = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    state = g.get("_metrics")
+    if state is not None and state.get("render_start"):
+        state["render_ms"] += (time.perf_counter() - state.pop("render_start")) * 1000
+
+
+# İstek Ölçümü
+
+
+def _before_request():
+    g._metrics = {
+        "start": time.perf_counter(),
+        "endpoint": request.endpoint or "404",
+        "queries": 0,
+        "query_ms": 0.0,
+        "render_ms": 0.0,
+        "status": 500,
+        "profiler": None,
+    }
+    if request.args.get("profile") == "1" and current_user.is_authenticated and current_user.is_admin:
+        profiler = _Sampler(threading.get_ident(), _config["interval"])
+        profiler.start()
+        g._metrics["profiler"] = profiler
+
+
+def _after_request(response):
+    state = g.get("_metrics")
+    if state is not None:
+        state["status"] = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    state = g.pop("_metrics", None)
+    if state is None:
+        return
+    wall = (time.perf_counter() - state["start"]) * 1000
+    sample = (wall, state["queries"], state["query_ms"], state["render_ms"])
+
+    with _lock:
+        stats = _endpoints.get(state["endpoint"])
+        if stats is None:
+            stats = {"count": 0, "errors": 0, "window": collections.deque(maxlen=_config["window"])}
+            _endpoints[state["endpoint"]] = stats
+        stats["count"] += 1
+        if exc is not None or state["status"] >= 500:
+            stats["errors"] += 1
+        stats["window"].append(sample)
+
+    if state["profiler"] is not None:
+        profile = state["profiler"].stop()
+        profile.update(endpoint=state["endpoint"], path=request.full_path, wall_ms=round(wall, 2))
+        with _lock:
+            _profiles.append(profile)
+
+
+# Sampling Profiler
+# isteği işleyen thread'in yığını (stack) belirli aralıklarla okunur,
+# en çok görülen fonksiyonlar ve yığınlar zamanın nereye gittiğini gösterir
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.functions = collections.Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < 40:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.samples += 1
+            self.functions[stack[0]] += 1
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "top_functions": [{"frame": f, "samples": n} for f, n in self.functions.most_common(15)],
+            "top_stacks": [{"stack": list(s[-12:]), "samples": n} for s, n in self.stacks.most_common(5)],
+        }
+
+
+# Özet
+
+
+def _percentile(ordered, p):
+    return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+
+def _summary(values):
+    ordered = sorted(values)
+    return {
+        "p50": _percentile(ordered, 50),
+        "p90": _percentile(ordered, 90),
+        "p99": _percentile(ordered, 99),
+        "max": round(ordered[-1], 3),
+        "mean": round(sum(ordered) / len(ordered), 3),
+    }
+
+
+# [{"le": üst sınır ms, "count": adet}], son kova sınırsız (le: None)
+def _histogram(values):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for v in values:
+        i = 0
+        while i < len(BUCKETS_MS) and v > BUCKETS_MS[i]:
+            i += 1
+        counts[i] += 1
+    return [{"le": le, "count": n} for le, n in zip(BUCKETS_MS + [None], counts)]
+
+
+# endpoint bazında kayan pencere özetleri, en yavaş sorgular ve son profiller
+def snapshot():
+    with _lock:
+        endpoints = {name: (s["count"], s["errors"], list(s["window"])) for name, s in _endpoints.items()}
+        slow = [entry for _, _, entry in sorted(_slow_queries, reverse=True)]
+        profiles = list(_profiles)
+        background = dict(_background, query_ms=round(_background["query_ms"], 3))
+
+    result = {}
+    for name, (count, errors, window) in endpoints.items():
+        if not window:
+            continue
+        wall, queries, query_ms, render_ms = zip(*window)
+        python_ms = [w - q - r for w, q, r in zip(wall, query_ms, render_ms)]
+        result[name] = {
+            "count": count,
+            "errors": errors,
+            "window": len(window),
+            "wall_ms": _summary(wall),
+            "wall_histogram": _histogram(wall),
+            "queries": _summary(queries),
+            "query_ms": _summary(query_ms),
+            "render_ms": _summary(render_ms),
+            "python_ms": _summary(python_ms),
+        }
+    return {"endpoints": result, "slow_queries": slow, "profiles": profiles, "background": background}
+
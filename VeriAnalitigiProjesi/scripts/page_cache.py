@@ -0,0 +1,91 @@
+import collections
+import hashlib
+import os
+import threading  # önbellek kilidi için
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+
+import scripts.cache as cache
+
+# Sayfa Önbelleği (ETag)
+# ana sayfa ve ürün sayfasının üretilmiş html'i sayfa anahtarı (filtreler / ürün, renk, tarih aralığı) ve
+# sayfayı gören kişi ile birlikte bellekte tutulur. kayıt, üretildiği andaki veri versiyonu (cache.version,
+# her satın alma ve tıklama yazımında artar) ile saklanır, versiyon değişince sayfa yeniden üretilir.
+# her cevaba anahtar + versiyondan hesaplanan bir ETag eklenir, tarayıcı aynı ETag'i If-None-Match ile geri gönderirse
+# sayfa hiç üretilmeden ve önbelleğe bakılmadan 304 döner.
+# gören kişi: giriş yapmamış ziyaretçiler tek bir grup, giriş yapanlar için kullanıcı id'si ve admin yetkisi
+# (menüde kullanıcı adı, admin için analiz grafikleri gösterildiği için sayfa kişiye göre değişir)
+# not: process içinde tutulur, tek process ile çalışan "flask run" için tasarlandı
+
+# sunucu her açıldığında versiyon sayacı sıfırdan başladığı için ETag'lere process'e özel bir ön ek eklenir,
+# yeniden başlatmadan önce verilmiş bir ETag, aynı versiyon numarasındaki farklı bir sayfa ile eşleşmesin
+_instance = os.urandom(8).hex()
+
+_lock = threading.Lock()
+_entries = collections.OrderedDict()  # anahtar -> (versiyon, html)
+
+stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+
+def _viewer():
+    if current_user.is_authenticated:
+        return (current_user.id, bool(current_user.is_admin))
+    return None
+
+
+def _etag(key, version):
+    raw = repr((_instance, version, key)).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _response(body, status, etag):
+    response = make_response(body, status)
+    response.set_etag(etag)
+    # tarayıcı sayfayı her seferinde doğrulatır, kişiye göre değiştiği için paylaşılan önbelleklerde tutulmaz
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
+
+
+# sayfayı önbellekten döner, yoksa render() ile üretip saklar
+# key: sayfanın içeriğini belirleyen değerler (tuple), render: parametresiz, html döndüren fonksiyon
+def page(key, render):
+    key = key + (_viewer(),)
+    version = cache.version()
+    etag = _etag(key, version)
+    if etag in request.if_none_match:
+        stats["not_modified"] += 1
+        return _response("", 304, etag)
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] == version:
+            _entries.move_to_end(key)
+            stats["hits"] += 1
+            return _response(entry[1], 200, etag)
+        stats["misses"] += 1
+
+    body = render()
+    size = current_app.config.get("PAGE_CACHE_SIZE", 2000)
+    with _lock:
+        old = _entries.get(key)
+        if not old or old[0] <= version:
+            _entries[key] = (version, body)
+            _entries.move_to_end(key)
+        while len(_entries) > size:
+            _entries.popitem(last=False)
+            stats["evictions"] += 1
+    return _response(body, 200, etag)
+
+
+# tüm kayıtları siler
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+# önbellek durumunu döner, admin ölçüm sayfası için
+def snapshot():
+    with _lock:
+        return dict(stats, entries=len(_entries))
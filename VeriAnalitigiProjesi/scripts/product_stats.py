@@ -0,0 +1,313 @@
+import math  # karekök için
+import statistics
+
+from sqlalchemy import event, func, select, update, bindparam
+from sqlalchemy.dialects.sqlite import insert  # sqlite'a özel upsert için
+
+from scripts.data import (
+    db,
+    Product,
+    DailyProductStat,
+    DailyUserStat,
+    DailyColorStat,
+    ProductStat,
+    ProductColorStat,
+    COLOR_CODES,
+)
+
+import scripts.retention as retention
+
+ALL_COLORS = list(COLOR_CODES.keys())
+
+# Ürün Bazlı Anlık İstatistikler
+# ürün sayfasının ihtiyaç duyduğu her şey (tıklanma / satış sayaçları, günlük satışlar, ortalama / standart sapma,
+# günün en çok alan kullanıcısı ve renk dağılımı) tıklama ve satın alma anında güncellenir
+
+
+# yeni eklenen her ürün için boş bir istatistik satırı açılır,
+# böylece popülerlik sıralaması ProductStat üzerinden tüm ürünleri kapsar
+@event.listens_for(Product, "after_insert")
+def _create_stat_row(mapper, connection, target):
+    connection.execute(insert(ProductStat).values(product_id=target.id).on_conflict_do_nothing())
+
+
+# yazılan tıklamaları ürün sayaçlarına ekler, click_buffer içinden aynı transaction'da çağrılır
+# product_clicks: {ürün: tıklama sayısı}
+def add_clicks(product_clicks):
+    if not product_clicks:
+        return
+    stmt = insert(ProductStat)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id"],
+        set_={"clicks": ProductStat.clicks + stmt.excluded.clicks},
+    )
+    db.session.execute(
+        stmt, [{"product_id": p, "clicks": n} for p, n in product_clicks.items()]
+    )
+
+
+# Welford: ürüne ilk kez satış yapılan bir gün eklendi
+def _welford_add(stat, x):
+    stat.days += 1
+    delta = x - stat.mean
+    stat.mean += delta / stat.days
+    stat.m2 += delta * (x - stat.mean)
+
+
+# Welford: var olan bir günün satış adedi old'dan new'e çıktı (gün sayısı değişmez)
+def _welford_replace(stat, old, new):
+    old_mean = stat.mean
+    stat.mean += (new - old) / stat.days
+    stat.m2 += (new - old) * (new - stat.mean + old - old_mean)
+
+
+# yeni satın alımları ürün istatistiklerine işler
+# rollup.add_purchases içinden, gün x ürün ve gün x kullanıcı tabloları güncellendikten sonra çağrılır,
+# yazma kilidi alınmış aynı transaction içinde çalıştığı için okuma-yazma sırası güvenli
+# day_products: {(gün, ürün): adet}, day_users: {(gün, kullanıcı, ürün)}, colors: {(ürün, renk): adet}
+def add_purchases(day_products, day_users, colors):
+    # günlük satışlar ve Welford ortalama / varyans
+    for (d, product_id), k in day_products.items():
+        new = db.session.execute(
+            select(DailyProductStat.qty).where(
+                DailyProductStat.day == d, DailyProductStat.product_id == product_id
+            )
+        ).scalar_one()
+        stat = db.session.get(ProductStat, product_id)
+        if stat is None:
+            stat = ProductStat(product_id=product_id, clicks=0, purchases=0, days=0, mean=0.0, m2=0.0)
+            db.session.add(stat)
+        stat.purchases += k
+        if new == k:
+            _welford_add(stat, new)
+        else:
+            _welford_replace(stat, new - k, new)
+
+    # günün en çok alan kullanıcısı, adetler sadece arttığı için yeni değer eskisini geçerse yeter
+    for d, user_id, product_id in day_users:
+        qty = db.session.execute(
+            select(DailyUserStat.qty).where(
+                DailyUserStat.day == d,
+                DailyUserStat.user_id == user_id,
+                DailyUserStat.product_id == product_id,
+            )
+        ).scalar_one()
+        db.session.execute(
+            update(DailyProductStat.__table__)
+            .where(
+                DailyProductStat.day == d,
+                DailyProductStat.product_id == product_id,
+                DailyProductStat.top_user_qty < qty,
+            )
+            .values(top_user_id=user_id, top_user_qty=qty)
+        )
+
+    # renk dağılımı
+    if colors:
+        stmt = insert(ProductColorStat)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["product_id", "color"],
+            set_={"qty": ProductColorStat.qty + stmt.excluded.qty},
+        )
+        rows = [
+            {"product_id": product_id, "color": color, "qty": qty}
+            for (product_id, color), qty in colors.items()
+        ]
+        db.session.execute(stmt, rows)
+
+
+# ürün istatistiklerini günlük özet tablolarından yeniden hesaplar, rollup.rebuild içinden çağrılır
+def rebuild():
+    # her gün için o ürünü en çok alan kullanıcı
+    ranked = select(
+        DailyUserStat.day,
+        DailyUserStat.product_id,
+        DailyUserStat.user_id,
+        DailyUserStat.qty,
+        func.row_number()
+        .over(
+            partition_by=(DailyUserStat.day, DailyUserStat.product_id),
+            order_by=(DailyUserStat.qty.desc(), DailyUserStat.user_id),
+        )
+        .label("rn"),
+    ).subquery()
+    top_rows = db.session.execute(
+        select(ranked.c.day, ranked.c.product_id, ranked.c.user_id, ranked.c.qty).where(
+            ranked.c.rn == 1
+        )
+    ).all()
+    if top_rows:
+        stmt = (
+            update(DailyProductStat.__table__)
+            .where(
+                DailyProductStat.day == bindparam("b_day"),
+                DailyProductStat.product_id == bindparam("b_product_id"),
+            )
+            .values(top_user_id=bindparam("b_user_id"), top_user_qty=bindparam("b_qty"))
+        )
+        db.session.execute(
+            stmt,
+            [{"b_day": d, "b_product_id": p, "b_user_id": u, "b_qty": q} for d, p, u, q in top_rows],
+        )
+
+    # her ürün için tıklanma / satış sayaçları ile günlük adetlerden ortalama ve m2
+    daily = {}
+    for product_id, qty in db.session.query(DailyProductStat.product_id, DailyProductStat.qty):
+        daily.setdefault(product_id, []).append(qty)
+    clicks = dict(db.session.execute(retention.click_counts()).all())
+    stats = []
+    for (product_id,) in db.session.query(Product.id):
+        counts = daily.get(product_id, [])
+        mean = sum(counts) / len(counts) if counts else 0.0
+        stats.append(
+            {
+                "product_id": product_id,
+                "clicks": clicks.get(product_id, 0),
+                "purchases": sum(counts),
+                "days": len(counts),
+                "mean": mean,
+                "m2": sum((c - mean) ** 2 for c in counts),
+            }
+        )
+    if stats:
+        db.session.execute(insert(ProductStat), stats)
+
+    # renk dağılımı
+    color_query = select(
+        DailyColorStat.product_id, DailyColorStat.color, func.sum(DailyColorStat.qty)
+    ).group_by(DailyColorStat.product_id, DailyColorStat.color)
+    db.session.execute(
+        insert(ProductColorStat).from_select(["product_id", "color", "qty"], color_query)
+    )
+
+
+# tıklanma ve satış sayaçlarını ham loglardan (sıkıştırılmış günler için günlük özetlerden) sayıp kaymış olanları düzeltir
+# düzeltilen ürün sayısını döner
+def reconcile():
+    clicks = dict(db.session.execute(retention.click_counts()).all())
+    purchases = dict(db.session.execute(retention.purchase_counts()).all())
+    stats = {s.product_id: s for s in ProductStat.query.all()}
+
+    fixed = 0
+    for (product_id,) in db.session.query(Product.id):
+        stat = stats.get(product_id)
+        if stat is None:
+            stat = ProductStat(product_id=product_id, clicks=0, purchases=0, days=0, mean=0.0, m2=0.0)
+            db.session.add(stat)
+        expected = (clicks.get(product_id, 0), purchases.get(product_id, 0))
+        if (stat.clicks, stat.purchases) != expected:
+            stat.clicks, stat.purchases = expected
+            fixed += 1
+    db.session.commit()
+    return fixed
+
+
+# ürün sayfasındaki tıklanma sayısı, tarih aralığı verilirse ham ve sıkıştırılmış tıklamalardan sayılır
+def click_count(product_id, window=None):
+    if window is not None:
+        row = db.session.execute(retention.click_counts(window, product_id)).first()
+        return row.clicks if row else 0
+    stat = db.session.get(ProductStat, product_id)
+    return stat.clicks if stat else 0
+
+
+# Ürün Outlier Analizi
+# rows: gün sırasına göre [(gün, satış adedi, günün en çok alan kullanıcısının adedi)]
+# eğer o günkü satış anormallik sınırını (mean + 2 * stdev) aşarsa ve
+# o günün en çok alanı (Whale) ortalamanın 2 katından fazla almışsa outlier sayılır, alımı temiz grafikten çıkarılır
+# (grafik verisi, çıkarılan toplam whale alımı) döner
+def outlier_series(rows, mean, stdev):
+    threshold = mean + (2 * stdev)
+
+    labels = []
+    counts = []
+    outliers_arr = []
+    clean_arr = []
+    whale_total_removed = 0
+    for d, c, whale_qty in rows:
+        labels.append(d)
+        counts.append(c)
+        if c > threshold and whale_qty > (mean * 2):
+            outliers_arr.append(c)
+            clean_arr.append(c - whale_qty)
+            whale_total_removed += whale_qty
+        else:
+            outliers_arr.append(None)
+            clean_arr.append(c)
+
+    prod_outlier_data = {
+        "labels": labels,
+        "data": counts,
+        "outliers": outliers_arr,
+        "clean_data": clean_arr,
+    }
+    return prod_outlier_data, whale_total_removed
+
+
+# Ürün Sayfası Analizi
+# (grafik verisi, temizlenmiş satış sayısı, renk dağılımı) döner, admin değilse grafik verisi boş kalır
+# tüm geçmiş için satın alma anında güncellenen ProductStat / ProductColorStat okunur,
+# tarih aralığı (başlangıç günü, bitiş günü) verilirse sadece o aralıktaki günlük özet satırları okunur
+def product_analysis(product_id, is_admin, window=None):
+    if window is not None:
+        return _window_analysis(product_id, is_admin, window)
+
+    stat = db.session.get(ProductStat, product_id)
+    total = stat.purchases if stat else 0
+
+    # default olarak temizlenmiş satış sayısı tüm satışlar olsun
+    clean_purchases_count = total
+    prod_outlier_data = {"labels": [], "data": [], "clean_data": []}
+
+    # tek günlük veride standart sapma hesaplanamaz, grafik boş kalır
+    if is_admin and stat and stat.days > 1:
+        rows = _daily_rows(product_id)
+        stdev = math.sqrt(max(stat.m2, 0.0) / (stat.days - 1))
+        prod_outlier_data, whale_total_removed = outlier_series(rows, stat.mean, stdev)
+        clean_purchases_count = total - whale_total_removed
+
+    # ürün renk tercih verileri
+    color_rows = db.session.query(ProductColorStat.color, ProductColorStat.qty).filter(
+        ProductColorStat.product_id == product_id
+    )
+    return prod_outlier_data, clean_purchases_count, _color_dist(color_rows)
+
+
+# ürünün günlük satışları: [(gün, adet, günün en çok alanının adedi)]
+def _daily_rows(product_id, window=None):
+    query = db.session.query(
+        DailyProductStat.day, DailyProductStat.qty, DailyProductStat.top_user_qty
+    ).filter(DailyProductStat.product_id == product_id)
+    if window is not None:
+        query = query.filter(DailyProductStat.day.between(*window))
+    return query.order_by(DailyProductStat.day).all()
+
+
+def _color_dist(color_rows):
+    color_dist = {c: 0 for c in ALL_COLORS}
+    for color, qty in color_rows:
+        if color in color_dist:
+            color_dist[color] = qty
+    return color_dist
+
+
+# tarih aralığındaki ürün analizi, ortalama ve standart sapma aralıktaki günlerden hesaplanır
+def _window_analysis(product_id, is_admin, window):
+    rows = _daily_rows(product_id, window)
+    total = sum(qty for _, qty, _ in rows)
+
+    clean_purchases_count = total
+    prod_outlier_data = {"labels": [], "data": [], "clean_data": []}
+    if is_admin and len(rows) > 1:
+        counts = [qty for _, qty, _ in rows]
+        prod_outlier_data, whale_total_removed = outlier_series(
+            rows, statistics.mean(counts), statistics.stdev(counts)
+        )
+        clean_purchases_count = total - whale_total_removed
+
+    color_rows = (
+        db.session.query(DailyColorStat.color, func.sum(DailyColorStat.qty))
+        .filter(DailyColorStat.product_id == product_id, DailyColorStat.day.between(*window))
+        .group_by(DailyColorStat.color)
+    )
+    return prod_outlier_data, clean_purchases_count, _color_dist(color_rows)
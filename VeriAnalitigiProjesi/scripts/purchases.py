@@ -0,0 +1,116 @@
+import threading  # aynı anda gelen satın almaları gruplamak için
+import time
+import traceback
+
+from flask import current_app
+from sqlalchemy import insert
+
+from scripts.data import db, PurchaseLog
+import scripts.rollup as rollup
+import scripts.cache as cache
+import scripts.click_buffer as click_buffer
+
+# Satın Alma Kaydı (group commit)
+# her satın alma isteği kendi commit'ini atmak yerine ortak bir kuyruğa eklenir.
+# kuyruğa ilk giren istek "lider" olur, kuyruktaki satın almaların hepsini tek transaction ile yazar.
+# o sırada başka satın alma istekleri de işleniyorsa önce GROUP_COMMIT_WINDOW kadar bekler ki onlar da gruba katılsın.
+# lider tek bir grup yazar, yazma sırasında kuyruğa yeni istek geldiyse liderliği kuyruktaki ilk isteğe devreder,
+# böylece hiçbir istek kendi satın alması yazıldıktan sonra başkalarının grupları için beklemez.
+# diğer istekler kendi satırları yazılana ya da lider olana kadar bekler
+
+_lock = threading.Lock()
+_pending = []  # [(satırlar, bekleyen)]
+_leader_active = False
+_writers = 0  # o an record içinde olan istek sayısı
+
+stats = {"groups": 0, "requests": 0, "rows": 0, "max_group": 0}
+
+
+class _Waiter:
+    def __init__(self):
+        self.wake = threading.Event()  # satırlar yazıldığında ya da liderlik devredildiğinde
+        self.written = False
+        self.error = None
+
+
+# satın alma satırlarını kaydeder, commit olana kadar bekler
+# rows: [{"user_id", "product_id", "selected_color", "timestamp"}]
+def record(rows):
+    global _leader_active, _writers
+    waiter = _Waiter()
+    with _lock:
+        _pending.append((rows, waiter))
+        _writers += 1
+        lead = not _leader_active
+        if lead:
+            _leader_active = True
+
+    try:
+        if not lead:
+            waiter.wake.wait()
+        # uyandırıldığı halde satırları yazılmadıysa liderlik bu isteğe geçmiştir
+        if not waiter.written:
+            _lead()
+    finally:
+        with _lock:
+            _writers -= 1
+
+    if waiter.error:
+        raise waiter.error
+
+
+# lider kuyruktaki satın almaları tek grup olarak yazar, ardından liderliği devreder
+def _lead():
+    global _leader_active
+    window = current_app.config.get("GROUP_COMMIT_WINDOW", 0)
+    with _lock:
+        busy = _writers > 1
+    if window and busy:
+        time.sleep(window)  # işlenmekte olan diğer isteklerin gruba katılabilmesi için
+
+    with _lock:
+        group = _pending[:]
+        _pending.clear()
+    _write_group(group)
+
+    with _lock:
+        if _pending:
+            _pending[0][1].wake.set()
+        else:
+            _leader_active = False
+
+
+def _write(rows):
+    db.session.execute(insert(PurchaseLog.__table__), rows)
+    # günlük özet tabloları ve ürün istatistikleri de aynı transaction içinde güncelleniyor
+    rollup.add_purchases(rows)
+
+
+def _write_group(group):
+    try:
+        for rows, _ in group:
+            _write(rows)
+        db.session.commit()
+        stats["groups"] += 1
+        stats["requests"] += len(group)
+        stats["rows"] += sum(len(rows) for rows, _ in group)
+        stats["max_group"] = max(stats["max_group"], len(group))
+    except Exception:
+        db.session.rollback()
+        # grup başarısız olduysa istekler tek tek denenir, sadece hatalı olan hata alır
+        for rows, waiter in group:
+            try:
+                _write(rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                traceback.print_exc()
+                waiter.error = e
+    finally:
+        # admin paneli önbelleği artık eski, bekleyen istekler devam edebilir
+        cache.bump()
+        # olasılıksal özetler arka plan thread'inde güncellenir
+        click_buffer.start()
+        for _, waiter in group:
+            waiter.written = True
+            waiter.wake.set()
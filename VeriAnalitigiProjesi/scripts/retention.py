@@ -0,0 +1,157 @@
+import datetime  # tarih verileri için
+
+from sqlalchemy import delete, func, select, text, union_all
+from sqlalchemy.dialects.sqlite import insert  # sqlite'a özel upsert için
+
+from scripts.data import db, AppMeta, ClickLog, PurchaseLog, DailyClickStat, DailyGuestClickStat, DailyProductStat
+
+# Ham Logların Sıkıştırılması (Retention)
+# RETENTION_DAYS günden eski tıklamalar gün x ürün x kullanıcı bazında DailyClickStat'a, giriş yapmamış ziyaretçilerin
+# tıklamaları gün x ürün bazında DailyGuestClickStat'a toplanır ve ham satırlar silinir.
+# eski satın almalar zaten günlük özet tablolarında (DailyProductStat / DailyUserStat / DailyColorStat) olduğu için
+# sadece ham satırları silinir. silme işlemi sınırlı boyutta parçalar halinde yapılır, her parça ayrı commit edilir,
+# böylece veritabanı uzun süre kilitli kalmaz. ardından boşalan sayfalar incremental vacuum ile dosyadan geri verilir.
+#
+# AppMeta'daki "compacted_before" günü sınırdır: bu günden önceki tıklamalar DailyClickStat'tan,
+# bu gün ve sonrası ham ClickLog'dan okunur. sınır, toplama ile aynı transaction içinde ilerletildiği için
+# silme parçaları arasında okuyan bir istek aynı tıklamayı iki kere saymaz
+
+WATERMARK_KEY = "compacted_before"
+
+
+# sıkıştırılmış son günün ertesi (YYYY-MM-DD), hiç sıkıştırma yapılmadıysa None
+def watermark():
+    meta = db.session.get(AppMeta, WATERMARK_KEY)
+    return meta.value if meta else None
+
+
+def _set_watermark(day):
+    stmt = insert(AppMeta).values(key=WATERMARK_KEY, value=day)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=["key"], set_={"value": day}))
+
+
+def _in_window(query, day_column, window):
+    if window is None:
+        return query
+    return query.where(day_column.between(*window))
+
+
+# ürün bazında tıklanma sayıları: (ürün, tıklanma) satırları veren select, product_id verilirse sadece o ürün
+# sınırdan önceki günler DailyClickStat ve DailyGuestClickStat'tan, sonrakiler ClickLog (gün, ürün) indexi üzerinden sayılır
+def click_counts(window=None, product_id=None):
+    w = watermark()
+    raw = _in_window(select(ClickLog.product_id, func.count().label("clicks")), ClickLog.day, window)
+    if product_id is not None:
+        raw = raw.where(ClickLog.product_id == product_id)
+    if w is None:
+        return raw.group_by(ClickLog.product_id)
+
+    raw = raw.where(ClickLog.day >= w).group_by(ClickLog.product_id)
+    parts = [raw]
+    for model in (DailyClickStat, DailyGuestClickStat):
+        compacted = _in_window(
+            select(model.product_id, func.sum(model.clicks).label("clicks")), model.day, window
+        ).where(model.day < w)
+        if product_id is not None:
+            compacted = compacted.where(model.product_id == product_id)
+        parts.append(compacted.group_by(model.product_id))
+    combined = union_all(*parts).subquery()
+    return select(combined.c.product_id, func.sum(combined.c.clicks).label("clicks")).group_by(
+        combined.c.product_id
+    )
+
+
+# ürün bazında satış adetleri: (ürün, adet) satırları veren select
+# sınırdan önceki günler DailyProductStat'tan, sonrakiler ham PurchaseLog'dan sayılır
+def purchase_counts():
+    w = watermark()
+    raw = select(PurchaseLog.product_id, func.count().label("qty"))
+    if w is None:
+        return raw.group_by(PurchaseLog.product_id)
+
+    raw = raw.where(PurchaseLog.day >= w).group_by(PurchaseLog.product_id)
+    compacted = (
+        select(DailyProductStat.product_id, func.sum(DailyProductStat.qty).label("qty"))
+        .where(DailyProductStat.day < w)
+        .group_by(DailyProductStat.product_id)
+    )
+    combined = union_all(raw, compacted).subquery()
+    return select(combined.c.product_id, func.sum(combined.c.qty).label("qty")).group_by(
+        combined.c.product_id
+    )
+
+
+# sınırdan önceki ham satırları "batch_size"lık parçalar halinde siler, silinen satır sayısını döner
+def _delete_before(model, day, batch_size):
+    total = 0
+    while True:
+        ids = select(model.id).where(model.day < day).limit(batch_size).scalar_subquery()
+        deleted = db.session.execute(delete(model).where(model.id.in_(ids))).rowcount
+        db.session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+# boşalan sayfaları dosyadan geri verir, auto_vacuum INCREMENTAL değilse (eski veritabanı) bir şey yapmaz
+# döner: geri verilen sayfa sayısı ya da None
+def _incremental_vacuum():
+    if db.session.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+        return None
+    free = db.session.execute(text("PRAGMA freelist_count")).scalar()
+    db.session.execute(text("PRAGMA incremental_vacuum"))
+    db.session.commit()
+    return free
+
+
+# [previous, cutoff) aralığındaki tıklamaları "columns" bazında sayıp modelin tablosuna ekler, eklenen satır sayısını döner
+def _aggregate_clicks(model, columns, condition, cutoff, previous):
+    query = select(*columns, func.count()).where(ClickLog.day < cutoff, ClickLog.product_id.isnot(None), condition)
+    if previous is not None:
+        query = query.where(ClickLog.day >= previous)
+    keys = [c.name for c in columns]
+    rows = [dict(zip(keys, row[:-1]), clicks=row[-1]) for row in db.session.execute(query.group_by(*columns))]
+    if rows:
+        stmt = insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={"clicks": model.clicks + stmt.excluded.clicks},
+        )
+        db.session.execute(stmt, rows)
+    return len(rows)
+
+
+# "days" günden eski ham logları sıkıştırır
+# {"before": sınır günü, "aggregated": toplanan tıklama satırı, "clicks": silinen tıklama,
+#  "purchases": silinen satın alma, "vacuum_pages": geri verilen sayfa} döner
+def compact(days, batch_size=10000):
+    cutoff = (datetime.datetime.utcnow().date() - datetime.timedelta(days=days)).isoformat()
+    previous = watermark()
+    aggregated = 0
+
+    # 1. önceki sınır ile yeni sınır arasındaki tıklamalar toplanır, sınır aynı transaction'da ilerletilir
+    # giriş yapmış kullanıcıların tıklamaları kullanıcı bazında, ziyaretçilerinkiler sadece ürün bazında tutulur
+    if previous is None or cutoff > previous:
+        user_rows = _aggregate_clicks(
+            DailyClickStat, [ClickLog.day, ClickLog.product_id, ClickLog.user_id], ClickLog.user_id.isnot(None), cutoff, previous
+        )
+        guest_rows = _aggregate_clicks(
+            DailyGuestClickStat, [ClickLog.day, ClickLog.product_id], ClickLog.user_id.is_(None), cutoff, previous
+        )
+        _set_watermark(cutoff)
+        db.session.commit()
+        aggregated = user_rows + guest_rows
+
+    # 2. sınırdan önceki ham satırlar parça parça silinir (önceki yarım kalan silmeler de tamamlanır)
+    before = watermark()
+    clicks = _delete_before(ClickLog, before, batch_size)
+    purchases = _delete_before(PurchaseLog, before, batch_size)
+
+    # 3. boşalan sayfalar
+    return {
+        "before": before,
+        "aggregated": aggregated,
+        "clicks": clicks,
+        "purchases": purchases,
+        "vacuum_pages": _incremental_vacuum(),
+    }
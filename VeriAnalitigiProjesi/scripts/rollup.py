@@ -0,0 +1,129 @@
+from collections import Counter  # sayaç
+import datetime  # tarih verileri için
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert  # sqlite'a özel "INSERT ... ON CONFLICT" (upsert) için
+
+from scripts.data import (
+    db,
+    PurchaseLog,
+    DailyProductStat,
+    DailyUserStat,
+    DailyColorStat,
+    ProductStat,
+    ProductColorStat,
+    Anomaly,
+    DailySketch,
+    AppMeta,
+)
+import scripts.product_stats as product_stats
+import scripts.retention as retention
+import scripts.anomalies as anomalies
+import scripts.sketches as sketches
+
+# ham loglardan türetilen tüm tablolar
+ROLLUP_TABLES = [DailyProductStat, DailyUserStat, DailyColorStat, ProductStat, ProductColorStat, Anomaly, DailySketch]
+
+
+# zaman damgasını rollup tablolarında kullanılan gün anahtarına çevirir
+def day_key(timestamp):
+    return timestamp.strftime("%Y-%m-%d")
+
+
+# satır varsa adedini arttırır, yoksa yeni satır ekler
+# tüm satırlar tek bir executemany ile gönderilir
+def _upsert(model, keys, counter):
+    if not counter:
+        return
+    stmt = insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys, set_={"qty": model.qty + stmt.excluded.qty}
+    )
+    rows = [dict(zip(keys, key), qty=qty) for key, qty in counter.items()]
+    db.session.execute(stmt, rows)
+
+
+# yeni satın alımları özet tablolara işler
+# purchases: PurchaseLog sütunlarını taşıyan dictionary listesi
+# commit yapmaz, satın alımı kaydeden fonksiyon ile aynı transaction içinde kalsın diye
+def add_purchases(purchases):
+    product_rows = Counter()
+    user_rows = Counter()
+    color_rows = Counter()
+    for p in purchases:
+        d = day_key(p.get("timestamp") or datetime.datetime.utcnow())
+        product_rows[(d, p["product_id"])] += 1
+        user_rows[(d, p["user_id"], p["product_id"])] += 1
+        color_rows[(d, p["product_id"], p["selected_color"])] += 1
+
+    _upsert(DailyProductStat, ["day", "product_id"], product_rows)
+    _upsert(DailyUserStat, ["day", "user_id", "product_id"], user_rows)
+    _upsert(DailyColorStat, ["day", "product_id", "color"], color_rows)
+
+    # ürün sayfası istatistikleri (Welford, günün en çok alanı, renk dağılımı)
+    product_colors = Counter()
+    for (d, product_id, color), qty in color_rows.items():
+        product_colors[(product_id, color)] += qty
+    product_stats.add_purchases(product_rows, user_rows.keys(), product_colors)
+
+    # satın alma anında whale tespiti
+    anomalies.check(product_rows)
+
+
+# özet tabloları silip ham PurchaseLog verilerinden tek seferde GROUP BY ile yeniden hesaplar
+# ürün istatistikleri de bu tablolardan türetilir
+# tablo yapısı değiştiğinde ya da veriler kaydığında kullanılır
+# ham satırları silinmiş (sıkıştırılmış) günlerin satırları korunur, sadece sonraki günler ham kayıtlardan hesaplanır
+def rebuild():
+    before = retention.watermark() if inspect(db.engine).has_table(AppMeta.__tablename__) else None
+    kept = _keep_compacted(before) if before else []
+
+    for model in ROLLUP_TABLES:
+        model.__table__.drop(db.engine, checkfirst=True)
+        model.__table__.create(db.engine)
+
+    for model, backup, columns in kept:
+        names = ", ".join(columns)
+        db.session.execute(
+            text(f"INSERT INTO {model.__tablename__} ({names}) SELECT {names} FROM {backup} WHERE day < :before"),
+            {"before": before},
+        )
+        db.session.execute(text(f"DROP TABLE {backup}"))
+
+    day = PurchaseLog.day
+    sources = [
+        (DailyProductStat, [day, PurchaseLog.product_id]),
+        (DailyUserStat, [day, PurchaseLog.user_id, PurchaseLog.product_id]),
+        (DailyColorStat, [day, PurchaseLog.product_id, PurchaseLog.selected_color]),
+    ]
+    for model, cols in sources:
+        names = [c.name for c in model.__table__.primary_key.columns] + ["qty"]
+        query = select(*cols, func.count(PurchaseLog.id)).group_by(*cols)
+        if before:
+            query = query.where(day >= before)
+        db.session.execute(insert(model).from_select(names, query))
+    product_stats.rebuild()
+    anomalies.rebuild()
+    sketches.rebuild()
+    db.session.commit()
+
+
+# sıkıştırılmış günlerin günlük özet satırları, tablolar silinmeden önce yedek tablolara taşınır
+# [(model, yedek tablo, ortak sütunlar)] döner, yapısı değişen tabloda sadece iki tarafta da olan sütunlar taşınır
+def _keep_compacted(before):
+    inspector = inspect(db.engine)
+    kept = []
+    for model in (DailyProductStat, DailyUserStat, DailyColorStat):
+        table = model.__tablename__
+        if not inspector.has_table(table):
+            continue
+        backup = f"{table}_compacted"
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        columns = [c.name for c in model.__table__.columns if c.name in existing]
+        db.session.execute(text(f"DROP TABLE IF EXISTS {backup}"))
+        # index isimleri tablo ile birlikte değişmediği için yeni tablo oluşturulmadan önce silinir
+        for index in inspector.get_indexes(table):
+            db.session.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+        db.session.execute(text(f"ALTER TABLE {table} RENAME TO {backup}"))
+        kept.append((model, backup, columns))
+    db.session.commit()
+    return kept
@@ -0,0 +1,109 @@
+from sqlalchemy import event, inspect, text
+
+from scripts.data import db, ClickLog, PurchaseLog
+import scripts.rollup as rollup
+import scripts.search as search
+
+# Veritabanı Ayarları ve Şema Güncelleme
+
+# her yeni sqlite bağlantısında çalıştırılan ayarlar
+# WAL: okuyucular yazma işlemini beklemez, synchronous NORMAL: her commit'te fsync yapılmaz (WAL ile güvenli)
+# cache_size negatif ise KB cinsinden sayfa önbelleği
+# auto_vacuum INCREMENTAL: silinen satırların sayfaları retention.compact sonunda dosyadan geri verilebilir
+# (sadece yeni veritabanlarında etkili, eski veritabanı upgrade() içinde bir kere VACUUM ile çevrilir)
+DEFAULT_PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+# analiz kopyası (snapshot) bağlantıları: sadece okuma yapılır, dosya WAL moduna çevrilmez
+SNAPSHOT_PRAGMAS = {
+    "query_only": "ON",
+    "cache_size": -20000,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+def init_app(app):
+    pragmas = dict(DEFAULT_PRAGMAS, **app.config.get("SQLITE_PRAGMAS", {}))
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name != "sqlite":
+                continue
+            _listen(engine, SNAPSHOT_PRAGMAS if bind_key == "analytics" else pragmas)
+
+
+def _listen(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        for key, value in pragmas.items():
+            cursor.execute(f"PRAGMA {key}={value}")
+        cursor.close()
+
+
+# türetilmiş özet tablolardan eksik olan ya da sütunları güncel modelle uyuşmayan var mı
+def _rollups_stale():
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    for model in rollup.ROLLUP_TABLES:
+        if model.__tablename__ not in tables:
+            return True
+        db_columns = {c["name"] for c in inspector.get_columns(model.__tablename__)}
+        if {c.name for c in model.__table__.columns} - db_columns:
+            return True
+    return False
+
+
+# eski bir proje.db dosyasını güncel şemaya taşır, veriler korunur
+# 1. eksik tabloları oluşturur
+# 2. log tablolarına "day" sütununu ekler ve zaman damgasından doldurur
+# 3. eksik indexleri oluşturur
+# 4. auto_vacuum ayarını INCREMENTAL yapar (retention sonrası boşalan sayfalar için)
+# 5. türetilmiş özet tabloların yapısı eskiyse onları ham loglardan yeniden hesaplar
+# 6. ürün arama indexi yoksa ya da eksikse yeniden oluşturur
+def upgrade():
+    rebuild_rollups = _rollups_stale()
+    db.create_all(bind_key=None)  # analiz kopyası proje.db'den alınır, onda tablo oluşturulmaz
+
+    for model in (ClickLog, PurchaseLog):
+        table = model.__tablename__
+        columns = {c["name"] for c in inspect(db.engine).get_columns(table)}
+        if "day" not in columns:
+            print(f"{table}: day sütunu ekleniyor...")
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN day VARCHAR(10)"))
+        db.session.execute(
+            text(f"UPDATE {table} SET day = strftime('%Y-%m-%d', timestamp) WHERE day IS NULL")
+        )
+        db.session.commit()
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+    # auto_vacuum ayarı mevcut bir veritabanında ancak VACUUM ile değişir
+    if db.session.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+        print("auto_vacuum INCREMENTAL yapılıyor (VACUUM)...")
+        db.session.commit()
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+    if rebuild_rollups:
+        print("Özet tablolar yeniden hesaplanıyor...")
+        rollup.rebuild()
+
+    search.ensure()
+
+    # sorgu planlayıcısı yeni indexlerin istatistiklerini kullanabilsin
+    analyze()
+
+
+def analyze():
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
@@ -0,0 +1,140 @@
+import re  # arama metnini kelimelere ayırmak için
+
+from sqlalchemy import Integer, cast, column, event, func, literal_column, table, text
+from sqlalchemy.exc import OperationalError
+
+from scripts.data import db, Product
+
+# Ürün Arama (SQLite FTS5)
+# ürün adı ve kategorisi "product_fts" tam metin indexinde tutulur (rowid = ürün id),
+# arama her istekte tüm katalogu ILIKE ile taramak yerine index üzerinden yapılır.
+# sqlite FTS5 olmadan derlenmişse ya da index henüz oluşturulmadıysa data_man ILIKE aramasına döner
+
+FTS_TABLE = "product_fts"
+
+# unicode61: büyük / küçük harf ve aksanları (ş, ç, ğ, ö, ü) kendisi sadeleştirir,
+# Türkçe'ye özel İ / I / ı harfleri fold() ile önceden "i" yapılır
+_CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(name, category, tokenize='unicode61 remove_diacritics 2')"
+)
+
+# isim eşleşmesi kategori eşleşmesinden daha değerli
+NAME_WEIGHT = 4.0
+CATEGORY_WEIGHT = 1.0
+
+# alaka skoru sayfa imlecinde tamsayı olarak taşınır: bm25 * RANK_SCALE yuvarlanır.
+# ondalıklı skor her sayfada yeniden hesaplanınca son basamakları değişebilir, imleçle eşitlik karşılaştırması
+# (aynı skordaki ürünler tıklanma ve id ile sıralanır) tamsayıda kesin sonuç verir
+RANK_SCALE = 10000
+
+_fts = table(FTS_TABLE, column("rowid"), column("name"), column("category"))
+
+_TR_FOLD = str.maketrans({"İ": "i", "I": "i", "ı": "i"})
+
+_ready = None  # index var mı, ilk kontrolde doldurulur
+
+
+# Türkçe harf katlama: "IŞIK", "ışık" ve "isik" aynı kelimeye iner
+def fold(value):
+    return (value or "").translate(_TR_FOLD).lower()
+
+
+# arama kutusundaki metinden FTS5 sorgusu: her kelime önek olarak aranır, kelimeler VE ile bağlanır
+# "kır şap" -> "kir"* "sap"*, kelime yoksa None
+def build_query(q):
+    words = re.findall(r"\w+", fold(q))
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+# index tablosu veritabanında var mı
+def ready(connection=None):
+    global _ready
+    if _ready is None:
+        conn = connection if connection is not None else db.session
+        _ready = (
+            conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTS_TABLE},
+            ).first()
+            is not None
+        )
+    return _ready
+
+
+# indexi tüm ürünlerden yeniden oluşturur, FTS5 yoksa False döner
+def rebuild():
+    global _ready
+    try:
+        db.session.execute(text(_CREATE_SQL))
+    except OperationalError:
+        db.session.rollback()
+        _ready = False
+        print("Uyarı: sqlite FTS5 desteği yok, arama ILIKE ile yapılacak.")
+        return False
+
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    stmt = text(f"INSERT INTO {FTS_TABLE} (rowid, name, category) VALUES (:id, :name, :category)")
+    batch = []
+    for product_id, name, category in db.session.query(Product.id, Product.name, Product.category).yield_per(5000):
+        batch.append({"id": product_id, "name": fold(name), "category": fold(category)})
+        if len(batch) >= 5000:
+            db.session.execute(stmt, batch)
+            batch = []
+    if batch:
+        db.session.execute(stmt, batch)
+    db.session.commit()
+    _ready = True
+    return True
+
+
+# index ürün tablosuyla uyuşmuyorsa yeniden oluşturur, upgrade-db içinden çağrılır
+def ensure():
+    global _ready
+    _ready = None
+    if ready():
+        indexed = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+        if indexed == db.session.query(func.count(Product.id)).scalar():
+            return True
+    return rebuild()
+
+
+# ürün sorgusunu arama metnine göre filtreler ve (sıralamada kullanılmak üzere) tamsayı alaka skorunu döner
+# FTS kullanılamıyorsa (None, None) döner
+def apply(query, q):
+    match = build_query(q)
+    if match is None or not ready():
+        return None, None
+    fts = literal_column(FTS_TABLE)
+    query = query.join(_fts, _fts.c.rowid == Product.id).filter(fts.op("MATCH")(match))
+    # bm25 küçük olan daha alakalı
+    rank = cast(func.round(func.bm25(fts, NAME_WEIGHT, CATEGORY_WEIGHT) * RANK_SCALE), Integer)
+    return query, rank
+
+
+# Ürün değişikliklerinin indexe yansıtılması
+def _upsert_row(connection, target):
+    connection.execute(
+        text(f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, category) VALUES (:id, :name, :category)"),
+        {"id": target.id, "name": fold(target.name), "category": fold(target.category)},
+    )
+
+
+@event.listens_for(Product, "after_insert")
+def _after_insert(mapper, connection, target):
+    if ready(connection):
+        _upsert_row(connection, target)
+
+
+@event.listens_for(Product, "after_update")
+def _after_update(mapper, connection, target):
+    if ready(connection):
+        _upsert_row(connection, target)
+
+
+@event.listens_for(Product, "after_delete")
+def _after_delete(mapper, connection, target):
+    if ready(connection):
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": target.id})
@@ -0,0 +1,525 @@
+import array
+import datetime
+import hashlib
+import json
+import math
+import struct
+from collections import Counter  # sayaç
+
+from flask import current_app
+from sqlalchemy import func, select, tuple_, union, update
+from sqlalchemy.dialects.sqlite import insert  # sqlite'a özel upsert için
+
+from scripts.data import db, AppMeta, Product, ClickLog, PurchaseLog, DailyClickStat, DailyUserStat, DailySketch
+import scripts.retention as retention
+
+# Olasılıksal Özetler (Sketch)
+# gün bazında, kullanıcı ve gün sayısından bağımsız, sabit boyutlu özetler tutulur:
+#   top-buyers   : Space-Saving, günün en çok alan SKETCH_TOP_K kullanıcısı (adet fazladan en fazla gün toplamı / K sayılır)
+#   top-products : Space-Saving, günün en çok satan SKETCH_TOP_K ürünü
+#   buyer-qty    : Count-Min, herhangi bir kullanıcının o günkü alım adedi
+#                  (tahmin en fazla SKETCH_EPSILON * gün toplamı kadar fazla, 1 - SKETCH_DELTA olasılıkla)
+#   buyers:<ürün>, clickers:<ürün> : HyperLogLog, ürünü o gün alan / tıklayan tekil kullanıcı sayısı
+#                  (göreli standart hata yaklaşık SKETCH_HLL_ERROR, günler birleştirilerek aralık için de sayılır)
+# özetler yeni ham kayıtlardan arka planda toplu olarak güncellenir (bkz. catch_up), rollup.rebuild içinde
+# günlük özet tablolarından yeniden kurulur. ANALYTICS_ENGINE "approx" ise panelin outlier analizi
+# günün whale'ini ve en çok satan ürününü kullanıcı x gün tablosunu gruplamak yerine bu özetlerden okur,
+# ürün sayfasındaki yönetici analizleri de tarih aralığındaki tekil alıcı / tıklayan sayısını gösterir.
+# özet parametreleri her kaydın içinde saklanır, ayar değişirse eski günler eski parametrelerle okunmaya devam eder
+
+TOP_BUYERS = "top-buyers"
+TOP_PRODUCTS = "top-products"
+BUYER_QTY = "buyer-qty"
+
+_MASK64 = (1 << 64) - 1
+
+
+# özetlerin kullandığı hash, python'un hash()'inden farklı olarak process'ler arasında aynıdır
+def _hash128(item):
+    digest = hashlib.blake2b(repr(item).encode(), digest_size=16).digest()
+    return struct.unpack("<QQ", digest)
+
+
+# Count-Min
+# depth satırlık, width sütunluk sayaç tablosu, her satırda farklı bir hash ile bir sayaç arttırılır,
+# tahmin satırlardaki en küçük sayaçtır (hiç eksik saymaz, çakışmalar yüzünden fazla sayabilir)
+class CountMin:
+    def __init__(self, width, depth, total=0, table=None):
+        self.width = width
+        self.depth = depth
+        self.total = total
+        self.table = table if table is not None else array.array("I", bytes(4 * width * depth))
+
+    # hata: tahmin <= gerçek + epsilon * toplam, 1 - delta olasılıkla
+    @classmethod
+    def for_error(cls, epsilon, delta):
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def _cells(self, item):
+        h1, h2 = _hash128(item)
+        return [i * self.width + (h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, item, n=1):
+        for cell in self._cells(item):
+            self.table[cell] += n
+        self.total += n
+
+    def estimate(self, item):
+        return min(self.table[cell] for cell in self._cells(item))
+
+    def to_bytes(self):
+        return struct.pack("<IIQ", self.width, self.depth, self.total) + self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        width, depth, total = struct.unpack_from("<IIQ", data)
+        table = array.array("I")
+        table.frombytes(data[16:])
+        return cls(width, depth, total, table)
+
+
+# Space-Saving
+# en fazla k eleman için sayaç tutulur, yeni eleman geldiğinde tablo doluysa en küçük sayaçlı eleman çıkarılır
+# ve yenisi onun sayacından devam eder. sayaçlar en fazla (toplam / k) kadar fazla sayar,
+# gerçek adedi toplam / k'dan büyük olan her eleman tabloda bulunur
+class SpaceSaving:
+    def __init__(self, k, counts=None):
+        self.k = k
+        self.counts = counts if counts is not None else {}  # eleman -> [sayaç, en fazla hata]
+
+    def add(self, item, n=1):
+        entry = self.counts.get(item)
+        if entry is not None:
+            entry[0] += n
+        elif len(self.counts) < self.k:
+            self.counts[item] = [n, 0]
+        else:
+            victim = min(self.counts, key=lambda i: (self.counts[i][0], -i))
+            floor = self.counts.pop(victim)[0]
+            self.counts[item] = [floor + n, floor]
+
+    # en büyük n eleman: [(eleman, sayaç, en fazla hata)], eşit sayaçlarda küçük id önce
+    def top(self, n=1):
+        ranked = sorted(self.counts.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        return [(item, count, error) for item, (count, error) in ranked[:n]]
+
+    def to_bytes(self):
+        items = [[item, count, error] for item, (count, error) in self.counts.items()]
+        return json.dumps({"k": self.k, "items": items}, separators=(",", ":")).encode()
+
+    @classmethod
+    def from_bytes(cls, data):
+        raw = json.loads(data)
+        return cls(raw["k"], {item: [count, error] for item, count, error in raw["items"]})
+
+
+# HyperLogLog
+# hash'in ilk p biti bir kayıt (register) seçer, kalan bitlerdeki baştaki sıfır sayısının en büyüğü o kayıtta tutulur.
+# tekil eleman sayısı kayıtların harmonik ortalamasından tahmin edilir, göreli standart hata 1.04 / sqrt(2^p)
+class HyperLogLog:
+    def __init__(self, p, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    @classmethod
+    def for_error(cls, error):
+        p = math.ceil(math.log2((1.04 / error) ** 2))
+        return cls(min(max(p, 4), 16))
+
+    def add(self, item):
+        h = _hash128(item)[0]
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & _MASK64
+        rank = min(64 - rest.bit_length(), 64 - self.p) + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        for i, r in enumerate(other.registers):
+            if r > self.registers[i]:
+                self.registers[i] = r
+
+    # göreli standart hata
+    def error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def count(self):
+        m = self.m
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # küçük sayılarda doğrusal sayım daha isabetli
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self):
+        return bytes([self.p]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data[0], bytearray(data[1:]))
+
+
+# Kayıt ve Okuma
+
+
+def _new(name):
+    config = current_app.config
+    if name == BUYER_QTY:
+        return CountMin.for_error(config["SKETCH_EPSILON"], config["SKETCH_DELTA"])
+    if name in (TOP_BUYERS, TOP_PRODUCTS):
+        return SpaceSaving(config["SKETCH_TOP_K"])
+    return HyperLogLog.for_error(config["SKETCH_HLL_ERROR"])
+
+
+def _decode(name, data):
+    if name == BUYER_QTY:
+        return CountMin.from_bytes(data)
+    if name in (TOP_BUYERS, TOP_PRODUCTS):
+        return SpaceSaving.from_bytes(data)
+    return HyperLogLog.from_bytes(data)
+
+
+# {(gün, ad): özet}, kaydı olmayanlar None
+def _load(keys):
+    found = dict.fromkeys(keys)
+    keys = list(keys)
+    for i in range(0, len(keys), 500):
+        rows = db.session.execute(
+            select(DailySketch.day, DailySketch.name, DailySketch.data).where(
+                tuple_(DailySketch.day, DailySketch.name).in_(keys[i : i + 500])
+            )
+        )
+        for day, name, data in rows:
+            found[(day, name)] = _decode(name, data)
+    return found
+
+
+# verilen anahtarların özetleri, kaydı olmayanlar için boş özet
+def _open(keys):
+    return {key: sketch if sketch is not None else _new(key[1]) for key, sketch in _load(keys).items()}
+
+
+def _save(sketches):
+    if not sketches:
+        return
+    stmt = insert(DailySketch)
+    stmt = stmt.on_conflict_do_update(index_elements=["day", "name"], set_={"data": stmt.excluded.data})
+    rows = [{"day": d, "name": name, "data": s.to_bytes()} for (d, name), s in sketches.items()]
+    db.session.execute(stmt, rows)
+
+
+# Ham Loglardan Güncelleme
+# özetler satın alma / tıklama isteklerinin transaction'ında güncellenmez (günün özetleri tüm istekler için ortak
+# birer satır olduğu için her satın almada okunup yeniden yazılmaları ödeme yolunda bir darboğaz olur).
+# bunun yerine AppMeta'da özetlere işlenmiş son PurchaseLog / ClickLog id'si tutulur, catch_up bu id'den sonraki
+# ham kayıtları toplu olarak özetlere işler ve id'yi aynı transaction içinde ilerletir.
+# catch_up tıklama tamponunun arka plan thread'inde her yazmadan sonra çalışır, özetler en fazla
+# CLICK_FLUSH_INTERVAL kadar geriden gelir. id, sadece okunduğu değerdeyse ilerletilir,
+# aynı anda çalışan iki catch_up (ör. sunucu ve cli) aynı kayıtları iki kere işleyemez
+
+PURCHASES_KEY = "sketch_purchase_id"
+CLICKS_KEY = "sketch_click_id"
+CATCH_UP_BATCH = 50000  # tek transaction'da işlenen en fazla ham kayıt
+
+
+def _position(key):
+    meta = db.session.get(AppMeta, key)
+    return int(meta.value) if meta else 0
+
+
+def _set_position(key, value):
+    stmt = insert(AppMeta).values(key=key, value=str(value))
+    db.session.execute(stmt.on_conflict_do_update(index_elements=["key"], set_={"value": str(value)}))
+
+
+# id'yi old'dan new'e ilerletir, bu arada başkası ilerlettiyse False
+def _advance(key, old, new):
+    if old == 0 and db.session.get(AppMeta, key) is None:
+        _set_position(key, new)
+        return True
+    result = db.session.execute(
+        update(AppMeta).where(AppMeta.key == key, AppMeta.value == str(old)).values(value=str(new))
+    )
+    return result.rowcount == 1
+
+
+# id'si key'deki değerden büyük en fazla batch_size ham kaydı add ile işler, işlenen kayıt sayısını döner
+def _catch_up_log(model, key, add, batch_size):
+    last = _position(key)
+    rows = db.session.execute(
+        select(model.id, model.day, model.user_id, model.product_id)
+        .where(model.id > last)
+        .order_by(model.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+    add([(d, user_id, product_id) for _, d, user_id, product_id in rows])
+    if not _advance(key, last, rows[-1].id):
+        db.session.rollback()
+        return 0
+    db.session.commit()
+    return len(rows)
+
+
+# yeni satın alma ve tıklamaları özetlere işler, işlenen ham kayıt sayısını döner
+def catch_up(batch_size=CATCH_UP_BATCH):
+    total = 0
+    for model, key, add in ((PurchaseLog, PURCHASES_KEY, _add_purchases), (ClickLog, CLICKS_KEY, _add_clicks)):
+        while True:
+            n = _catch_up_log(model, key, add, batch_size)
+            total += n
+            if n < batch_size:
+                break
+    return total
+
+
+# rows: [(gün, kullanıcı, ürün)], her satır bir adet
+def _add_purchases(rows):
+    user_rows = Counter(rows)
+    keys = set()
+    for d, _, product_id in user_rows:
+        keys.update([(d, TOP_BUYERS), (d, TOP_PRODUCTS), (d, BUYER_QTY), (d, f"buyers:{product_id}")])
+    sketches = _open(keys)
+    _add_purchase_rows(sketches, user_rows.items())
+    _save(sketches)
+
+
+def _add_purchase_rows(sketches, rows):
+    for (d, user_id, product_id), qty in rows:
+        sketches[(d, TOP_BUYERS)].add(user_id, qty)
+        sketches[(d, TOP_PRODUCTS)].add(product_id, qty)
+        sketches[(d, BUYER_QTY)].add(user_id, qty)
+        sketches[(d, f"buyers:{product_id}")].add(user_id)
+
+
+# rows: [(gün, kullanıcı, ürün)], giriş yapmamış ziyaretçilerin tıklamaları sayılmaz
+def _add_clicks(rows):
+    rows = {(d, user_id, product_id) for d, user_id, product_id in rows if user_id is not None and product_id is not None}
+    sketches = _open({(d, f"clickers:{product_id}") for d, _, product_id in rows})
+    _add_click_rows(sketches, rows)
+    _save(sketches)
+
+
+def _add_click_rows(sketches, rows):
+    for d, user_id, product_id in rows:
+        sketches[(d, f"clickers:{product_id}")].add(user_id)
+
+
+# özetleri günlük özet tablolarından yeniden kurar, rollup.rebuild içinden çağrılır (tablo boş olmalı)
+# satın almalar DailyUserStat'tan, tıklamalar sıkıştırılmamış günler için ClickLog'dan, sıkıştırılmışlar için
+# DailyClickStat'tan okunur. satırlar gün sırasına göre işlenir, aynı anda tek günün özetleri tutulur.
+# özet tabloları ile aynı transaction'da çalıştığı için o ana kadarki tüm ham kayıtlar işlenmiş sayılır
+def rebuild():
+    _set_position(PURCHASES_KEY, db.session.scalar(select(func.max(PurchaseLog.id))) or 0)
+    _set_position(CLICKS_KEY, db.session.scalar(select(func.max(ClickLog.id))) or 0)
+
+    purchases = select(
+        DailyUserStat.day, DailyUserStat.user_id, DailyUserStat.product_id, DailyUserStat.qty
+    ).order_by(DailyUserStat.day)
+    _rebuild_days(purchases, lambda sketches, rows: _add_purchase_rows(
+        sketches, (((d, u, p), q) for d, u, p, q in rows)
+    ))
+
+    w = retention.watermark()
+    clicks = select(ClickLog.day, ClickLog.user_id, ClickLog.product_id).where(
+        ClickLog.user_id.isnot(None), ClickLog.product_id.isnot(None)
+    )
+    if w is not None:
+        clicks = union(
+            clicks.where(ClickLog.day >= w),
+            select(DailyClickStat.day, DailyClickStat.user_id, DailyClickStat.product_id).where(
+                DailyClickStat.day < w
+            ),
+        )
+    else:
+        clicks = clicks.distinct()
+    _rebuild_days(select(clicks.subquery()).order_by("day"), _add_click_rows)
+
+
+# yeniden kurulurken kullanılan, istenen özeti yoksa boş olarak oluşturan sözlük
+class _Fresh(dict):
+    def __missing__(self, key):
+        self[key] = sketch = _new(key[1])
+        return sketch
+
+
+# gün sırasına göre gelen satırları gün gün özetleyip yazar
+def _rebuild_days(query, add):
+    day, rows = None, []
+    for row in db.session.execute(query.execution_options(yield_per=10000)):
+        if row[0] != day:
+            _write_day(rows, add)
+            day, rows = row[0], []
+        rows.append(tuple(row))
+    _write_day(rows, add)
+
+
+def _write_day(rows, add):
+    if not rows:
+        return
+    sketches = _Fresh()
+    add(sketches, rows)
+    db.session.execute(
+        insert(DailySketch),
+        [{"day": d, "name": name, "data": s.to_bytes()} for (d, name), s in sketches.items()],
+    )
+
+
+# Panel İçin Okuma
+
+
+# verilen günlerde en çok alım yapan kullanıcı: {gün: (user_id, tahmini adet)}, aggregates.top_buyers ile aynı biçim
+# adet Space-Saving ve Count-Min tahminlerinin küçüğüdür (ikisi de sadece fazla sayabilir)
+def top_buyers(days):
+    sketches = _load([(d, TOP_BUYERS) for d in days] + [(d, BUYER_QTY) for d in days])
+    result = {}
+    for d in days:
+        heavy = sketches[(d, TOP_BUYERS)]
+        if heavy is None or not heavy.counts:
+            continue
+        user_id, count, _ = heavy.top(1)[0]
+        qty_sketch = sketches[(d, BUYER_QTY)]
+        result[d] = (user_id, min(count, qty_sketch.estimate(user_id)) if qty_sketch else count)
+    return result
+
+
+# verilen günlerde en çok satan ürün: {gün: (product_id, ad, kategori)}, aggregates.top_products ile aynı biçim
+def top_products(days):
+    sketches = _load([(d, TOP_PRODUCTS) for d in days])
+    top = {}
+    for (d, _), heavy in sketches.items():
+        if heavy is not None and heavy.counts:
+            top[d] = heavy.top(1)[0][0]
+    products = {
+        p.id: p for p in db.session.execute(select(Product.id, Product.name, Product.category).where(
+            Product.id.in_(set(top.values()))
+        ))
+    }
+    return {
+        d: (product_id, products[product_id].name, products[product_id].category)
+        for d, product_id in top.items()
+        if product_id in products
+    }
+
+
+# ürünün günlerdeki tekil alıcı ("buyers") ya da tıklayan ("clickers") sayısı tahmini
+# günlerin HyperLogLog'ları birleştirildiği için aynı kullanıcı birden fazla günde sayılmaz
+def distinct(kind, product_id, days):
+    merged = None
+    for sketch in _load([(d, f"{kind}:{product_id}") for d in days]).values():
+        if sketch is None:
+            continue
+        if merged is None:
+            merged = HyperLogLog(sketch.p)
+        if sketch.p == merged.p:
+            merged.merge(sketch)
+    return merged.count() if merged else 0
+
+
+# ürünün tarih aralığındaki tekil alıcı ve tıklayan sayısı tahmini: {"buyers": n, "clickers": n}
+# window: (başlangıç günü, bitiş günü) ya da None (tüm geçmiş), özeti olan ilk ve son gün ile sınırlanır
+def distinct_users(product_id, window=None):
+    first, last = db.session.execute(select(func.min(DailySketch.day), func.max(DailySketch.day))).one()
+    if first is None:
+        return {"buyers": 0, "clickers": 0}
+    if window is not None:
+        first, last = max(first, window[0]), min(last, window[1])
+    start, end = datetime.date.fromisoformat(first), datetime.date.fromisoformat(last)
+    days = [(start + datetime.timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    return {kind: distinct(kind, product_id, days) for kind in ("buyers", "clickers")}
+
+
+# Doğruluk Kontrolü
+# özetlerin tahminlerini günlük özet tablolarındaki kesin değerlerle karşılaştırır, "flask sketch-check" için
+# window: (başlangıç günü, bitiş günü) ya da None
+def check(window=None):
+    query = select(DailyUserStat.day, DailyUserStat.user_id, DailyUserStat.product_id, DailyUserStat.qty)
+    if window is not None:
+        query = query.where(DailyUserStat.day.between(*window))
+    user_qty, buyers, product_qty, day_totals = {}, {}, {}, {}
+    for d, u, p, q in db.session.execute(query):
+        user_qty[(d, u)] = user_qty.get((d, u), 0) + q
+        product_qty[(d, p)] = product_qty.get((d, p), 0) + q
+        buyers.setdefault((d, p), set()).add(u)
+        day_totals[d] = day_totals.get(d, 0) + q
+    days = sorted(day_totals)
+
+    clicks = select(ClickLog.day, ClickLog.product_id, ClickLog.user_id).where(
+        ClickLog.user_id.isnot(None), ClickLog.product_id.isnot(None)
+    )
+    w = retention.watermark()
+    if w is not None:
+        clicks = union(
+            clicks.where(ClickLog.day >= w),
+            select(DailyClickStat.day, DailyClickStat.product_id, DailyClickStat.user_id).where(DailyClickStat.day < w),
+        )
+    clicks = select(clicks.subquery())
+    if window is not None:
+        clicks = clicks.where(clicks.selected_columns.day.between(*window))
+    clickers = {}
+    for d, p, u in db.session.execute(clicks):
+        clickers.setdefault((d, p), set()).add(u)
+
+    config = current_app.config
+    report = {"days": len(days)}
+
+    # günün whale'i ve en çok satan ürünü
+    # Space-Saving sadece adedi gün toplamının 1 / SKETCH_TOP_K'sından büyük olanları kesin yakalar,
+    # belirgin bir whale olmayan günlerde eşit adetli kullanıcılar arasından farklı biri seçilebilir
+    approx = {"buyer": top_buyers(days), "product": top_products(days)}
+    exact = {"buyer": {}, "product": {}}
+    for kind, counts in (("buyer", user_qty), ("product", product_qty)):
+        top = exact[kind]
+        for (d, item), q in counts.items():
+            if d not in top or (-q, item) < (-top[d][1], top[d][0]):
+                top[d] = (item, q)
+        heavy = [d for d in days if top[d][1] > day_totals[d] / config["SKETCH_TOP_K"]]
+        report[f"top_{kind}_heavy_days"] = len(heavy)
+        report[f"top_{kind}_match"] = sum(1 for d in heavy if approx[kind].get(d, (None,))[0] == top[d][0])
+    report["top_buyer_qty_error"] = max(
+        [approx["buyer"][d][1] - q for d, (u, q) in exact["buyer"].items() if approx["buyer"].get(d, (None,))[0] == u],
+        default=0,
+    )
+
+    # Count-Min: kullanıcı x gün adetleri
+    cms = _load([(d, BUYER_QTY) for d in days])
+    over_bound = 0
+    max_error = 0.0
+    for (d, u), q in user_qty.items():
+        sketch = cms[(d, BUYER_QTY)]
+        if sketch is None:
+            over_bound += 1
+            continue
+        error = sketch.estimate(u) - q
+        bound = config["SKETCH_EPSILON"] * day_totals[d]
+        max_error = max(max_error, error / day_totals[d])
+        if error < 0 or error > bound:
+            over_bound += 1
+    report["qty_checked"] = len(user_qty)
+    report["qty_over_bound"] = over_bound
+    report["qty_max_error_ratio"] = round(max_error, 5)
+
+    # HyperLogLog: ürün x gün tekil alıcı / tıklayan, ayrıca ürün başına tüm aralık (günler birleştirilerek)
+    report["hll_expected_error"] = round(HyperLogLog.for_error(config["SKETCH_HLL_ERROR"]).error(), 4)
+    for kind, users in (("buyers", buyers), ("clickers", clickers)):
+        sketches = _load([(d, f"{kind}:{p}") for d, p in users])
+        errors = []
+        for (d, p), ids in users.items():
+            sketch = sketches[(d, f"{kind}:{p}")]
+            estimate = sketch.count() if sketch else 0
+            errors.append(abs(estimate - len(ids)) / len(ids))
+        report[f"{kind}_checked"] = len(errors)
+        report[f"{kind}_mean_error"] = round(sum(errors) / len(errors), 4) if errors else 0.0
+        report[f"{kind}_max_error"] = round(max(errors), 4) if errors else 0.0
+
+        per_product = {}
+        for (d, p), ids in users.items():
+            per_product.setdefault(p, set()).update(ids)
+        window_errors = [abs(distinct(kind, p, days) - len(ids)) / len(ids) for p, ids in per_product.items()]
+        report[f"{kind}_window_error"] = round(max(window_errors), 4) if window_errors else 0.0
+    return report
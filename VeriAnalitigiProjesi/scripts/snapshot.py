@@ -0,0 +1,152 @@
+import contextlib
+import os
+import sqlite3
+import threading  # arka planda yenileme ve kilit için
+import time
+import traceback
+
+from flask import current_app
+
+from scripts.data import db, analytics_reads
+import scripts.user_dim as user_dim
+
+# Analiz Kopyası (Snapshot)
+# ANALYTICS_SNAPSHOT açıksa yönetici paneli sorguları satın alma ve tıklamaların yazıldığı proje.db yerine
+# onun salt okunur bir kopyasına ("analytics" bind'i) gider, böylece ağır panel sorguları satın alma yolu ile yarışmaz.
+# kopya sqlite online backup API ile geçici bir dosyaya alınır ve hazır olunca eskisinin yerine taşınır.
+# kopyalama tek adımda yapılır: WAL modunda bu sadece bir okuma işlemidir, yazanları bekletmez
+# (parça parça kopyalamada kaynak her değiştiğinde kopyalama baştan başlar, yoğun trafikte hiç bitmeyebilir).
+# kopya ANALYTICS_SNAPSHOT_INTERVAL saniyeden eskiyse panel mevcut kopyayı kullanmaya devam eder
+# ve arka planda tek bir thread yenisini alır. "flask refresh-snapshot" ile cron'dan da yenilenebilir.
+# kopyanın versiyonu dosyanın değiştirilme zamanıdır, panel önbelleği yeni satışlarla değil yeni kopya ile geçersiz olur
+
+_lock = threading.Lock()  # aynı anda tek kopyalama
+_state_lock = threading.Lock()
+_refreshing = False
+_seen = None  # bağlantıların açık olduğu kopyanın versiyonu
+
+
+def enabled():
+    return current_app.config.get("ANALYTICS_SNAPSHOT", False)
+
+
+def _path():
+    return db.engines["analytics"].url.database
+
+
+def _mtime():
+    try:
+        return os.stat(_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+# kopyanın kaç saniye önce alındığı, kopya yoksa None
+def age():
+    mtime = _mtime()
+    if mtime is None:
+        return None
+    return max(time.time() - mtime / 1e9, 0.0)
+
+
+def _copy():
+    target = _path()
+    tmp = target + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    source = sqlite3.connect(db.engine.url.database)
+    dest = sqlite3.connect(tmp)
+    try:
+        source.backup(dest)
+        # kopya WAL modunda kalırsa yerine taşınırken eski dosyanın -wal / -shm dosyaları ile karışabilir
+        dest.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dest.close()
+        source.close()
+    os.replace(tmp, target)
+
+
+# proje.db'yi kopyalar, kopyalama süresini (saniye) döner
+def refresh():
+    with _lock:
+        start = time.perf_counter()
+        _copy()
+        return time.perf_counter() - start
+
+
+def _refresh_in_background(app):
+    global _refreshing
+    try:
+        with app.app_context():
+            refresh()
+    except Exception:
+        traceback.print_exc()
+    finally:
+        with _state_lock:
+            _refreshing = False
+
+
+# kopya dosyası veritabanının tüm tablolarını içeriyor mu
+# boş bir dosya (ör. başka bir araç tarafından oluşturulmuş) ya da şema güncellemesinden önce alınmış bir kopya geçersizdir
+def _usable():
+    try:
+        conn = sqlite3.connect(f"file:{_path()}?mode=ro", uri=True)
+        try:
+            names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return set(db.metadata.tables) <= names
+
+
+# kopya yoksa ya da geçersizse beklenerek alınır, eskiyse arka planda yenilenir.
+# kopya değiştiyse eski dosyaya açık bağlantılar kapatılır ve kullanıcı boyut tablosu yeni kopyadan kurulur.
+# kopyadan okumadan (reading) önce çağrılmalıdır, analiz kopyası kapalıysa bir şey yapmaz
+def ensure_fresh():
+    global _refreshing, _seen
+    if not enabled():
+        return
+    mtime = _mtime()
+    # geçerlilik sadece dosya değiştiğinde kontrol edilir, kullanılan kopya her istekte açılıp okunmaz
+    if mtime is None or (mtime != _seen and not _usable()):
+        with _lock:
+            if _mtime() is None or not _usable():
+                _copy()
+    elif age() > current_app.config.get("ANALYTICS_SNAPSHOT_INTERVAL", 300):
+        with _state_lock:
+            start = not _refreshing
+            _refreshing = True
+        if start:
+            app = current_app._get_current_object()
+            threading.Thread(target=_refresh_in_background, args=(app,), daemon=True).start()
+
+    mtime = _mtime()
+    if mtime != _seen:
+        with _state_lock:
+            if mtime != _seen:
+                db.engines["analytics"].dispose()
+                user_dim.invalidate()
+                _seen = mtime
+
+
+# güncel kopyanın versiyonu (dosyanın değiştirilme zamanı), analiz kopyası kapalıysa None (veri versiyonu kullanılır)
+# kopyayı gerekirse alır / yeniler, bkz. ensure_fresh
+def version():
+    if not enabled():
+        return None
+    ensure_fresh()
+    return _seen
+
+
+# bu blok içindeki tüm sorgular analiz kopyasından okunur, analiz kopyası kapalıysa bir şey yapmaz
+@contextlib.contextmanager
+def reading():
+    if not enabled():
+        yield
+        return
+    token = analytics_reads.set(True)
+    try:
+        yield
+    finally:
+        analytics_reads.reset(token)
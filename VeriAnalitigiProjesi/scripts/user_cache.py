@@ -0,0 +1,109 @@
+import collections
+import threading  # önbellek kilidi için
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from scripts.data import db, User
+
+# Giriş Yapan Kullanıcı Önbelleği
+# Flask-Login her istekte kullanıcıyı id'sinden yükler. kullanıcı satırının sütunları id ile bellekte tutulur
+# (en fazla USER_CACHE_SIZE kayıt, en eski kullanılan önce atılır, her kayıt USER_CACHE_TTL saniye geçerli),
+# böylece ürün sayfası ve satın alma gibi isteklerde kullanıcı için veritabanına gidilmez.
+# her istek için sütunlardan oturuma bağlı olmayan (detached) yeni bir User nesnesi kurulur,
+# nesneler istekler / thread'ler arasında paylaşılmaz.
+# kullanıcı eklendiğinde, güncellendiğinde (profil, admin yetkisi) ya da silindiğinde kaydı commit'ten sonra silinir.
+# not: process içinde tutulur, tek process ile çalışan "flask run" için tasarlandı,
+# başka bir process'in (ör. cli) yaptığı değişiklikler en geç TTL sonunda görülür
+
+COLUMNS = [c.key for c in User.__table__.columns]
+
+_lock = threading.Lock()
+_entries = collections.OrderedDict()  # id -> (geçerlilik bitişi, {sütun: değer})
+_generation = 0  # her silmede artar, okuma sırasında silinen kayıt eski haliyle geri yazılmasın
+
+stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def _detached(values):
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+# kullanıcıyı önbellekten, yoksa veritabanından yükler, bulunamazsa None
+def get(user_id):
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry and entry[0] > now:
+            _entries.move_to_end(user_id)
+            stats["hits"] += 1
+            return _detached(entry[1])
+        stats["misses"] += 1
+        generation = _generation
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    values = {c: getattr(user, c) for c in COLUMNS}
+    ttl = current_app.config.get("USER_CACHE_TTL", 300)
+    size = current_app.config.get("USER_CACHE_SIZE", 10000)
+    with _lock:
+        if generation != _generation:
+            return user
+        _entries[user_id] = (now + ttl, values)
+        _entries.move_to_end(user_id)
+        while len(_entries) > size:
+            _entries.popitem(last=False)
+            stats["evictions"] += 1
+    return user
+
+
+# verilen kullanıcıların kayıtlarını siler
+def invalidate(user_ids):
+    global _generation
+    with _lock:
+        _generation += 1
+        for user_id in user_ids:
+            if _entries.pop(user_id, None) is not None:
+                stats["invalidations"] += 1
+
+
+# tüm kayıtları siler
+def clear():
+    global _generation
+    with _lock:
+        _generation += 1
+        _entries.clear()
+
+
+# önbellek durumunu döner, admin ölçüm sayfası için
+def snapshot():
+    with _lock:
+        return dict(stats, entries=len(_entries))
+
+
+# Kullanıcı değişikliklerini takip
+# flush sırasında id'ler işaretlenir, commit'ten sonra silinir (geri alınan değişiklik önbelleği boşuna boşaltmasın)
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("user_cache_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    user_ids = session.info.pop("user_cache_ids", None)
+    if user_ids:
+        invalidate(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("user_cache_ids", None)
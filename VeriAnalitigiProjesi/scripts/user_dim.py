@@ -0,0 +1,116 @@
+import datetime  # tarih verileri için
+import threading  # yeniden kurulumda kilit için
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from scripts.data import db, User, age_of
+import scripts.cache as cache
+
+# numpy opsiyonel, sadece vektörel motor dizileri istediğinde kullanılır
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Kullanıcı Boyut Tablosu (User Dimension)
+# segment grafikleri için her kullanıcının cinsiyet kodu, yaşı ve şehir - meslek segment kodu
+# user_id ile indekslenen listelerde bellekte tutulur. tablo bir kere tek sorguyla kurulur,
+# kayıt / kullanıcı güncellemesi commit edildiğinde ya da gün değiştiğinde (yaşlar değişir) yeniden kurulur.
+# grafikler her hesaplamada User tablosunu okumak ve yaşı doğum tarihinden tekrar hesaplamak yerine bu tabloya bakar
+# not: process içinde tutulur, tek process ile çalışan "flask run" için tasarlandı
+
+GENDER_CODES = {"E": 0, "K": 1}  # diğer değerler -1
+
+_lock = threading.Lock()
+_dim = None  # güncel tablo, yeniden kurulana kadar değişmez
+
+
+class Dimension:
+    def __init__(self, rows, today):
+        self.built_on = today
+        size = max([r.id for r in rows], default=0) + 1
+        self.gender = [-1] * size
+        self.age = [0] * size
+        self.segment = [-1] * size
+        self.segment_labels = []  # segment kodu -> "şehir - meslek"
+        self.gender_totals = {"E": 0, "K": 0}  # admin dışı kişi sayıları
+
+        codes = {}
+        for r in rows:
+            key = f"{r.city} - {r.job}"
+            if key not in codes:
+                codes[key] = len(self.segment_labels)
+                self.segment_labels.append(key)
+            self.segment[r.id] = codes[key]
+            self.gender[r.id] = GENDER_CODES.get(r.gender, -1)
+            self.age[r.id] = age_of(r.birth_date, today)
+            if r.username != "admin" and r.gender in self.gender_totals:
+                self.gender_totals[r.gender] += 1
+        self._arrays = None
+
+    def __len__(self):
+        return len(self.gender)
+
+    # (kullanıcı kodu -> segment, cinsiyet, yaş), tabloda olmayan kullanıcı için (-1, -1, 0)
+    def lookup(self, user_id):
+        if 0 <= user_id < len(self.gender):
+            return self.segment[user_id], self.gender[user_id], self.age[user_id]
+        return -1, -1, 0
+
+    # numpy motoru için (cinsiyet, yaş, segment) dizileri, ilk istekte oluşturulur
+    def arrays(self):
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self.gender, dtype=np.int64),
+                np.array(self.age, dtype=np.int64),
+                np.array(self.segment, dtype=np.int64),
+            )
+        return self._arrays
+
+
+# güncel boyut tablosu, yoksa ya da gün değiştiyse kurulur
+def get():
+    global _dim
+    today = datetime.date.today()
+    dim = _dim
+    if dim is not None and dim.built_on == today:
+        return dim
+    with _lock:
+        if _dim is None or _dim.built_on != today:
+            rows = db.session.execute(
+                select(User.id, User.username, User.gender, User.birth_date, User.city, User.job)
+            ).all()
+            _dim = Dimension(rows, today)
+        return _dim
+
+
+# tabloyu geçersiz sayar, sonraki get() yeniden kurar
+# cinsiyet dağılımı grafiği de bu tablodan okunduğu için panel önbelleği de eskimiş sayılır
+def invalidate():
+    global _dim
+    with _lock:
+        _dim = None
+    cache.bump()
+
+
+# Kullanıcı değişikliklerini takip
+# flush sırasında işaretlenir, commit'ten sonra geçersiz sayılır (commit edilmemiş kullanıcı tabloya girmesin)
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["user_dim_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop("user_dim_dirty", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("user_dim_dirty", None)
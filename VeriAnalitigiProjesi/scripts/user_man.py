@@ -1,79 +1,141 @@
-import datetime # tarih verileri için
-from flask import render_template, request, redirect, url_for, flash, jsonify
-# render_template: spesifik bir sayfayı ekrana basma
-# request: kullanıcı verisini yakalama
-# redirect: yönlendirme
-# url_for: adres defteri, fonksiyon adından url üretme
-# flash: uyarı mesajı
-# jsonify: dictionary'leri json formatına çevirme
-from flask_login import login_user, logout_user, current_user # kullanıcı işlemleri için
-
-from scripts.data import db, User, PurchaseLog
-
-
-# Giriş yapan kullanıcıyı ID'sinden tanıma
-def load_user(user_id):
-
-    return User.query.get(int(user_id))
-
-
-# Kayıt fonksiyonu
-def register():
-    if request.method == "POST":
-        try:
-            b_date = datetime.datetime.strptime(
-                request.form.get("birth_date"), "%Y-%m-%d"
-            ).date()
-            user = User(
-                username=request.form.get("username"),
-                gender=request.form.get("gender"),
-                birth_date=b_date,
-                education=request.form.get("education"),
-                city=request.form.get("city"),
-                job=request.form.get("job"),
-            )
-            user.set_password(request.form.get("password"))
-            if User.query.count() == 0:
-                user.is_admin = True
-            db.session.add(user)
-            db.session.commit()
-            login_user(user)
-            return redirect(url_for("index"))
-        except:
-            flash("Hata oluştu", "danger")
-
-    return render_template("register.html")
-
-
-# Giriş Yapma fonksiyonu
-def login():
-    if request.method == "POST":
-        user = User.query.filter_by(username=request.form.get("username")).first()
-        if user and user.check_password(request.form.get("password")):
-            login_user(user, remember=True)
-            return redirect(url_for("index"))
-        flash("Hatalı giriş", "danger")
-
-    return render_template("login.html")
-
-
-# Çıkış yapma fonksiyonu
-def logout():
-    logout_user()
-
-    return redirect(url_for("index"))
-
-
-# O kullanıcının alım yapmasını sağlayan fonksiyon
-def buy_now():
-    data = request.json
-    db.session.add(
-        PurchaseLog(
-            user_id=current_user.id,
-            product_id=data["product_id"],
-            selected_color=data["color"],
-        )
-    )
-    db.session.commit()
-
-    return jsonify({"success": True, "message": f'{data["color"]} rengi satın alındı.'})
+import datetime # tarih verileri için
+from flask import render_template, request, redirect, url_for, flash, jsonify, current_app
+# render_template: spesifik bir sayfayı ekrana basma
+# request: kullanıcı verisini yakalama
+# redirect: yönlendirme
+# url_for: adres defteri, fonksiyon adından url üretme
+# flash: uyarı mesajı
+# jsonify: dictionary'leri json formatına çevirme
+# current_app: uygulama ayarlarını okuma
+from flask_login import login_user, logout_user, current_user # kullanıcı işlemleri için
+
+from scripts.data import db, User, Product
+import scripts.purchases as purchases
+import scripts.user_cache as user_cache
+
+
+# Giriş yapan kullanıcıyı ID'sinden tanıma
+# kullanıcı her istekte veritabanından değil önbellekten yüklenir
+def load_user(user_id):
+    try:
+        return user_cache.get(int(user_id))
+    except ValueError:
+        return None
+
+
+# Kayıt fonksiyonu
+def register():
+    if request.method == "POST":
+        try:
+            b_date = datetime.datetime.strptime(
+                request.form.get("birth_date"), "%Y-%m-%d"
+            ).date()
+            user = User(
+                username=request.form.get("username"),
+                gender=request.form.get("gender"),
+                birth_date=b_date,
+                education=request.form.get("education"),
+                city=request.form.get("city"),
+                job=request.form.get("job"),
+            )
+            user.set_password(request.form.get("password"))
+            if User.query.count() == 0:
+                user.is_admin = True
+            db.session.add(user)
+            db.session.commit()
+            login_user(user)
+            return redirect(url_for("index"))
+        except:
+            flash("Hata oluştu", "danger")
+
+    return render_template("register.html")
+
+
+# Giriş Yapma fonksiyonu
+def login():
+    if request.method == "POST":
+        user = User.query.filter_by(username=request.form.get("username")).first()
+        if user and user.check_password(request.form.get("password")):
+            login_user(user, remember=True)
+            return redirect(url_for("index"))
+        flash("Hatalı giriş", "danger")
+
+    return render_template("login.html")
+
+
+# Çıkış yapma fonksiyonu
+def logout():
+    logout_user()
+
+    return redirect(url_for("index"))
+
+
+# O kullanıcının alım yapmasını sağlayan fonksiyon
+# aynı anda gelen diğer satın almalarla birlikte tek commit ile yazılır (group commit)
+def buy_now():
+    data = request.json or {}
+    try:
+        product_id = int(data["product_id"])
+        color = str(data["color"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"success": False, "message": "Hatalı ürün bilgisi."}), 400
+
+    # olmayan ürün için satın alma yazılmasın
+    if db.session.get(Product, product_id) is None:
+        return jsonify({"success": False, "message": "Ürün bulunamadı."}), 404
+
+    purchases.record(
+        [
+            {
+                "user_id": current_user.id,
+                "product_id": product_id,
+                "selected_color": color,
+                "timestamp": datetime.datetime.utcnow(),
+            }
+        ]
+    )
+
+    return jsonify({"success": True, "message": f"{color} rengi satın alındı."})
+
+
+# Toplu satın alma
+# {"items": [{"product_id": 1, "color": "Mavi", "qty": 3}, ...]} listesindeki tüm ürünleri tek transaction ile alır
+def buy_bulk():
+    items = (request.json or {}).get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "Ürün listesi boş."}), 400
+
+    now = datetime.datetime.utcnow()
+    rows = []
+    for item in items:
+        try:
+            product_id = int(item["product_id"])
+            qty = int(item.get("qty", 1))
+            color = str(item["color"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"success": False, "message": "Hatalı ürün bilgisi."}), 400
+        if qty < 1:
+            return jsonify({"success": False, "message": "Adet en az 1 olmalı."}), 400
+        for _ in range(qty):
+            rows.append(
+                {
+                    "user_id": current_user.id,
+                    "product_id": product_id,
+                    "selected_color": color,
+                    "timestamp": now,
+                }
+            )
+
+    # tek istekte alınabilecek toplam adet sınırı
+    if len(rows) > current_app.config["BULK_PURCHASE_MAX"]:
+        return jsonify({"success": False, "message": "Adet sınırı aşıldı."}), 400
+
+    # olmayan ürünler için satın alma yazılmasın
+    product_ids = {r["product_id"] for r in rows}
+    found = {p_id for (p_id,) in db.session.query(Product.id).filter(Product.id.in_(product_ids))}
+    if found != product_ids:
+        return jsonify({"success": False, "message": "Ürün bulunamadı."}), 404
+
+    purchases.record(rows)
+
+    return jsonify({"success": True, "count": len(rows), "message": f"{len(rows)} ürün satın alındı."})